@@ -44,11 +44,110 @@ Python objects.
 __author__ = 'Benjamin Yolken <yolken@google.com>'
 
 import csv
+import gc
 import itertools
+import multiprocessing
+import operator
 import string
+import time
 
 import csv_utilities
 import data_source
+from dspllib import reporting
+
+
+# Number of byte ranges to create per worker when parsing in parallel; using
+# more than one evens out the load when some ranges parse slower than others
+_RANGES_PER_WORKER = 4
+
+# Default number of rows to read between progress reports
+_DEFAULT_CHUNK_SIZE = 50000
+
+# Number of rows sampled when estimating the memory used by each row
+_ROW_SIZE_SAMPLE = 1000
+
+# Minimum number of seconds between progress messages in verbose mode
+_PROGRESS_INTERVAL = 10
+
+
+def _CreateColumnTransformer(columns):
+  """Create a ColumnTransformer that converts CSV values to typed values.
+
+  Integers and floats are converted with int() and float(); other values are
+  interned, since dimension values repeat heavily. Values equal to a zeroif_val
+  are stored as 0.0, converted to the column type where possible.
+
+  Args:
+    columns: Sequence of DataSourceColumn objects for the CSV
+
+  Returns:
+    A csv_utilities.ColumnTransformer object
+  """
+  converters = []
+  zero_values = []
+
+  for column in columns:
+    if column.data_type == 'integer':
+      converters.append(int)
+      zero_values.append(0)
+    elif column.data_type == 'float':
+      converters.append(float)
+      zero_values.append(0.0)
+    else:
+      converters.append(intern)
+      zero_values.append(0.0)
+
+  return csv_utilities.ColumnTransformer(columns, converters, zero_values)
+
+
+def _ParseByteRange(arguments):
+  """Parse and type-convert the CSV records in a byte range of a file.
+
+  Runs inside a worker process, so takes a single tuple of arguments and
+  reports bad records back to the caller instead of raising, since only the
+  caller knows the absolute row numbers.
+
+  Args:
+    arguments: A (csv_path, start, end, columns) tuple, where columns is the
+               sequence of DataSourceColumn objects for the file
+
+  Returns:
+    A (num_records, value_columns, bad_record) tuple. num_records is the number
+    of CSV records in the range (including blank and dropped ones),
+    value_columns is a list with one list of typed values per column, and
+    bad_record is either None or a (record_index, column_index, value) tuple,
+    as taken by csv_utilities.FormatRecordIssue, describing the first bad
+    record in the range.
+  """
+  (csv_path, start, end, columns) = arguments
+
+  csv_file = open(csv_path, 'rb')
+  mapped_reader = csv_utilities.MappedCSVReader(csv_file, start, end)
+  column_transformer = _CreateColumnTransformer(columns)
+
+  num_records = 0
+  value_columns = [[] for column in columns]
+
+  gc.disable()
+
+  try:
+    for records, unused_end_position in mapped_reader.IterRecordChunks():
+      chunk_columns, bad_record = column_transformer.TransformChunk(records)
+
+      if bad_record:
+        (r, c, value) = bad_record
+        return (num_records, [], (num_records + r, c, value))
+
+      for values, chunk_values in itertools.izip(value_columns, chunk_columns):
+        values.extend(chunk_values)
+
+      num_records += len(records)
+  finally:
+    gc.enable()
+    mapped_reader.Close()
+    csv_file.close()
+
+  return (num_records, value_columns, None)
 
 
 class DataContainer(object):
@@ -82,6 +181,8 @@ class DataContainer(object):
       self.position_column_map[column_index] = column_name
 
     self.rows = []
+    self.sort_columns = []
+    self.sorted_rows = None
 
   def AddRow(self, row):
     """Add a new row to this data container object.
@@ -91,6 +192,14 @@ class DataContainer(object):
     """
     self.rows.append(row)
 
+  def AddRows(self, rows):
+    """Add several new rows to this data container object.
+
+    Args:
+      rows: An iterable of sequences, one for each row
+    """
+    self.rows.extend(rows)
+
   def DistinctValues(self, column_names, omit_values=dict()):
     """Get the distinct combination of values for one or more columns.
 
@@ -102,28 +211,45 @@ class DataContainer(object):
     Returns:
       A list of lists, one for each set of unique values of the input columns
     """
-    observed_values = {}
+    return self.DistinctValuesBatch([(column_names, omit_values)])[0]
 
-    for row in self.rows:
-      curr_values = []
+  def DistinctValuesBatch(self, distinct_queries):
+    """Get the distinct values for several sets of columns in one pass.
 
-      keep_row = True
+    Args:
+      distinct_queries: A sequence of (column_names, omit_values) tuples, with
+                        the same meanings as the arguments of DistinctValues
 
-      for column_name in column_names:
-        curr_value = row[self.column_position_map[column_name]]
+    Returns:
+      A list with one DistinctValues result per query, in the same order
+    """
+    query_plans = []
 
-        # Drop rows with values in the omitted list
-        if column_name in omit_values:
-          if curr_value in omit_values[column_name]:
-            keep_row = False
-            break
+    for column_names, omit_values in distinct_queries:
+      positions = [self.column_position_map[c] for c in column_names]
 
-        curr_values.append(row[self.column_position_map[column_name]])
+      # itemgetter only returns a tuple when it has more than one position
+      if len(positions) == 1:
+        value_getter = lambda row, p=positions[0]: (row[p],)
+      else:
+        value_getter = operator.itemgetter(*positions)
 
-      if keep_row:
-        observed_values[tuple(curr_values)] = True
+      omit_checks = [(self.column_position_map[c], set(omit_values[c]))
+                     for c in column_names if c in omit_values]
 
-    return sorted([list(key) for key in observed_values.keys()])
+      query_plans.append((value_getter, omit_checks, set()))
+
+    for row in self.rows:
+      for value_getter, omit_checks, observed_values in query_plans:
+        # Drop rows with values in the omitted list
+        for position, omitted in omit_checks:
+          if row[position] in omitted:
+            break
+        else:
+          observed_values.add(value_getter(row))
+
+    return [sorted([list(values) for values in observed_values])
+            for unused_getter, unused_checks, observed_values in query_plans]
 
   def CombinationCount(self, child_column, parent_column, omit_values=dict()):
     """Get the number of unique parent values associated with each child.
@@ -178,6 +304,65 @@ class DataContainer(object):
 
     return result_rows
 
+  def SortRows(self, column_names):
+    """Keep a copy of the rows sorted by the given columns.
+
+    GroupedValues streams over this copy, rather than sorting the rows again,
+    for queries that group by the leading sort columns. The copy only holds
+    references to the rows, so the rows themselves aren't duplicated.
+
+    Args:
+      column_names: A sequence of column names, most significant first
+    """
+    self.sort_columns = list(column_names)
+
+    if self.sort_columns:
+      self.sorted_rows = sorted(
+          self.rows, key=operator.itemgetter(
+              *[self.column_position_map[c] for c in self.sort_columns]))
+    else:
+      self.sorted_rows = None
+
+  def _IterSortedGroups(self, sorted_rows, outer_columns, inner_columns):
+    """Split rows that are sorted by some grouping columns into groups.
+
+    Runs of rows with the same outer column values are found in a single pass;
+    each run is then split by its inner column values with a dictionary.
+
+    Args:
+      sorted_rows: An iterable of rows, sorted by outer_columns
+      outer_columns: Sequence of grouping column names the rows are sorted by
+      inner_columns: Sequence of the remaining grouping column names
+
+    Yields:
+      A list of rows for each group
+    """
+    outer_key_function = operator.itemgetter(
+        *[self.column_position_map[c] for c in outer_columns])
+
+    if inner_columns:
+      inner_key_function = operator.itemgetter(
+          *[self.column_position_map[c] for c in inner_columns])
+
+    for unused_key, outer_group in itertools.groupby(
+        sorted_rows, outer_key_function):
+      if not inner_columns:
+        yield list(outer_group)
+        continue
+
+      inner_groups = {}
+
+      for row in outer_group:
+        inner_key = inner_key_function(row)
+
+        if inner_key in inner_groups:
+          inner_groups[inner_key].append(row)
+        else:
+          inner_groups[inner_key] = [row]
+
+      for inner_key in sorted(inner_groups.keys()):
+        yield inner_groups[inner_key]
+
   def GroupedValues(self, column_names, group_by_columns, order_by_columns,
                     column_aggregation_map,
                     keep_values=dict(), omit_values=dict()):
@@ -203,15 +388,35 @@ class DataContainer(object):
       omit_values: Dictionary of column->value mappings; rows containing these
                    values will be dropped
 
+    If SortRows has been called and the first sort column is one of the
+    group_by_columns, the groups are read from the sorted rows without sorting
+    them again.
+
     Returns:
       List of lists containing results of running the query
     """
+    # Find how many of the leading sort columns are grouped on; rows sorted by
+    # these are already in runs by group
+    num_sorted_columns = 0
+
+    if self.sorted_rows is not None:
+      for column_name in self.sort_columns:
+        if column_name not in group_by_columns:
+          break
+
+        num_sorted_columns += 1
+
+    if num_sorted_columns:
+      input_rows = self.sorted_rows
+    else:
+      input_rows = self.rows
+
     # Drop or keep rows based on contents of keep_values and/or omit_values
     # parameters
     filtered_rows = []
 
     if keep_values or omit_values:
-      for row in self.rows:
+      for row in input_rows:
         keep_row_hit = False
         omit_row_hit = False
 
@@ -229,22 +434,28 @@ class DataContainer(object):
         if (not omit_row_hit) and (not keep_values or keep_row_hit):
           filtered_rows.append(row)
     else:
-      filtered_rows = self.rows
+      filtered_rows = input_rows
 
     group_key_function = lambda r: tuple(
         [r[self.column_position_map[col]] for col in group_by_columns])
     sort_key_function = lambda r: tuple(
         [r[column_names.index(col)] for col in order_by_columns])
 
-    input_data = sorted(filtered_rows, key=group_key_function)
+    if num_sorted_columns:
+      groups = self._IterSortedGroups(
+          filtered_rows, self.sort_columns[:num_sorted_columns],
+          [col for col in group_by_columns
+           if col not in self.sort_columns[:num_sorted_columns]])
+    else:
+      input_data = sorted(filtered_rows, key=group_key_function)
+      groups = (list(group) for unused_key, group
+                in itertools.groupby(input_data, group_key_function))
 
     result_rows = []
 
-    for unused_key, group in itertools.groupby(input_data, group_key_function):
+    for group_list in groups:
       curr_row = []
 
-      group_list = list(group)
-
       for column_name in column_names:
         if column_name in group_by_columns:
           curr_row.append(group_list[0][self.column_position_map[column_name]])
@@ -267,7 +478,9 @@ class DataContainer(object):
 class CSVDataSource(data_source.DataSource):
   """A DataSource around a single CSV file."""
 
-  def __init__(self, csv_file, verbose=True):
+  def __init__(self, csv_file, verbose=True, num_workers=1, prescan=False,
+               widen_types=False, chunk_size=_DEFAULT_CHUNK_SIZE,
+               memory_limit=None, progress_callback=None, run_report=None):
     """Populate a CSVDataSource object based on a CSV file.
 
     Note that the caller is responsible for closing the csv_file.
@@ -275,66 +488,240 @@ class CSVDataSource(data_source.DataSource):
     Args:
       csv_file: A file-like object, opened for reading, that has CSV data in it
       verbose: Print out status messages to stdout
+      num_workers: Number of worker processes to use for parsing the CSV; only
+                   used if csv_file is a file on disk
+      prescan: Check every value against its column's type and format before
+               reading the data
+      widen_types: During the pre-scan, widen guessed integer columns to
+                   floats if they contain float values
+      chunk_size: Number of rows to read between progress reports and memory
+                  checks; when parsing in parallel, these happen after each
+                  byte range instead
+      memory_limit: Maximum number of bytes that the parsed data may use, or
+                    None for no limit
+      progress_callback: Function called with a csv_utilities.IngestProgress
+                         object each time progress is reported
+      run_report: A reporting.RunReport object to record the time taken by
+                  each phase of loading in, or None
 
     Raises:
-      DataSourceError: If CSV isn't properly formatted
+      DataSourceError: If CSV isn't properly formatted, or chunk_size is less
+                       than one
+      MemoryLimitError: If reading the CSV would exceed the memory limit
     """
+    if chunk_size < 1:
+      raise data_source.DataSourceError(
+          'Chunk size must be at least 1, got %d' % chunk_size)
+
     self.verbose = verbose
+    self.chunk_size = chunk_size
+    self.memory_limit = memory_limit
+    self.progress_callback = progress_callback
+    self.run_report = run_report or reporting.RunReport()
+
+    phase = self.run_report.StartPhase('parse_header')
     self.column_bundle = csv_utilities.ConstructColumnBundle(csv_file, verbose)
+    phase.Finish()
+
+    if prescan:
+      if self.verbose:
+        print 'Checking CSV values'
+
+      phase = self.run_report.StartPhase('prescan')
+      csv_utilities.CheckColumnValues(
+          csv_file, self.column_bundle, num_workers, widen_types,
+          verbose=verbose)
+      phase.Finish()
 
     column_ids = [column.column_id for column in
                   self.column_bundle.GetColumnIterator()]
-    num_columns = self.column_bundle.GetNumColumns()
     self.data_container = DataContainer(column_ids)
 
     if self.verbose:
       print 'Reading CSV data'
 
-    body_csv_reader = csv.reader(csv_file, delimiter=',', quotechar='"')
-    body_csv_reader.next()
+    progress = csv_utilities.IngestProgress(
+        csv_utilities.GetFileSize(csv_file))
+    self.row_size = None
+    self.last_progress_time = progress.start_time
+
+    # The rows read here don't contain any reference cycles, so suspend the
+    # cyclic garbage collector, which would otherwise repeatedly traverse the
+    # growing data container
+    gc_enabled = gc.isenabled()
+    gc.disable()
+
+    phase = self.run_report.StartPhase('ingest')
+
+    try:
+      if num_workers > 1 and csv_utilities.IsFileOnDisk(csv_file):
+        self._ReadRowsInParallel(csv_file, num_workers, progress)
+      else:
+        self._ReadRows(csv_file, progress)
+    finally:
+      if gc_enabled:
+        gc.enable()
+
+    phase.Finish(rows_in=progress.rows_read,
+                 rows_out=len(self.data_container.rows),
+                 bytes_in=progress.bytes_read)
+
+    if self.verbose:
+      print 'Checking concept hierarchies'
+
+    phase = self.run_report.StartPhase('check_hierarchies')
+    self._CheckHierarchies()
+    phase.Finish()
+
+  def _UpdateProgress(self, progress, rows_read, bytes_read):
+    """Record and report reading progress, then check the memory limit.
+
+    Args:
+      progress: The IngestProgress object for the file being read
+      rows_read: Number of records read so far, excluding the header
+      bytes_read: Number of bytes of the file read so far
+
+    Raises:
+      DataSourceError: If reading the whole file would exceed the memory limit
+    """
+    rows = self.data_container.rows
+
+    if rows and self.row_size is None:
+      self.row_size = csv_utilities.EstimateRowSize(rows[:_ROW_SIZE_SAMPLE])
+
+    progress.Update(rows_read, bytes_read, len(rows) * (self.row_size or 0))
+
+    if self.progress_callback:
+      self.progress_callback(progress)
+
+    if self.verbose:
+      current_time = time.time()
+
+      if current_time - self.last_progress_time >= _PROGRESS_INTERVAL:
+        print '  %s' % progress
+        self.last_progress_time = current_time
+
+    if self.memory_limit:
+      projected_memory = progress.GetProjectedMemory()
+
+      if projected_memory > self.memory_limit:
+        raise data_source.MemoryLimitError(
+            'Reading the CSV data would use about %d MB, which exceeds the '
+            'memory limit of %d MB (stopped after %d rows)' %
+            (projected_memory >> 20, self.memory_limit >> 20, rows_read))
+
+  def _ReadRows(self, csv_file, progress):
+    """Read the body of the CSV file into the data container, a chunk at a time.
+
+    Files on disk are read through a MappedCSVReader; other file-like objects
+    are read with csv.reader.
+
+    Args:
+      csv_file: A file-like object, opened for reading, that has CSV data in it
+      progress: An IngestProgress object to update after each chunk
+
+    Raises:
+      DataSourceError: If a row has the wrong number of values or an invalid
+                       value, or if reading the file would exceed the memory
+                       limit
+    """
+    columns = list(self.column_bundle.GetColumnIterator())
+    column_transformer = _CreateColumnTransformer(columns)
+
+    if csv_utilities.IsFileOnDisk(csv_file):
+      line_reader = None
+      mapped_reader = csv_utilities.MappedCSVReader(csv_file)
+      body_csv_reader = iter(mapped_reader)
+    else:
+      line_reader = csv_utilities.CountingLineReader(csv_file)
+      mapped_reader = None
+      body_csv_reader = csv.reader(line_reader, delimiter=',', quotechar='"')
+
+    try:
+      body_csv_reader.next()
 
-    for r, row in enumerate(body_csv_reader):
-      transformed_row_values = []
+      # Count the header as the first record
+      row_number = 1
+
+      while True:
+        chunk = list(itertools.islice(body_csv_reader, self.chunk_size))
+
+        if not chunk:
+          break
 
-      # Ignore blank rows
-      if row:
-        if len(row) != num_columns:
+        value_columns, bad_record = column_transformer.TransformChunk(chunk)
+
+        if bad_record:
+          (r, c, value) = bad_record
           raise data_source.DataSourceError(
-              'Number of columns in row %d (%d) does not match number '
-              'expected (%d)' %  (r + 2, len(row), num_columns))
+              csv_utilities.FormatRecordIssue(
+                  columns, row_number + r + 1, c, value))
 
-        skip_row = False
+        self.data_container.AddRows(itertools.izip(*value_columns))
+        row_number += len(chunk)
 
-        for v, row_value in enumerate(row):
-          column = self.column_bundle.GetColumnByOrder(v)
+        if mapped_reader:
+          bytes_read = mapped_reader.position
+        else:
+          bytes_read = line_reader.bytes_read
 
-          # Handle dropif_val and zeroif_val parameters
-          if 'dropif_val' in column.internal_parameters:
-            if row_value == column.internal_parameters['dropif_val']:
-              skip_row = True
-              break
-          elif 'zeroif_val' in column.internal_parameters:
-            if row_value == column.internal_parameters['zeroif_val']:
-              row_value = 0.0
+        self._UpdateProgress(progress, row_number - 1, bytes_read)
+    finally:
+      if mapped_reader:
+        mapped_reader.Close()
 
-          if column.data_type == 'integer':
-            typed_row_value = int(row_value)
-          elif column.data_type == 'float':
-            typed_row_value = float(row_value)
-          else:
-            typed_row_value = row_value
+  def _ReadRowsInParallel(self, csv_file, num_workers, progress):
+    """Read the body of the CSV file into the data container using a pool.
 
-          transformed_row_values.append(typed_row_value)
+    The file is split into byte ranges aligned to record boundaries, which are
+    parsed by worker processes. Results are added to the data container in file
+    order, so the container contents match those produced by _ReadRows.
 
-        if skip_row:
-          continue
+    Args:
+      csv_file: A file object, opened for reading, for a CSV file on disk
+      num_workers: Number of worker processes to use
+      progress: An IngestProgress object to update after each byte range
+
+    Raises:
+      DataSourceError: If a row has the wrong number of values or an invalid
+                       value, or if reading the file would exceed the memory
+                       limit
+    """
+    columns = list(self.column_bundle.GetColumnIterator())
 
-        self.data_container.AddRow(transformed_row_values)
+    byte_ranges = csv_utilities.SplitCSVFile(
+        csv_file, num_workers * _RANGES_PER_WORKER)
 
     if self.verbose:
-      print 'Checking concept hierarchies'
+      print 'Parsing %d byte ranges with %d workers' % (
+          len(byte_ranges), num_workers)
 
-    self._CheckHierarchies()
+    worker_pool = multiprocessing.Pool(num_workers)
+
+    try:
+      # Count the header as the first record
+      previous_records = 1
+
+      range_results = worker_pool.imap(
+          _ParseByteRange,
+          [(csv_file.name, start, end, columns)
+           for (start, end) in byte_ranges])
+
+      for (unused_start, end), (num_records, value_columns, bad_record) in (
+          itertools.izip(byte_ranges, range_results)):
+        if bad_record:
+          (r, c, value) = bad_record
+          raise data_source.DataSourceError(
+              csv_utilities.FormatRecordIssue(
+                  columns, previous_records + r + 1, c, value))
+
+        self.data_container.AddRows(itertools.izip(*value_columns))
+        previous_records += num_records
+
+        self._UpdateProgress(progress, previous_records - 1, end)
+    finally:
+      worker_pool.terminate()
+      worker_pool.join()
 
   def GetColumnBundle(self):
     """Get ColumnBundle object for this data source."""
@@ -383,17 +770,9 @@ class CSVDataSource(data_source.DataSource):
       DataSourceError: If query against sqlite instance fails
     """
     if query_parameters.query_type == data_source.QueryParameters.CONCEPT_QUERY:
-      omitted_values = {}
-
-      # Pull out total values
-      for column_id in query_parameters.column_ids:
-        column = self.column_bundle.GetColumnByID(column_id)
-
-        if column.total_val:
-          omitted_values[column_id] = [column.total_val]
-
       query_results = self.data_container.DistinctValues(
-          query_parameters.column_ids, omitted_values)
+          query_parameters.column_ids,
+          self._ConceptOmittedValues(query_parameters))
     elif query_parameters.query_type == data_source.QueryParameters.SLICE_QUERY:
       # This request is for a slice table
       all_columns = []
@@ -452,6 +831,107 @@ class CSVDataSource(data_source.DataSource):
 
     return data_source.TableData(rows=query_results)
 
+  def _ConceptOmittedValues(self, query_parameters):
+    """Get the total values to leave out of a concept query's results."""
+    omitted_values = {}
+
+    for column_id in query_parameters.column_ids:
+      column = self.column_bundle.GetColumnByID(column_id)
+
+      if column.total_val:
+        omitted_values[column_id] = [column.total_val]
+
+    return omitted_values
+
+  def GetTableDataBatch(self, query_parameters_list):
+    """Calculate and return the data for several tables.
+
+    Concept queries are all answered with a single pass over the data
+    container.
+
+    Args:
+      query_parameters_list: A sequence of QueryParameters objects
+
+    Returns:
+      A list of TableData objects, one for each query, in the same order
+
+    Raises:
+      DataSourceError: If a query has an unknown type
+    """
+    concept_query_indices = [
+        q for q, query_parameters in enumerate(query_parameters_list)
+        if query_parameters.query_type ==
+        data_source.QueryParameters.CONCEPT_QUERY]
+
+    concept_results = self.data_container.DistinctValuesBatch(
+        [(query_parameters_list[q].column_ids,
+          self._ConceptOmittedValues(query_parameters_list[q]))
+         for q in concept_query_indices])
+
+    table_data_list = [None] * len(query_parameters_list)
+
+    for q, query_results in zip(concept_query_indices, concept_results):
+      table_data_list[q] = data_source.TableData(rows=query_results)
+
+    for q, query_parameters in enumerate(query_parameters_list):
+      if table_data_list[q] is None:
+        table_data_list[q] = self.GetTableData(query_parameters)
+
+    return table_data_list
+
+  def GetCardinalities(self):
+    """Count the rows and the distinct values of each dimension column.
+
+    Returns:
+      A (num_rows, distinct_counts) tuple; see DataSource.GetCardinalities
+    """
+    rows = self.data_container.rows
+    distinct_counts = {}
+
+    for c, column in enumerate(self.column_bundle.GetColumnIterator()):
+      if column.slice_role == 'dimension':
+        distinct_values = set([row[c] for row in rows])
+
+        if column.total_val:
+          distinct_values.discard(column.total_val)
+
+        distinct_counts[column.column_id] = len(distinct_values)
+
+    return (len(rows), distinct_counts)
+
+  def GetColumnFingerprints(self):
+    """Fingerprint the values in each column.
+
+    Returns:
+      A dictionary mapping column IDs to fingerprints; see
+      DataSource.GetColumnFingerprints
+    """
+    rows = self.data_container.rows
+    column_fingerprints = {}
+
+    for c, column in enumerate(self.column_bundle.GetColumnIterator()):
+      column_fingerprints[column.column_id] = data_source.FingerprintValues(
+          row[c] for row in rows)
+
+    return column_fingerprints
+
+  def GetParallelQueryMode(self):
+    """Queries only read the data container, so can run in forked processes."""
+    return 'process'
+
+  def SetSortOrder(self, column_ids):
+    """Sort the data container rows once for the upcoming slice queries.
+
+    Args:
+      column_ids: A sequence of column IDs, most significant first
+    """
+    if self.verbose:
+      print 'Sorting data by %s' % list(column_ids)
+
+    phase = self.run_report.StartPhase('sort')
+    self.data_container.SortRows(column_ids)
+    phase.Finish(rows_in=len(self.data_container.rows))
+
   def Close(self):
     """Close this data source."""
     pass
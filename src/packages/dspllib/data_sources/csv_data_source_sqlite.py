@@ -44,15 +44,17 @@ required by the DataSource interface.
 __author__ = 'Benjamin Yolken <yolken@google.com>'
 
 import csv
+import itertools
 import os
-import re
 import shutil
 import sqlite3
 import string
 import tempfile
+import threading
 
 import csv_utilities
 import data_source
+from dspllib import reporting
 
 
 # Mapping from DSPL to sqlite data types
@@ -64,38 +66,67 @@ _DSPL_TYPE_TO_SQLITE_TYPE = {
     'boolean': 'text'}
 
 
-def _CleanDBValue(value, data_type):
-  """Clean the argument value for import into sqlite.
+# Number of CSV rows to transform and insert at a time
+_CHUNK_SIZE = 10000
 
-  TODO(yolken): Make this more sophisticated, particularly for integer and
-                float values.
+
+def _CleanString(value):
+  """Clean a string or date value for import into sqlite.
+
+  Args:
+    value: A UTF-8 encoded value from the CSV
+
+  Returns:
+    A unicode string, as sqlite3 only accepts ASCII byte strings
+
+  Raises:
+    ValueError: If the value isn't valid UTF-8
+  """
+  return value.strip().decode('utf-8')
+
+
+def _CleanInteger(value):
+  """Clean an integer value for import into sqlite.
+
+  Dollar signs and commas are removed. As with sqlite's integer type affinity,
+  values with fractional parts are kept as floats.
 
   Args:
-    value: A value from the table
-    data_type: The DSPL data type for the value
+    value: A value from the CSV
 
   Returns:
-    A cleaned value that will be accepted by sqlite
+    An integer or float
+
+  Raises:
+    ValueError: If the value isn't numeric
   """
-  cleaned_value = value.strip()
+  cleaned_value = value.strip().replace('$', '').replace(',', '')
+
+  try:
+    return int(cleaned_value)
+  except ValueError:
+    return float(cleaned_value)
+
+
+def _CleanFloat(value):
+  """Clean a float value for import into sqlite, removing '$' and ','."""
+  return float(value.strip().replace('$', '').replace(',', ''))
 
-  if data_type == 'string' or data_type == 'date':
-    # Escape single quotes
-    cleaned_value = cleaned_value.replace('\'', '\'\'')
 
-    # Add quotation marks around value
-    return '\'%s\'' % cleaned_value
-  elif data_type == 'integer' or data_type == 'float':
-    # Remove dollar symbols
-    return re.sub('[\$\,]', '', cleaned_value)
-  else:
-    return cleaned_value
+# Mapping from DSPL data types to functions that clean CSV values for sqlite
+_DSPL_TYPE_TO_CLEAN_FUNCTION = {
+    'string': _CleanString,
+    'integer': _CleanInteger,
+    'float': _CleanFloat,
+    'date': _CleanString,
+    'boolean': _CleanString}
 
 
 class CSVDataSourceSqlite(data_source.DataSource):
   """A DataSource around a single CSV file, backed by a sqlite instance."""
 
-  def __init__(self, csv_file, verbose=True):
+  def __init__(self, csv_file, verbose=True, num_workers=1, prescan=False,
+               widen_types=False, run_report=None):
     """Populate a CSVDataSourceSqlite object based on a CSV file.
 
     Note that the caller is responsible for closing the csv_file.
@@ -103,13 +134,35 @@ class CSVDataSourceSqlite(data_source.DataSource):
     Args:
       csv_file: A file-like object, opened for reading, that has CSV data in it
       verbose: Print out status messages to stdout
+      num_workers: Number of worker processes to use for the pre-scan; only
+                   used if csv_file is a file on disk
+      prescan: Check every value against its column's type and format before
+               loading the data
+      widen_types: During the pre-scan, widen guessed integer columns to
+                   floats if they contain float values
+      run_report: A reporting.RunReport object to record the time taken by
+                  each phase of loading in, or None
 
     Raises:
       DataSourceError: If CSV isn't properly formatted
     """
     self.sqlite_dir = tempfile.mkdtemp()
     self.verbose = verbose
+    self.run_report = run_report or reporting.RunReport()
+
+    phase = self.run_report.StartPhase('parse_header')
     self.column_bundle = csv_utilities.ConstructColumnBundle(csv_file, verbose)
+    phase.Finish()
+
+    if prescan:
+      if self.verbose:
+        print 'Checking CSV values'
+
+      phase = self.run_report.StartPhase('prescan')
+      csv_utilities.CheckColumnValues(
+          csv_file, self.column_bundle, num_workers, widen_types,
+          strip_currency=True, verbose=verbose)
+      phase.Finish()
 
     num_columns = self.column_bundle.GetNumColumns()
 
@@ -123,58 +176,63 @@ class CSVDataSourceSqlite(data_source.DataSource):
     if self.verbose:
       print '\nCreating sqlite3 table: %s' % (columns_string)
 
-    self.sqlite_connection = sqlite3.connect(
-        os.path.join(self.sqlite_dir, 'db.dat'))
+    self.sqlite_path = os.path.join(self.sqlite_dir, 'db.dat')
+    self.sqlite_connection = sqlite3.connect(self.sqlite_path)
+
+    # sqlite connections can only be used by the threads that created them, so
+    # queries from other threads use connections of their own, which are kept
+    # track of so that Close can close them
+    self.thread_connections = threading.local()
+    self.thread_connections.connection = self.sqlite_connection
+    self.other_thread_connections = []
+    self.other_thread_connections_lock = threading.Lock()
+
     cursor = self.sqlite_connection.cursor()
     cursor.execute('create table csv_table (%s)' % (columns_string))
 
     if self.verbose:
       print 'Adding CSV data to SQLite table'
 
-    body_csv_reader = csv.reader(csv_file, delimiter=',', quotechar='"')
-    body_csv_reader.next()
+    columns = list(self.column_bundle.GetColumnIterator())
+    converters = [_DSPL_TYPE_TO_CLEAN_FUNCTION[column.data_type]
+                  for column in columns]
+    column_transformer = csv_utilities.ColumnTransformer(
+        columns, converters, [converter('0') for converter in converters])
 
-    for r, row in enumerate(body_csv_reader):
-      transformed_row_values = []
+    insert_statement = 'insert into csv_table values (%s)' % (
+        ','.join(['?'] * num_columns))
 
-      # Ignore blank rows
-      if row:
-        if len(row) != num_columns:
-          raise data_source.DataSourceError(
-              'Number of columns in row %d (%d) does not match number '
-              'expected (%d)' %  (r + 2, len(row), num_columns))
+    phase = self.run_report.StartPhase('ingest')
 
-        skip_row = False
+    body_csv_reader = csv.reader(csv_file, delimiter=',', quotechar='"')
+    body_csv_reader.next()
 
-        for v, row_value in enumerate(row):
-          column = self.column_bundle.GetColumnByOrder(v)
+    # Count the header as the first record
+    row_number = 1
 
-          # Handle dropif_val and zeroif_val parameters
-          if 'dropif_val' in column.internal_parameters:
-            if row_value == column.internal_parameters['dropif_val']:
-              skip_row = True
-              break
-          elif 'zeroif_val' in column.internal_parameters:
-            if row_value == column.internal_parameters['zeroif_val']:
-              row_value = '0'
+    while True:
+      chunk = list(itertools.islice(body_csv_reader, _CHUNK_SIZE))
 
-          transformed_row_values.append(
-              _CleanDBValue(
-                  row_value, column.data_type))
+      if not chunk:
+        break
 
-        if skip_row:
-          continue
+      value_columns, bad_record = column_transformer.TransformChunk(chunk)
 
-        # Add row to sqlite table
-        transformed_values_str = ','.join(transformed_row_values)
+      if bad_record:
+        (r, c, value) = bad_record
+        raise data_source.DataSourceError(
+            csv_utilities.FormatRecordIssue(
+                columns, row_number + r + 1, c, value))
 
-        try:
-          cursor.execute('insert into csv_table values (%s)' %
-                         (transformed_values_str))
-        except sqlite3.OperationalError as e:
-          raise data_source.DataSourceError(
-              'Error putting line %d of input file into database: %s'
-              '\n%s' % (r + 2, transformed_values_str, str(e)))
+      # Add rows to sqlite table
+      try:
+        cursor.executemany(insert_statement, itertools.izip(*value_columns))
+      except sqlite3.Error as e:
+        raise data_source.DataSourceError(
+            'Error putting lines %d-%d of input file into database: %s' %
+            (row_number + 1, row_number + len(chunk), str(e)))
+
+      row_number += len(chunk)
 
     if self.verbose:
       print 'Committing transactions\n'
@@ -183,10 +241,14 @@ class CSVDataSourceSqlite(data_source.DataSource):
 
     cursor.close()
 
+    phase.Finish(rows_in=row_number - 1, rows_out=row_number - 1)
+
     if self.verbose:
       print 'Checking concept hierarchies'
 
+    phase = self.run_report.StartPhase('check_hierarchies')
     self._CheckHierarchies()
+    phase.Finish()
 
   def GetColumnBundle(self):
     """Get ColumnBundle object for this data source."""
@@ -229,6 +291,25 @@ class CSVDataSourceSqlite(data_source.DataSource):
 
     cursor.close()
 
+  def _GetConnection(self):
+    """Get a connection to the sqlite database for the current thread."""
+    connection = getattr(self.thread_connections, 'connection', None)
+
+    if connection is None:
+      # The connection is only used by this thread, but is closed by the one
+      # that calls Close
+      connection = sqlite3.connect(self.sqlite_path, check_same_thread=False)
+      self.thread_connections.connection = connection
+
+      self.other_thread_connections_lock.acquire()
+
+      try:
+        self.other_thread_connections.append(connection)
+      finally:
+        self.other_thread_connections_lock.release()
+
+    return connection
+
   def GetTableData(self, query_parameters):
     """Calculate and return the requested table data.
 
@@ -325,7 +406,7 @@ class CSVDataSourceSqlite(data_source.DataSource):
       print 'Executing query:\n%s\n' % (query_str)
 
     # Execute the query against the sqlite backend
-    cursor = self.sqlite_connection.cursor()
+    cursor = self._GetConnection().cursor()
 
     try:
       cursor.execute(query_str)
@@ -342,7 +423,189 @@ class CSVDataSourceSqlite(data_source.DataSource):
 
     return data_source.TableData(rows=query_results)
 
+  def GetTableDataBatch(self, query_parameters_list):
+    """Calculate and return the data for several tables.
+
+    Concept queries are answered together with a single SELECT DISTINCT over
+    all of the columns they use, whose results are then projected onto the
+    columns of each query.
+
+    Args:
+      query_parameters_list: A sequence of QueryParameters objects
+
+    Returns:
+      A list of TableData objects, one for each query, in the same order
+
+    Raises:
+      DataSourceError: If query against sqlite instance fails
+    """
+    concept_query_indices = [
+        q for q, query_parameters in enumerate(query_parameters_list)
+        if query_parameters.query_type ==
+        data_source.QueryParameters.CONCEPT_QUERY]
+
+    table_data_list = [None] * len(query_parameters_list)
+
+    if len(concept_query_indices) > 1:
+      union_column_ids = []
+
+      for q in concept_query_indices:
+        for column_id in query_parameters_list[q].column_ids:
+          if column_id not in union_column_ids:
+            union_column_ids.append(column_id)
+
+      query_str = 'SELECT DISTINCT %s FROM csv_table' % (
+          ','.join(union_column_ids))
+
+      if self.verbose:
+        print 'Executing query:\n%s\n' % (query_str)
+
+      cursor = self._GetConnection().cursor()
+
+      try:
+        cursor.execute(query_str)
+      except sqlite3.OperationalError as e:
+        raise data_source.DataSourceError(
+            'Error executing query: %s\n%s' % (query_str, str(e)))
+
+      # For each query, the positions of its columns in the union and the
+      # total values to leave out
+      query_plans = []
+
+      for q in concept_query_indices:
+        positions = []
+        total_checks = []
+
+        for column_id in query_parameters_list[q].column_ids:
+          positions.append(union_column_ids.index(column_id))
+          column = self.column_bundle.GetColumnByID(column_id)
+
+          if column.total_val:
+            total_checks.append((positions[-1], column.total_val))
+
+        query_plans.append((positions, total_checks, set()))
+
+      for row in cursor:
+        for positions, total_checks, observed_values in query_plans:
+          for position, total_val in total_checks:
+            if row[position] == total_val:
+              break
+          else:
+            observed_values.add(tuple([row[p] for p in positions]))
+
+      cursor.close()
+
+      for q, (unused_positions, unused_checks, observed_values) in zip(
+          concept_query_indices, query_plans):
+        table_data_list[q] = data_source.TableData(
+            rows=sorted([list(values) for values in observed_values]))
+
+    for q, query_parameters in enumerate(query_parameters_list):
+      if table_data_list[q] is None:
+        table_data_list[q] = self.GetTableData(query_parameters)
+
+    return table_data_list
+
+  def GetCardinalities(self):
+    """Count the rows and the distinct values of each dimension column.
+
+    Returns:
+      A (num_rows, distinct_counts) tuple; see DataSource.GetCardinalities
+
+    Raises:
+      DataSourceError: If query against sqlite instance fails
+    """
+    dimension_columns = [
+        column for column in self.column_bundle.GetColumnIterator()
+        if column.slice_role == 'dimension']
+
+    # NULLIF turns total values into NULLs, which COUNT ignores
+    query_str = 'SELECT COUNT(*)%s FROM csv_table' % ''.join(
+        [', COUNT(DISTINCT NULLIF(%s, ?))' % column.column_id
+         for column in dimension_columns])
+
+    cursor = self._GetConnection().cursor()
+
+    try:
+      cursor.execute(
+          query_str,
+          [column.total_val or None for column in dimension_columns])
+    except sqlite3.OperationalError as e:
+      raise data_source.DataSourceError(
+          'Error executing query: %s\n%s' % (query_str, str(e)))
+
+    counts = cursor.fetchone()
+    cursor.close()
+
+    return (counts[0],
+            dict([(column.column_id, count) for column, count in
+                  zip(dimension_columns, counts[1:])]))
+
+  def GetColumnFingerprints(self):
+    """Fingerprint the values in each column, in insertion order.
+
+    Returns:
+      A dictionary mapping column IDs to fingerprints; see
+      DataSource.GetColumnFingerprints
+    """
+    cursor = self._GetConnection().cursor()
+    column_fingerprints = {}
+
+    for column in self.column_bundle.GetColumnIterator():
+      cursor.execute(
+          'SELECT %s FROM csv_table ORDER BY rowid' % column.column_id)
+      column_fingerprints[column.column_id] = data_source.FingerprintValues(
+          row[0] for row in cursor)
+
+    cursor.close()
+
+    return column_fingerprints
+
+  def GetParallelQueryMode(self):
+    """Queries use a separate sqlite connection in each thread."""
+    return 'thread'
+
+  def SetSortOrder(self, column_ids):
+    """Index the table so that slice queries can group without sorting.
+
+    Args:
+      column_ids: A sequence of column IDs, most significant first
+
+    Raises:
+      DataSourceError: If the index can't be created
+    """
+    if not column_ids:
+      return
+
+    if self.verbose:
+      print 'Indexing data by %s' % list(column_ids)
+
+    phase = self.run_report.StartPhase('sort')
+    cursor = self.sqlite_connection.cursor()
+
+    try:
+      cursor.execute('DROP INDEX IF EXISTS csv_table_sort_index')
+      cursor.execute('CREATE INDEX csv_table_sort_index ON csv_table (%s)' %
+                     ','.join(column_ids))
+    except sqlite3.Error as e:
+      raise data_source.DataSourceError(
+          'Error indexing sqlite table: %s' % str(e))
+
+    self.sqlite_connection.commit()
+    cursor.close()
+    phase.Finish()
+
   def Close(self):
-    """Close this data source."""
+    """Close this data source and all of its sqlite connections."""
+    self.other_thread_connections_lock.acquire()
+
+    try:
+      for connection in self.other_thread_connections:
+        connection.close()
+
+      self.other_thread_connections = []
+    finally:
+      self.other_thread_connections_lock.release()
+
     self.sqlite_connection.close()
     shutil.rmtree(self.sqlite_dir)
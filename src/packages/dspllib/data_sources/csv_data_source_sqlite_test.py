@@ -34,10 +34,14 @@
 
 __author__ = 'Benjamin Yolken <yolken@google.com>'
 
+import sqlite3
+import StringIO
+import threading
 import unittest
 
 import csv_data_source_sqlite
 import csv_sources_test_suite
+import data_source
 
 
 class CSVDataSourceSqliteTests(csv_sources_test_suite.CSVSourcesTests):
@@ -48,6 +52,31 @@ class CSVDataSourceSqliteTests(csv_sources_test_suite.CSVSourcesTests):
 
     super(CSVDataSourceSqliteTests, self).setUp()
 
+  def testCloseThreadConnections(self):
+    """Test that Close closes the connections of query threads too."""
+    data_source_obj = self.data_source_class(
+        StringIO.StringIO(csv_sources_test_suite._TEST_CSV_CONTENT),
+        verbose=False)
+    thread_connections = []
+
+    def RunQuery():
+      data_source_obj.GetTableData(
+          data_source.QueryParameters(
+              data_source.QueryParameters.CONCEPT_QUERY, ['category2']))
+      thread_connections.append(data_source_obj._GetConnection())
+
+    query_thread = threading.Thread(target=RunQuery)
+    query_thread.start()
+    query_thread.join()
+
+    self.assertEqual(len(thread_connections), 1)
+    self.assertNotEqual(thread_connections[0],
+                        data_source_obj.sqlite_connection)
+
+    data_source_obj.Close()
+
+    self.assertRaises(sqlite3.ProgrammingError, thread_connections[0].cursor)
+
 
 class CSVDataSourceSqliteErrorTests(
     csv_sources_test_suite.CSVSourcesErrorTests):
@@ -34,10 +34,14 @@
 
 __author__ = 'Benjamin Yolken <yolken@google.com>'
 
+import os
+import StringIO
+import tempfile
 import unittest
 
 import csv_data_source
 import csv_sources_test_suite
+import data_source
 
 
 class CSVDataSourceTests(csv_sources_test_suite.CSVSourcesTests):
@@ -58,5 +62,141 @@ class CSVDataSourceErrorTests(csv_sources_test_suite.CSVSourcesErrorTests):
     super(CSVDataSourceErrorTests, self).setUp()
 
 
+class CSVDataSourceFileTests(unittest.TestCase):
+  """Tests of reading CSV files on disk, serially and in parallel."""
+
+  def setUp(self):
+    csv_file_params = tempfile.mkstemp()
+
+    os.close(csv_file_params[0])
+    self.csv_file_path = csv_file_params[1]
+
+  def tearDown(self):
+    os.remove(self.csv_file_path)
+
+  def _WriteCSV(self, csv_content):
+    csv_file = open(self.csv_file_path, 'w')
+    csv_file.write(csv_content)
+    csv_file.close()
+
+  def testFileMatchesStream(self):
+    """Test that files on disk produce the same rows as in-memory streams."""
+    self._WriteCSV(csv_sources_test_suite._TEST_CSV_CONTENT)
+
+    csv_file = open(self.csv_file_path, 'r')
+    file_data_source = csv_data_source.CSVDataSource(csv_file, verbose=False)
+    csv_file.close()
+
+    csv_file = StringIO.StringIO(csv_sources_test_suite._TEST_CSV_CONTENT)
+    stream_data_source = csv_data_source.CSVDataSource(
+        csv_file, verbose=False)
+    csv_file.close()
+
+    self.assertEqual(file_data_source.data_container.rows,
+                     stream_data_source.data_container.rows)
+
+  def testParallelMatchesSerial(self):
+    """Test that parallel parsing produces the same rows as serial parsing."""
+    self._WriteCSV(csv_sources_test_suite._TEST_CSV_CONTENT)
+
+    csv_file = open(self.csv_file_path, 'r')
+    serial_data_source = csv_data_source.CSVDataSource(
+        csv_file, verbose=False)
+    csv_file.close()
+
+    csv_file = open(self.csv_file_path, 'r')
+    parallel_data_source = csv_data_source.CSVDataSource(
+        csv_file, verbose=False, num_workers=3)
+    csv_file.close()
+
+    self.assertEqual(
+        [list(r) for r in parallel_data_source.data_container.rows],
+        [list(r) for r in serial_data_source.data_container.rows])
+
+  def testParallelBadRowNumber(self):
+    """Test that errors refer to the correct row across byte ranges."""
+    self._WriteCSV(
+        'date,category,metric\n' +
+        ''.join(['1/1/2001,"quoted\nvalue",%d\n' % i for i in range(50)]) +
+        '1/1/2001,extra,value,3\n' +
+        ''.join(['1/1/2001,other,%d\n' % i for i in range(50)]))
+
+    csv_file = open(self.csv_file_path, 'r')
+
+    try:
+      csv_data_source.CSVDataSource(csv_file, verbose=False, num_workers=4)
+      self.fail('Expected DataSourceError')
+    except data_source.DataSourceError as error:
+      self.assertTrue('row 52 (4)' in str(error))
+
+    csv_file.close()
+
+  def testProgressCallback(self):
+    """Test that progress is reported after each chunk of rows."""
+    self._WriteCSV(csv_sources_test_suite._TEST_CSV_CONTENT)
+    progress_reports = []
+
+    def RecordProgress(progress):
+      progress_reports.append((progress.rows_read, progress.bytes_read))
+
+    for csv_file in [open(self.csv_file_path, 'r'),
+                     StringIO.StringIO(csv_sources_test_suite._TEST_CSV_CONTENT)]:
+      del progress_reports[:]
+
+      csv_data_source.CSVDataSource(
+          csv_file, verbose=False, chunk_size=5,
+          progress_callback=RecordProgress)
+      csv_file.close()
+
+      num_records = (
+          len(csv_sources_test_suite._TEST_CSV_CONTENT.splitlines()) - 1)
+
+      self.assertEqual(len(progress_reports), (num_records + 4) / 5)
+      self.assertEqual(progress_reports[0][0], 5)
+      self.assertEqual(
+          progress_reports[-1],
+          (num_records, len(csv_sources_test_suite._TEST_CSV_CONTENT)))
+
+  def testMemoryLimit(self):
+    """Test that reading stops early if the memory limit would be exceeded."""
+    self._WriteCSV(
+        'date,category,metric\n' +
+        ''.join(['1/1/2001,category,%d\n' % i for i in range(1000)]))
+
+    for num_workers in [1, 2]:
+      csv_file = open(self.csv_file_path, 'r')
+      progress_reports = []
+
+      try:
+        csv_data_source.CSVDataSource(
+            csv_file, verbose=False, num_workers=num_workers, chunk_size=100,
+            memory_limit=1000, progress_callback=progress_reports.append)
+        self.fail('Expected MemoryLimitError')
+      except data_source.MemoryLimitError as error:
+        self.assertTrue('exceeds the memory limit' in str(error))
+
+      csv_file.close()
+
+      # Only the first chunk or byte range should have been read
+      self.assertEqual(len(progress_reports), 1)
+      self.assertTrue(progress_reports[0].rows_read < 1000)
+
+  def testChunkSizeTooSmall(self):
+    """Test that chunk sizes less than one are rejected."""
+    self._WriteCSV('date,category,metric\n1/1/2001,category,1\n')
+
+    for chunk_size in [0, -1]:
+      csv_file = open(self.csv_file_path, 'r')
+
+      try:
+        csv_data_source.CSVDataSource(
+            csv_file, verbose=False, chunk_size=chunk_size)
+        self.fail('Expected DataSourceError')
+      except data_source.DataSourceError as error:
+        self.assertTrue('Chunk size must be at least 1' in str(error))
+
+      csv_file.close()
+
+
 if __name__ == '__main__':
   unittest.main()
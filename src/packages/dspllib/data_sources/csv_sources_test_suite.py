@@ -143,6 +143,66 @@ class CSVSourcesTests(unittest.TestCase):
         table_data.rows,
         [['red', 21 + 33, (98.0 + 90.0) / 2.0, 2]])
 
+  def testBatchedTableGeneration(self):
+    """Test that batched queries produce the same tables as single queries."""
+    query_parameters_list = [
+        data_source.QueryParameters(
+            data_source.QueryParameters.CONCEPT_QUERY, ['category2']),
+        data_source.QueryParameters(
+            data_source.QueryParameters.SLICE_QUERY,
+            ['category1', 'metric1', 'metric2', 'metric3']),
+        data_source.QueryParameters(
+            data_source.QueryParameters.CONCEPT_QUERY,
+            ['category2', 'category3']),
+        data_source.QueryParameters(
+            data_source.QueryParameters.CONCEPT_QUERY, ['category1'])]
+
+    self.assertEqual(
+        [table_data.rows for table_data in
+         self.data_source_obj.GetTableDataBatch(query_parameters_list)],
+        [self.data_source_obj.GetTableData(query_parameters).rows
+         for query_parameters in query_parameters_list])
+
+  def testSortedSliceTableGeneration(self):
+    """Test that a shared sort order doesn't change slice tables."""
+    query_parameters_list = [
+        data_source.QueryParameters(
+            data_source.QueryParameters.SLICE_QUERY, column_ids)
+        for column_ids in [['date', 'category1', 'metric1'],
+                           ['category2', 'date', 'metric1', 'metric2'],
+                           ['category1', 'category3', 'metric2', 'metric3'],
+                           ['category3', 'metric1']]]
+
+    unsorted_rows = [self.data_source_obj.GetTableData(query_parameters).rows
+                     for query_parameters in query_parameters_list]
+
+    for sort_order in [['category1', 'category2', 'date'],
+                       ['category3', 'category1', 'date'], ['date']]:
+      self.data_source_obj.SetSortOrder(sort_order)
+
+      self.assertEqual(
+          [self.data_source_obj.GetTableData(query_parameters).rows
+           for query_parameters in query_parameters_list],
+          unsorted_rows)
+
+  def testCardinalities(self):
+    """Test that rows and distinct dimension values are counted."""
+    self.assertEqual(
+        self.data_source_obj.GetCardinalities(),
+        (8, {'date': 7, 'category1': 2, 'category2': 3, 'category3': 2}))
+
+  def testColumnFingerprints(self):
+    """Test that each column's values are fingerprinted."""
+    column_fingerprints = self.data_source_obj.GetColumnFingerprints()
+
+    self.assertEqual(
+        sorted(column_fingerprints.keys()),
+        ['category1', 'category2', 'category3', 'date', 'metric1', 'metric2',
+         'metric3'])
+    self.assertEqual(len(set(column_fingerprints.values())), 7)
+    self.assertEqual(self.data_source_obj.GetColumnFingerprints(),
+                     column_fingerprints)
+
 
 class CSVSourcesErrorTests(unittest.TestCase):
   """Tests of a CSV DataSource object for error cases."""
@@ -220,6 +280,19 @@ class CSVSourcesErrorTests(unittest.TestCase):
 
     csv_file.close()
 
+  def testBadDataValue(self):
+    """Test that a value that doesn't match its column type causes error."""
+    csv_file = StringIO.StringIO(
+        'date,metric\n1/1/2001,10\n\n1/3/2001,abc\n1/4/2001,12')
+
+    try:
+      self.data_source_class(csv_file, False)
+      self.fail('Expected DataSourceError')
+    except data_source.DataSourceError as error:
+      self.assertTrue('row 4 of column metric' in str(error))
+
+    csv_file.close()
+
   def testBadParentReference(self):
     """Test that illegal parent reference causes error."""
     csv_file = StringIO.StringIO(
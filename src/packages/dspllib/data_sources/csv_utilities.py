@@ -35,13 +35,42 @@ __author__ = 'Benjamin Yolken <yolken@google.com>'
 
 
 import csv
+import itertools
+import mmap
+import multiprocessing
+import os
 import re
 import string
+import struct
+import sys
+import time
 import warnings
 
 import data_source
 
 
+# Number of bytes read at a time when scanning a CSV file for record boundaries
+_SCAN_BLOCK_SIZE = 1 << 20
+
+# Number of bytes of a memory-mapped CSV file that are parsed at a time
+_MAPPED_BLOCK_SIZE = 1 << 20
+
+# Number of byte ranges to create per worker when scanning in parallel
+_RANGES_PER_WORKER = 4
+
+# Size of an object reference, used when estimating memory use
+_POINTER_SIZE = struct.calcsize('P')
+
+# Mapping from Joda datetime format elements to regular expressions
+_DATE_FORMAT_ELEMENTS = [
+    ('yyyy', '[0-9]{4}'),
+    ('yy', '[0-9]{2}'),
+    ('MM', '[0-9]{1,2}'),
+    ('M', '[0-9]{1,2}'),
+    ('dd', '[0-9]{1,2}'),
+    ('d', '[0-9]{1,2}')]
+
+
 def _HeaderToColumn(header_string):
   """Parse the header string for a column.
 
@@ -179,6 +208,7 @@ def ConstructColumnBundle(csv_file, verbose=True):
     if not column.data_type:
       column.data_type = (
           data_source.GuessDataType(second_row_values[c], column.column_id))
+      column.internal_parameters['guessed_type'] = True
 
       if verbose:
         print 'Guessing that column %s is of type %s' % (
@@ -229,6 +259,7 @@ def ConstructColumnBundle(csv_file, verbose=True):
       if not column.data_format:
         column.data_format = (
             data_source.GuessDateFormat(second_row_values[c]))
+        column.internal_parameters['guessed_format'] = True
 
       if not column.concept_ref:
         column.concept_ref = (
@@ -253,3 +284,811 @@ def ConstructColumnBundle(csv_file, verbose=True):
                   data_source.DataSourceWarning)
 
   return column_bundle
+
+
+def IsFileOnDisk(csv_file):
+  """Determine whether a file-like object corresponds to a file on disk."""
+  csv_path = getattr(csv_file, 'name', '')
+
+  return bool(csv_path) and os.path.isfile(csv_path)
+
+
+def SplitCSVFile(csv_file, num_ranges):
+  """Split the body of a CSV file into byte ranges aligned to record boundaries.
+
+  The file is scanned once, in blocks, keeping track of whether the current
+  position is inside a quoted field. Each range ends just after a newline that
+  is not inside quotes, so records with embedded newlines are never split
+  across ranges. Note that this assumes that quote characters only appear in
+  quoted fields, as in well-formed CSV.
+
+  Args:
+    csv_file: A file-like object, opened for reading, that has CSV data in it
+    num_ranges: The (maximum) number of ranges to create; fewer are returned
+                if the file has too few records
+
+  Returns:
+    A list of (start, end) byte offset tuples, in file order, that together
+    cover every record after the header.
+  """
+  csv_file.seek(0, 2)
+  file_size = csv_file.tell()
+  csv_file.seek(0)
+
+  # The first target finds the end of the header record
+  pending_targets = [file_size * r / num_ranges for r in range(num_ranges)]
+  boundaries = []
+
+  in_quotes = False
+  searching = False
+  block_start = 0
+
+  while pending_targets or searching:
+    block = csv_file.read(_SCAN_BLOCK_SIZE)
+
+    if not block:
+      break
+
+    position = 0
+
+    while True:
+      if not searching:
+        if (not pending_targets or
+            pending_targets[0] >= block_start + len(block)):
+          break
+
+        target_position = max(pending_targets.pop(0) - block_start, position)
+
+        if block.count('"', position, target_position) % 2:
+          in_quotes = not in_quotes
+
+        position = target_position
+        searching = True
+
+      # Look for the end of the record containing the current position
+      newline_position = block.find('\n', position)
+
+      if newline_position == -1:
+        break
+
+      if block.count('"', position, newline_position) % 2:
+        in_quotes = not in_quotes
+
+      position = newline_position + 1
+
+      if not in_quotes:
+        boundary = block_start + position
+        boundaries.append(boundary)
+        searching = False
+
+        # Drop targets that fall inside the record just passed over
+        while pending_targets and pending_targets[0] <= boundary:
+          pending_targets.pop(0)
+
+    if block.count('"', position) % 2:
+      in_quotes = not in_quotes
+
+    block_start += len(block)
+
+  csv_file.seek(0)
+
+  boundaries.append(file_size)
+
+  return [(boundaries[b], boundaries[b + 1])
+          for b in range(len(boundaries) - 1)
+          if boundaries[b] < boundaries[b + 1]]
+
+
+class MappedCSVReader(object):
+  """Reads the records in a byte range of a memory-mapped CSV file.
+
+  The mapped data are parsed a block at a time. Blocks without any quote
+  characters are split directly on newlines and commas, which avoids copying
+  the data through file buffers and the csv module; blocks with quotes are
+  extended until they end outside a quoted field and then passed to csv.reader,
+  so quoted commas and newlines are handled the same way as elsewhere.
+  """
+
+  def __init__(self, csv_file, start=0, end=None):
+    """Create a new MappedCSVReader object.
+
+    Note that the caller is responsible for closing the csv_file.
+
+    Args:
+      csv_file: A file object, opened for reading, for a CSV file on disk
+      start: Byte offset of the first record to read; must be at a record
+             boundary
+      end: Byte offset just past the last record to read, or None for the end
+           of the file
+    """
+    file_size = os.fstat(csv_file.fileno()).st_size
+
+    if file_size:
+      self.mapped_file = mmap.mmap(
+          csv_file.fileno(), 0, access=mmap.ACCESS_READ)
+    else:
+      # Empty files can't be mapped
+      self.mapped_file = ''
+
+    self.start = start
+
+    if end is None:
+      self.end = file_size
+    else:
+      self.end = end
+
+    # Byte offset just past the data parsed so far by __iter__
+    self.position = start
+
+  def _RecordEnd(self, position):
+    """Get the offset just past the record that contains a position."""
+    newline_position = self.mapped_file.find('\n', position, self.end)
+
+    if newline_position == -1:
+      return self.end
+    else:
+      return newline_position + 1
+
+  def IterRecordChunks(self):
+    """Iterate over the records in the byte range, a block at a time.
+
+    Yields:
+      A (records, end_position) tuple for each block, where records is a list
+      with one list of string values per record (empty for blank lines) and
+      end_position is the byte offset just past the block.
+    """
+    position = self.start
+
+    while position < self.end:
+      block_end = min(position + _MAPPED_BLOCK_SIZE, self.end)
+
+      if block_end < self.end:
+        newline_position = self.mapped_file.rfind('\n', position, block_end)
+
+        if newline_position == -1:
+          # Record is longer than the block size
+          block_end = self._RecordEnd(block_end)
+        else:
+          block_end = newline_position + 1
+
+      block = self.mapped_file[position:block_end]
+
+      if '"' in block:
+        # Make sure that the block doesn't end inside a quoted field
+        while block.count('"') % 2 and block_end < self.end:
+          block_end = self._RecordEnd(block_end)
+          block = self.mapped_file[position:block_end]
+
+        lines = block.split('\n')
+
+        if block.endswith('\n'):
+          lines.pop()
+
+        records = list(csv.reader(
+            [line + '\n' for line in lines], delimiter=',', quotechar='"'))
+      else:
+        lines = block.split('\n')
+
+        if block.endswith('\n'):
+          lines.pop()
+
+        if '\r' in block:
+          lines = [line.rstrip('\r') for line in lines]
+
+        records = [line.split(',') if line else [] for line in lines]
+
+      yield (records, block_end)
+
+      position = block_end
+
+  def __iter__(self):
+    """Iterate over the records in the byte range, one at a time."""
+    for records, end_position in self.IterRecordChunks():
+      self.position = end_position
+
+      for record in records:
+        yield record
+
+  def Close(self):
+    """Unmap the file."""
+    if self.mapped_file:
+      self.mapped_file.close()
+
+
+class CountingLineReader(object):
+  """Iterates over the lines of a file-like object, counting bytes read.
+
+  Used to track progress through CSV streams that are passed to csv.reader.
+  """
+
+  def __init__(self, csv_file):
+    """Create a new CountingLineReader object.
+
+    Args:
+      csv_file: A file-like object, opened for reading
+    """
+    self.csv_lines = iter(csv_file)
+    self.bytes_read = 0
+
+  def __iter__(self):
+    return self
+
+  def next(self):
+    """Get the next line of the file."""
+    line = self.csv_lines.next()
+    self.bytes_read += len(line)
+
+    return line
+
+
+def GetFileSize(csv_file):
+  """Get the total size of a file-like object in bytes.
+
+  Args:
+    csv_file: A file-like object
+
+  Returns:
+    The size of the file or, if it can't be determined, None
+  """
+  try:
+    return os.fstat(csv_file.fileno()).st_size
+  except (AttributeError, IOError, OSError):
+    pass
+
+  try:
+    position = csv_file.tell()
+    csv_file.seek(0, os.SEEK_END)
+    file_size = csv_file.tell()
+    csv_file.seek(position)
+
+    return file_size
+  except (AttributeError, IOError):
+    return None
+
+
+def EstimateRowSize(rows):
+  """Estimate the memory used by each of a sequence of parsed rows.
+
+  Strings are assumed to be interned, so are not counted.
+
+  Args:
+    rows: A non-empty sequence of rows, each a sequence of typed values
+
+  Returns:
+    The average number of bytes used by a row, including a reference to it
+  """
+  total_size = 0
+
+  for row in rows:
+    total_size += sys.getsizeof(row) + _POINTER_SIZE
+
+    for value in row:
+      if not isinstance(value, str):
+        total_size += sys.getsizeof(value)
+
+  return total_size / len(rows)
+
+
+class IngestProgress(object):
+  """Tracks the progress of reading a CSV file into memory.
+
+  Attributes:
+    rows_read: Number of records read so far
+    bytes_read: Number of bytes of the file read so far
+    total_bytes: Size of the file in bytes, or None if unknown
+    memory_used: Estimated number of bytes used by the data read so far
+    start_time: Time at which reading started, in seconds since the epoch
+  """
+
+  def __init__(self, total_bytes=None):
+    """Create a new IngestProgress object.
+
+    Args:
+      total_bytes: Size of the file in bytes, or None if unknown
+    """
+    self.rows_read = 0
+    self.bytes_read = 0
+    self.total_bytes = total_bytes
+    self.memory_used = 0
+    self.start_time = time.time()
+
+  def Update(self, rows_read, bytes_read, memory_used):
+    """Record the totals read so far."""
+    self.rows_read = rows_read
+    self.bytes_read = bytes_read
+    self.memory_used = memory_used
+
+  def GetElapsedSeconds(self):
+    """Get the number of seconds since reading started."""
+    return time.time() - self.start_time
+
+  def GetRowsPerSecond(self):
+    """Get the average number of rows read per second."""
+    elapsed_seconds = self.GetElapsedSeconds()
+
+    if elapsed_seconds > 0:
+      return self.rows_read / elapsed_seconds
+    else:
+      return 0.0
+
+  def GetFractionRead(self):
+    """Get the fraction of the file read so far, or None if unknown."""
+    if self.total_bytes:
+      return min(float(self.bytes_read) / self.total_bytes, 1.0)
+    elif self.total_bytes == 0:
+      return 1.0
+    else:
+      return None
+
+  def GetSecondsRemaining(self):
+    """Estimate the number of seconds until the whole file is read.
+
+    Returns:
+      A float or, if the file size is unknown or nothing has been read yet,
+      None
+    """
+    fraction_read = self.GetFractionRead()
+
+    if not fraction_read:
+      return None
+
+    return self.GetElapsedSeconds() * (1.0 - fraction_read) / fraction_read
+
+  def GetProjectedMemory(self):
+    """Estimate the number of bytes needed to hold the whole file.
+
+    Returns:
+      An integer or, if the file size is unknown or nothing has been read yet,
+      the memory used so far
+    """
+    fraction_read = self.GetFractionRead()
+
+    if not fraction_read:
+      return self.memory_used
+
+    return int(self.memory_used / fraction_read)
+
+  def __str__(self):
+    progress_string = '%d rows, %.1f MB read (%d rows/s)' % (
+        self.rows_read, self.bytes_read / float(1 << 20),
+        self.GetRowsPerSecond())
+
+    fraction_read = self.GetFractionRead()
+    seconds_remaining = self.GetSecondsRemaining()
+
+    if fraction_read is not None and seconds_remaining is not None:
+      progress_string += ', %.0f%% done, about %ds remaining' % (
+          100 * fraction_read, seconds_remaining)
+
+    return progress_string
+
+
+def FormatRecordIssue(columns, row_number, column_index, value):
+  """Describe a CSV record that is inconsistent with its columns.
+
+  Args:
+    columns: Sequence of DataSourceColumn objects for the record
+    row_number: Row number of the record in the file, starting from 1
+    column_index: Index of the column with the offending value, or None if the
+                  record has the wrong number of values
+    value: The offending value or, if column_index is None, the number of
+           values in the record
+
+  Returns:
+    A string describing the issue
+  """
+  if column_index is None:
+    return ('Number of columns in row %d (%d) does not match number '
+            'expected (%d)' % (row_number, value, len(columns)))
+
+  column = columns[column_index]
+
+  if column.data_type == 'date':
+    return ('Value in row %d of column %s does not match date format %s: %s' %
+            (row_number, column.column_id, column.data_format, value))
+  else:
+    return ('Value in row %d of column %s is not a valid %s: %s' %
+            (row_number, column.column_id, column.data_type, value))
+
+
+def _CompileColumnFunction(converter, zeroif_val, zero_value):
+  """Create a function that transforms all the values of a column at once.
+
+  Args:
+    converter: Function that converts a CSV string to its stored value, or
+               None to store strings as they are
+    zeroif_val: CSV value to replace with zero_value, or None
+    zero_value: Stored value for CSV values equal to zeroif_val
+
+  Returns:
+    A function that takes a sequence of CSV strings and returns a list of
+    stored values
+  """
+  if zeroif_val is None:
+    if converter is None:
+      return list
+    else:
+      return lambda values: map(converter, values)
+  else:
+    if converter is None:
+      return lambda values: [
+          zero_value if v == zeroif_val else v for v in values]
+    else:
+      return lambda values: [
+          zero_value if v == zeroif_val else converter(v) for v in values]
+
+
+class ColumnTransformer(object):
+  """Applies the header-declared transforms of each column to CSV records.
+
+  The dropif_val and zeroif_val parameters and the type conversion of each
+  column are compiled once into a single function, which is then applied to
+  all the values of the column in a chunk of records at a time. Rows with a
+  dropif_val are removed before any values are converted. As elsewhere, a
+  zeroif_val is ignored for columns that also have a dropif_val.
+  """
+
+  def __init__(self, columns, converters, zero_values):
+    """Create a new ColumnTransformer object.
+
+    Args:
+      columns: Sequence of DataSourceColumn objects for the records
+      converters: Sequence with one function per column that converts a CSV
+                  string to its stored value, or None to store the string as
+                  it is; must raise ValueError for invalid values
+      zero_values: Sequence with the stored value of each column to use for
+                   CSV values equal to its zeroif_val
+    """
+    self.num_columns = len(columns)
+    self.drop_filters = []
+    self.column_functions = []
+
+    for c, column in enumerate(columns):
+      if 'dropif_val' in column.internal_parameters:
+        self.drop_filters.append(
+            (c, column.internal_parameters['dropif_val']))
+        zeroif_val = None
+      else:
+        zeroif_val = column.internal_parameters.get('zeroif_val')
+
+      self.column_functions.append(
+          _CompileColumnFunction(converters[c], zeroif_val, zero_values[c]))
+
+  def _IsDropped(self, record):
+    """Determine whether a record should be dropped."""
+    for c, drop_value in self.drop_filters:
+      if record[c] == drop_value:
+        return True
+
+    return False
+
+  def _TransformRecords(self, records):
+    """Transform a list of non-blank records with the right number of values."""
+    if not records:
+      return [[] for c in range(self.num_columns)]
+
+    value_columns = zip(*records)
+
+    if self.drop_filters:
+      keep_mask = None
+
+      for c, drop_value in self.drop_filters:
+        if keep_mask is None:
+          keep_mask = [v != drop_value for v in value_columns[c]]
+        else:
+          keep_mask = [k and v != drop_value
+                       for k, v in itertools.izip(keep_mask, value_columns[c])]
+
+      if not all(keep_mask):
+        value_columns = [list(itertools.compress(values, keep_mask))
+                         for values in value_columns]
+
+    return [column_function(values) for column_function, values in
+            itertools.izip(self.column_functions, value_columns)]
+
+  def _FindInvalidValue(self, chunk):
+    """Find the first value in a chunk that can't be converted.
+
+    Returns:
+      A (record_index, column_index, value) tuple, or None
+    """
+    for r, record in enumerate(chunk):
+      if record and not self._IsDropped(record):
+        for c, column_function in enumerate(self.column_functions):
+          try:
+            column_function([record[c]])
+          except ValueError:
+            return (r, c, record[c])
+
+    return None
+
+  def TransformChunk(self, chunk):
+    """Transform a chunk of CSV records into columns of stored values.
+
+    Args:
+      chunk: A list of CSV records, each a list of string values (or empty for
+             blank lines, which are skipped)
+
+    Returns:
+      A (value_columns, bad_record) tuple. value_columns is a list with one list
+      of stored values per column, covering the records that weren't dropped.
+      bad_record is either None or a (record_index, column_index, value) tuple,
+      as taken by FormatRecordIssue, describing the first record in the chunk
+      that has the wrong number of values or an invalid value; in this case,
+      value_columns is empty.
+    """
+    records = filter(None, chunk)
+
+    for record_length in set(map(len, records)):
+      if record_length != self.num_columns:
+        for r, record in enumerate(chunk):
+          if record and len(record) != self.num_columns:
+            return ([], (r, None, len(record)))
+
+    try:
+      return (self._TransformRecords(records), None)
+    except ValueError as error:
+      bad_record = self._FindInvalidValue(chunk)
+
+      if bad_record is None:
+        raise error
+
+      return ([], bad_record)
+
+
+def _DateFormatToRegex(data_format):
+  """Convert a Joda datetime format into an equivalent regular expression.
+
+  Only the year, month, and day elements guessed by GuessDateFormat are
+  supported.
+
+  Args:
+    data_format: A string containing a Joda datetime format
+
+  Returns:
+    A compiled regular expression or, if the format has unsupported elements,
+    None.
+  """
+  regex_parts = []
+  position = 0
+
+  while position < len(data_format):
+    for (format_element, element_regex) in _DATE_FORMAT_ELEMENTS:
+      if data_format.startswith(format_element, position):
+        regex_parts.append(element_regex)
+        position += len(format_element)
+        break
+    else:
+      if data_format[position].isalpha():
+        return None
+
+      regex_parts.append(re.escape(data_format[position]))
+      position += 1
+
+  return re.compile('^%s$' % ''.join(regex_parts))
+
+
+def _IsInteger(value):
+  """Determine whether a string can be converted to an integer."""
+  try:
+    int(value)
+    return True
+  except ValueError:
+    return False
+
+
+def _IsFloat(value):
+  """Determine whether a string can be converted to a float."""
+  try:
+    float(value)
+    return True
+  except ValueError:
+    return False
+
+
+def _ScanRecords(records, columns, widenable_columns, strip_currency,
+                 max_issues):
+  """Check the values in a sequence of CSV records against their column types.
+
+  Values equal to a column's dropif_val, zeroif_val, or total_val are not
+  checked, nor are rows that would be dropped.
+
+  Args:
+    records: An iterable of CSV records, each a list of string values
+    columns: Sequence of DataSourceColumn objects for the records
+    widenable_columns: Set of indices of integer columns that can be widened
+                       to floats instead of reporting non-integer values
+    strip_currency: Remove '$' and ',' characters from numeric values before
+                    checking them
+    max_issues: Stop scanning after this many issues have been found
+
+  Returns:
+    A (num_records, issues, widened_columns) tuple. num_records is the number
+    of records scanned, issues is a list of (record_index, column_index, value)
+    tuples (with a column_index of None for records with the wrong number of
+    values), and widened_columns is a set of indices of columns that need to be
+    widened to floats.
+  """
+  value_checkers = []
+  skipped_values = []
+  drop_values = []
+
+  for c, column in enumerate(columns):
+    if column.data_type == 'integer':
+      value_checkers.append(_IsInteger)
+    elif column.data_type == 'float':
+      value_checkers.append(_IsFloat)
+    elif column.data_type == 'date':
+      date_regex = _DateFormatToRegex(column.data_format)
+
+      if date_regex:
+        value_checkers.append(
+            lambda v, date_regex=date_regex: date_regex.match(v.strip()))
+      else:
+        value_checkers.append(None)
+    else:
+      value_checkers.append(None)
+
+    skipped_values.append(
+        [column.total_val] +
+        [column.internal_parameters[p] for p in ['dropif_val', 'zeroif_val']
+         if p in column.internal_parameters])
+
+    if 'dropif_val' in column.internal_parameters:
+      drop_values.append((c, column.internal_parameters['dropif_val']))
+
+  checked_columns = [c for c in range(len(columns)) if value_checkers[c]]
+
+  num_records = 0
+  issues = []
+  widened_columns = set()
+
+  for r, record in enumerate(records):
+    num_records += 1
+
+    # Ignore blank rows
+    if not record:
+      continue
+
+    if len(record) != len(columns):
+      issues.append((r, None, len(record)))
+    elif not [c for (c, drop_value) in drop_values
+              if record[c] == drop_value]:
+      for c in checked_columns:
+        value = record[c]
+
+        if value in skipped_values[c]:
+          continue
+
+        if strip_currency and columns[c].data_type in ['integer', 'float']:
+          value = value.replace('$', '').replace(',', '')
+
+        if not value_checkers[c](value):
+          if c in widenable_columns and _IsFloat(value):
+            widened_columns.add(c)
+          else:
+            issues.append((r, c, record[c]))
+
+    if len(issues) >= max_issues:
+      break
+
+  return (num_records, issues, widened_columns)
+
+
+def _ScanByteRange(arguments):
+  """Check the values in a byte range of a CSV file against the column types.
+
+  Runs inside a worker process, so takes a single tuple of arguments.
+
+  Args:
+    arguments: A (csv_path, start, end, columns, widenable_columns,
+               strip_currency, max_issues) tuple; see _ScanRecords
+
+  Returns:
+    The result of _ScanRecords for the records in the range
+  """
+  (csv_path, start, end, columns, widenable_columns, strip_currency,
+   max_issues) = arguments
+
+  csv_file = open(csv_path, 'rb')
+  mapped_reader = MappedCSVReader(csv_file, start, end)
+
+  try:
+    return _ScanRecords(mapped_reader, columns, widenable_columns,
+                        strip_currency, max_issues)
+  finally:
+    mapped_reader.Close()
+    csv_file.close()
+
+
+def CheckColumnValues(csv_file, column_bundle, num_workers=1,
+                      widen_types=False, strip_currency=False, max_issues=10,
+                      verbose=True):
+  """Check every value in a CSV file against its column's type and format.
+
+  ConstructColumnBundle infers types and date formats from the second row
+  only; this function makes sure that the rest of the file is consistent with
+  them before any data are loaded. If the file is on disk and num_workers is
+  greater than one, byte ranges of the file are scanned in parallel.
+
+  Args:
+    csv_file: A file-like object, opened for reading, that has CSV data in it
+    column_bundle: The DataSourceColumnBundle for the file, as produced by
+                   ConstructColumnBundle
+    num_workers: Number of worker processes to use
+    widen_types: Change the type of integer columns to float, rather than
+                 reporting an error, if they have float values and their type
+                 was guessed
+    strip_currency: Remove '$' and ',' characters from numeric values before
+                    checking them
+    max_issues: Maximum number of offending rows to report
+    verbose: Print out extra information to stdout
+
+  Raises:
+    DataSourceError: If any values don't match their column's type or format
+  """
+  columns = list(column_bundle.GetColumnIterator())
+  widenable_columns = set()
+
+  if widen_types:
+    for c, column in enumerate(columns):
+      if (column.data_type == 'integer' and
+          column.internal_parameters.get('guessed_type')):
+        widenable_columns.add(c)
+
+  worker_pool = None
+
+  if num_workers > 1 and IsFileOnDisk(csv_file):
+    byte_ranges = SplitCSVFile(csv_file, num_workers * _RANGES_PER_WORKER)
+
+    worker_pool = multiprocessing.Pool(num_workers)
+    scan_results = worker_pool.imap(
+        _ScanByteRange,
+        [(csv_file.name, start, end, columns, widenable_columns,
+          strip_currency, max_issues) for (start, end) in byte_ranges])
+  else:
+    csv_reader = csv.reader(csv_file, delimiter=',', quotechar='"')
+    csv_reader.next()
+
+    scan_results = [_ScanRecords(csv_reader, columns, widenable_columns,
+                                 strip_currency, max_issues)]
+
+  issues = []
+  widened_columns = set()
+
+  try:
+    # Count the header as the first record
+    previous_records = 1
+
+    for num_records, range_issues, range_widened_columns in scan_results:
+      for (r, c, value) in range_issues:
+        issues.append((previous_records + r + 1, c, value))
+
+      widened_columns.update(range_widened_columns)
+      previous_records += num_records
+
+      # Stop as soon as enough issues have been found
+      if len(issues) >= max_issues:
+        break
+  finally:
+    if worker_pool:
+      worker_pool.terminate()
+      worker_pool.join()
+
+    csv_file.seek(0)
+
+  if issues:
+    issue_lines = []
+
+    for (row_number, c, value) in issues[:max_issues]:
+      issue_lines.append(FormatRecordIssue(columns, row_number, c, value))
+
+    raise data_source.DataSourceError(
+        'Found values inconsistent with column types:\n%s' %
+        '\n'.join(issue_lines))
+
+  for c in sorted(widened_columns):
+    columns[c].data_type = 'float'
+
+    if verbose:
+      print 'Widening column %s to type float' % columns[c].column_id
@@ -0,0 +1,335 @@
+#!/usr/bin/python2.4
+#
+# Copyright 2011, Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tests of csv_utilities module."""
+
+
+__author__ = 'Benjamin Yolken <yolken@google.com>'
+
+import csv
+import os
+import StringIO
+import tempfile
+import unittest
+
+import csv_utilities
+import data_source
+
+
+_TEST_CSV_CONTENT = (
+"""name,description,value
+alpha,"a description
+spanning two lines",1
+beta,plain,2
+
+"gamma ""quoted"" name","another
+multi-line
+field",3
+delta,"commas, inside",4
+""")
+
+
+class SplitCSVFileTests(unittest.TestCase):
+  """Tests of SplitCSVFile function."""
+
+  def setUp(self):
+    self.csv_file = StringIO.StringIO(_TEST_CSV_CONTENT)
+    self.saved_block_size = csv_utilities._SCAN_BLOCK_SIZE
+
+  def tearDown(self):
+    csv_utilities._SCAN_BLOCK_SIZE = self.saved_block_size
+    self.csv_file.close()
+
+  def _ParseRanges(self, byte_ranges):
+    """Parse each byte range separately and concatenate the records."""
+    records = []
+
+    for (start, end) in byte_ranges:
+      records.extend(
+          csv.reader(StringIO.StringIO(_TEST_CSV_CONTENT[start:end])))
+
+    return records
+
+  def testRecordAlignment(self):
+    """Test that ranges contain complete records and cover the body."""
+    expected_records = list(csv.reader(StringIO.StringIO(_TEST_CSV_CONTENT)))
+    expected_records = expected_records[1:]
+
+    for block_size in [1, 3, 16, 1 << 20]:
+      csv_utilities._SCAN_BLOCK_SIZE = block_size
+
+      for num_ranges in range(1, 12):
+        byte_ranges = csv_utilities.SplitCSVFile(self.csv_file, num_ranges)
+
+        self.assertTrue(len(byte_ranges) <= num_ranges)
+        self.assertEqual(byte_ranges[-1][1], len(_TEST_CSV_CONTENT))
+        self.assertEqual(self._ParseRanges(byte_ranges), expected_records)
+
+  def testHeaderOnly(self):
+    """Test that a file without any records produces no ranges."""
+    self.assertEqual(
+        csv_utilities.SplitCSVFile(StringIO.StringIO('col1,col2'), 4), [])
+    self.assertEqual(
+        csv_utilities.SplitCSVFile(StringIO.StringIO('col1,col2\n'), 4), [])
+
+
+class MappedCSVReaderTests(unittest.TestCase):
+  """Tests of MappedCSVReader object."""
+
+  def setUp(self):
+    csv_file_params = tempfile.mkstemp()
+
+    os.close(csv_file_params[0])
+    self.csv_file_path = csv_file_params[1]
+    self.saved_block_size = csv_utilities._MAPPED_BLOCK_SIZE
+
+  def tearDown(self):
+    csv_utilities._MAPPED_BLOCK_SIZE = self.saved_block_size
+    os.remove(self.csv_file_path)
+
+  def _ReadRecords(self, csv_content, start=0, end=None):
+    """Write content to disk and read it back with a MappedCSVReader."""
+    csv_file = open(self.csv_file_path, 'wb')
+    csv_file.write(csv_content)
+    csv_file.close()
+
+    csv_file = open(self.csv_file_path, 'rb')
+    mapped_reader = csv_utilities.MappedCSVReader(csv_file, start, end)
+    records = list(mapped_reader)
+    mapped_reader.Close()
+    csv_file.close()
+
+    return records
+
+  def testMatchesCSVReader(self):
+    """Test that records are the same as those produced by csv.reader."""
+    unquoted_content = 'col1,col2\na,1\n\nb,2\n c ,3'
+
+    for csv_content in [_TEST_CSV_CONTENT,
+                        _TEST_CSV_CONTENT.replace('\n', '\r\n'),
+                        unquoted_content,
+                        unquoted_content.replace('\n', '\r\n')]:
+      expected_records = list(csv.reader(StringIO.StringIO(csv_content)))
+
+      for block_size in [1, 7, 1 << 20]:
+        csv_utilities._MAPPED_BLOCK_SIZE = block_size
+
+        self.assertEqual(self._ReadRecords(csv_content), expected_records)
+
+  def testByteRanges(self):
+    """Test that records can be read from the ranges of SplitCSVFile."""
+    byte_ranges = csv_utilities.SplitCSVFile(
+        StringIO.StringIO(_TEST_CSV_CONTENT), 3)
+
+    records = []
+
+    for (start, end) in byte_ranges:
+      records.extend(self._ReadRecords(_TEST_CSV_CONTENT, start, end))
+
+    self.assertEqual(
+        records,
+        list(csv.reader(StringIO.StringIO(_TEST_CSV_CONTENT)))[1:])
+
+  def testEmptyFile(self):
+    """Test that an empty file has no records."""
+    self.assertEqual(self._ReadRecords(''), [])
+
+
+_TEST_CHECKED_CSV_CONTENT = (
+"""date,category[dropif=skip],count,amount[type=float;zeroif=n/a]
+2000-01,a,10,1.5
+2000-02,b,20,n/a
+2000-03,skip,bad,bad
+2000-04,c,30,2
+""")
+
+
+class ColumnTransformerTests(unittest.TestCase):
+  """Tests of ColumnTransformer object."""
+
+  def setUp(self):
+    csv_file = StringIO.StringIO(
+        'year,name[dropif=skip],count[zeroif=n/a],amount[dropif=-;zeroif=x]\n'
+        '2001,a,1,2.5\n')
+    self.columns = list(
+        csv_utilities.ConstructColumnBundle(csv_file, False).
+        GetColumnIterator())
+    self.column_transformer = csv_utilities.ColumnTransformer(
+        self.columns, [None, None, int, float], ['', '', 0, 0.0])
+
+  def testTransformChunk(self):
+    """Test that rows are dropped and values zeroed and converted."""
+    chunk = [['2001', 'a', '1', '2.5'], [], ['2001', 'skip', 'bad', '1'],
+             ['2002', 'b', 'n/a', '3'], ['2002', 'c', '4', '-']]
+
+    self.assertEqual(
+        self.column_transformer.TransformChunk(chunk),
+        ([['2001', '2002'], ['a', 'b'], [1, 0], [2.5, 3.0]], None))
+    self.assertEqual(
+        self.column_transformer.TransformChunk([[]]),
+        ([[], [], [], []], None))
+
+  def testBadRecords(self):
+    """Test that the first bad record in a chunk is reported."""
+    self.assertEqual(
+        self.column_transformer.TransformChunk(
+            [['2001', 'a', '1', '2'], [], ['2001', 'b', '1'],
+             ['2001', 'c', 'bad', '3']]),
+        ([], (2, None, 3)))
+
+    # A zeroif_val is ignored for columns that also have a dropif_val
+    self.assertEqual(
+        self.column_transformer.TransformChunk(
+            [['2001', 'a', '1', '2'], ['2001', 'skip', 'bad', '3'],
+             ['2001', 'c', '1', 'x']]),
+        ([], (2, 3, 'x')))
+
+    self.assertEqual(
+        csv_utilities.FormatRecordIssue(self.columns, 4, 3, 'x'),
+        'Value in row 4 of column amount is not a valid float: x')
+
+
+class CheckColumnValuesTests(unittest.TestCase):
+  """Tests of CheckColumnValues function."""
+
+  def setUp(self):
+    csv_file_params = tempfile.mkstemp()
+
+    os.close(csv_file_params[0])
+    self.csv_file_path = csv_file_params[1]
+
+  def tearDown(self):
+    os.remove(self.csv_file_path)
+
+  def _CheckValues(self, csv_content, num_workers=1, widen_types=False):
+    """Write content to disk and check its values against the column types."""
+    csv_file = open(self.csv_file_path, 'wb')
+    csv_file.write(csv_content)
+    csv_file.close()
+
+    csv_file = open(self.csv_file_path, 'rb')
+    column_bundle = csv_utilities.ConstructColumnBundle(csv_file, False)
+
+    try:
+      csv_utilities.CheckColumnValues(
+          csv_file, column_bundle, num_workers, widen_types, verbose=False)
+    finally:
+      csv_file.close()
+
+    return column_bundle
+
+  def testValidValues(self):
+    """Test that dropped, zeroed, and valid values pass the check."""
+    for num_workers in [1, 2]:
+      column_bundle = self._CheckValues(_TEST_CHECKED_CSV_CONTENT, num_workers)
+
+      self.assertEqual(column_bundle.GetColumnByID('count').data_type,
+                       'integer')
+
+  def testInvalidValues(self):
+    """Test that offending values are reported with their row numbers."""
+    csv_content = (_TEST_CHECKED_CSV_CONTENT +
+                   '2000-05,d,40.5,3\n2000/06,e,50,4\n2000-07,f,60\n')
+
+    for num_workers in [1, 2]:
+      try:
+        self._CheckValues(csv_content, num_workers)
+        self.fail('Expected DataSourceError')
+      except data_source.DataSourceError as error:
+        self.assertTrue(
+            'row 6 of column count is not a valid integer: 40.5' in str(error))
+        self.assertTrue(
+            'row 7 of column date does not match date format yyyy-MM' in
+            str(error))
+        self.assertTrue('columns in row 8 (3)' in str(error))
+
+  def testWidenTypes(self):
+    """Test that guessed integer columns can be widened to floats."""
+    csv_content = _TEST_CHECKED_CSV_CONTENT + '2000-05,d,40.5,3\n'
+
+    column_bundle = self._CheckValues(csv_content, widen_types=True)
+    self.assertEqual(column_bundle.GetColumnByID('count').data_type, 'float')
+
+    # Declared types are never widened
+    self.assertRaises(
+        data_source.DataSourceError,
+        self._CheckValues,
+        _TEST_CHECKED_CSV_CONTENT.replace('count,', 'count[type=integer],') +
+        '2000-05,d,40.5,3\n',
+        1, True)
+
+  def testStream(self):
+    """Test that values in a stream, rather than a file, are checked."""
+    csv_file = StringIO.StringIO(_TEST_CHECKED_CSV_CONTENT + 'x,d,40,3\n')
+    column_bundle = csv_utilities.ConstructColumnBundle(csv_file, False)
+
+    self.assertRaises(
+        data_source.DataSourceError,
+        csv_utilities.CheckColumnValues, csv_file, column_bundle, 4)
+    self.assertEqual(csv_file.tell(), 0)
+
+
+class IngestProgressTests(unittest.TestCase):
+  """Tests of IngestProgress object."""
+
+  def testEstimates(self):
+    """Test that estimates are projected from the fraction read."""
+    progress = csv_utilities.IngestProgress(1000)
+    progress.start_time -= 10
+    progress.Update(50, 250, 4000)
+
+    self.assertAlmostEqual(progress.GetFractionRead(), 0.25)
+    self.assertAlmostEqual(progress.GetSecondsRemaining(), 30, 0)
+    self.assertAlmostEqual(progress.GetRowsPerSecond(), 5, 1)
+    self.assertEqual(progress.GetProjectedMemory(), 16000)
+    self.assertTrue('50 rows' in str(progress))
+
+  def testUnknownSize(self):
+    """Test estimates for streams of unknown size."""
+    progress = csv_utilities.IngestProgress()
+    progress.Update(50, 250, 4000)
+
+    self.assertEqual(progress.GetSecondsRemaining(), None)
+    self.assertEqual(progress.GetProjectedMemory(), 4000)
+    self.assertFalse('remaining' in str(progress))
+
+  def testGetFileSize(self):
+    """Test that sizes are found for both files and streams."""
+    csv_file = StringIO.StringIO(_TEST_CSV_CONTENT)
+    csv_file.read(10)
+
+    self.assertEqual(csv_utilities.GetFileSize(csv_file),
+                     len(_TEST_CSV_CONTENT))
+    self.assertEqual(csv_file.tell(), 10)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -39,14 +39,25 @@ sources (e.g., by guessing data types) or facilitate communication with them.
 
 __author__ = 'Benjamin Yolken <yolken@google.com>'
 
+import hashlib
+import itertools
 import re
 
 
+# Number of values hashed at a time by FingerprintValues
+_FINGERPRINT_CHUNK_SIZE = 100000
+
+
 class DataSourceError(Exception):
   """Base class for exceptions in this module."""
   pass
 
 
+class MemoryLimitError(DataSourceError):
+  """Raised when loading data would use more memory than allowed."""
+  pass
+
+
 class DataSourceWarning(Warning):
   """Base class for warnings in this module."""
   pass
@@ -161,6 +172,30 @@ def GuessDateConcept(data_format):
         'Can\'t figure out time concept for format: %s' % data_format)
 
 
+def FingerprintValues(values):
+  """Compute a fingerprint that changes whenever a sequence of values changes.
+
+  Args:
+    values: An iterable of values, each of which has a stable repr()
+
+  Returns:
+    A hexadecimal string
+  """
+  value_hash = hashlib.md5()
+  value_iterator = iter(values)
+
+  while True:
+    chunk = list(itertools.islice(value_iterator, _FINGERPRINT_CHUNK_SIZE))
+
+    if not chunk:
+      break
+
+    value_hash.update('\n'.join(map(repr, chunk)))
+    value_hash.update('\n')
+
+  return value_hash.hexdigest()
+
+
 class DataSourceColumnBundle(object):
   """Object representing an ordered collection of data source columns."""
 
@@ -344,6 +379,68 @@ class DataSource(object):
     """
     raise NotImplementedError('Implement this')
 
+  def GetTableDataBatch(self, query_parameters_list):
+    """Create materialized data tables for several queries at once.
+
+    Data sources can override this to answer related queries (e.g., concept
+    queries) with a single pass over their data.
+
+    Args:
+      query_parameters_list: A sequence of QueryParameters objects
+
+    Returns:
+      A list of TableData objects, one for each query, in the same order
+    """
+    return [self.GetTableData(query_parameters)
+            for query_parameters in query_parameters_list]
+
+  def GetCardinalities(self):
+    """Get the number of rows and the number of distinct values per dimension.
+
+    Used to estimate the sizes of slices before they are queried.
+
+    Returns:
+      A (num_rows, distinct_counts) tuple, where distinct_counts is a
+      dictionary mapping the ID of each dimension column to its number of
+      distinct values (not counting any total_val), or None if the data source
+      can't provide these
+    """
+    return None
+
+  def GetColumnFingerprints(self):
+    """Get a fingerprint of the values in each column.
+
+    Used to detect which slices need to be regenerated after the data change.
+
+    Returns:
+      A dictionary mapping column IDs to strings that change whenever the
+      values in the corresponding column (or their order) change, or None if
+      the data source can't provide these
+    """
+    return None
+
+  def GetParallelQueryMode(self):
+    """Get how calls to GetTableData can be run in parallel.
+
+    Returns:
+      'process' if queries can be run in forked worker processes, 'thread' if
+      they can be run concurrently in several threads, or None if they must be
+      run one at a time
+    """
+    return None
+
+  def SetSortOrder(self, column_ids):
+    """Hint the column order that upcoming slice queries share.
+
+    Data sources can override this to sort or index their data once, so that
+    slice queries grouping by a prefix of this order don't each have to sort
+    the data again. The default implementation ignores the hint.
+
+    Args:
+      column_ids: A sequence of column IDs, most significant first
+    """
+    pass
+
   def Close(self):
     """Close this data source."""
     raise NotImplementedError('Implement this')
@@ -34,92 +34,512 @@
 
 __author__ = 'Benjamin Yolken <yolken@google.com>'
 
-import itertools
+import functools
+import hashlib
+import json
+import multiprocessing
+import multiprocessing.pool
+import os
+import time
+import warnings
 
 import data_source
+from dspllib import memory
+from dspllib import reporting
 from dspllib.model import dspl_model
+from dspllib.model import dspl_statistics
+
+
+# Approximate number of bytes in the CSV representation of a value, by type
+_ESTIMATED_VALUE_BYTES = {
+    'date': 10,
+    'float': 10,
+    'integer': 6,
+    'string': 12}
+
+# Approximate ratio of the memory used by a slice table's rows in Python to
+# the size of its CSV representation
+_TABLE_MEMORY_FACTOR = 8
+
+# Name of the file, in the spill path, that records slice table fingerprints
+_MANIFEST_FILE_NAME = 'slice_manifest.json'
+
+# Version of the manifest format; manifests with other versions are ignored
+_MANIFEST_VERSION = 1
+
+# Whether worker processes can be forked, and so share the memory of the data
+# source instead of receiving a pickled copy of it
+_CAN_FORK = hasattr(os, 'fork')
+
+# Data source queried by a worker process; set by the pool initializer in each
+# worker
+_worker_data_source = None
+
+
+def _RunTimedQuery(data_source_obj, query_parameters):
+  """Run a query, returning a (seconds taken, TableData object) tuple."""
+  start_time = time.time()
+  table_data = data_source_obj.GetTableData(query_parameters)
+
+  return (time.time() - start_time, table_data)
+
+
+def _SetWorkerDataSource(data_source_obj):
+  """Set the data source queried by a worker process."""
+  global _worker_data_source
+
+  _worker_data_source = data_source_obj
+
+
+def _GetTableDataInWorker(query_parameters):
+  """Run a query against the data source of a worker process."""
+  return _RunTimedQuery(_worker_data_source, query_parameters)
+
+
+def _RunQueries(data_source_obj, query_parameter_list, num_workers):
+  """Run a sequence of queries against a data source, possibly in parallel.
+
+  Queries are run in worker processes or threads, depending on the data
+  source's GetParallelQueryMode, if num_workers is greater than one. Worker
+  processes are given the data source by the pool initializer, which only
+  avoids copying it when they are forked, so threads are used instead on
+  platforms that can't fork.
+
+  Args:
+    data_source_obj: An object that implements the DataSource interface
+    query_parameter_list: A sequence of QueryParameters objects
+    num_workers: Number of workers to use
+
+  Yields:
+    A (seconds taken, TableData object) tuple for each query, in the same order
+    as the queries
+  """
+  parallel_query_mode = data_source_obj.GetParallelQueryMode()
+
+  if num_workers <= 1 or len(query_parameter_list) <= 1:
+    parallel_query_mode = None
+  elif parallel_query_mode == 'process' and not _CAN_FORK:
+    parallel_query_mode = 'thread'
+
+  if parallel_query_mode == 'process':
+    worker_pool = multiprocessing.Pool(
+        num_workers, initializer=_SetWorkerDataSource,
+        initargs=(data_source_obj,))
+    query_function = _GetTableDataInWorker
+  elif parallel_query_mode == 'thread':
+    worker_pool = multiprocessing.pool.ThreadPool(num_workers)
+    query_function = functools.partial(_RunTimedQuery, data_source_obj)
+  else:
+    for query_parameters in query_parameter_list:
+      yield _RunTimedQuery(data_source_obj, query_parameters)
+
+    return
+
+  try:
+    for query_result in worker_pool.imap(query_function, query_parameter_list):
+      yield query_result
+  finally:
+    worker_pool.terminate()
+    worker_pool.join()
+
+
+class PlannedSlice(object):
+  """A slice to be generated, together with estimates of its size."""
+
+  def __init__(self, slice_columns, estimated_rows=None, estimated_bytes=None,
+               within_budget=True):
+    """Create a new PlannedSlice object.
+
+    Args:
+      slice_columns: Sequence of DataSourceColumn objects for the slice
+      estimated_rows: Estimated number of rows in the slice table, or None if
+                      unknown
+      estimated_bytes: Estimated size of the slice table CSV in bytes, or None
+                       if unknown
+      within_budget: Whether the estimates are within the slice budget
+    """
+    self.slice_columns = slice_columns
+    self.estimated_rows = estimated_rows
+    self.estimated_bytes = estimated_bytes
+    self.within_budget = within_budget
+
+  def __str__(self):
+    column_ids = [c.column_id for c in self.slice_columns]
+
+    if self.estimated_rows is None:
+      plan_string = '%s: size unknown' % column_ids
+    else:
+      plan_string = '%s: ~%d rows, ~%d bytes' % (
+          column_ids, self.estimated_rows, self.estimated_bytes)
+
+    if not self.within_budget:
+      plan_string += ' (over budget, skipped)'
+
+    return plan_string
+
+
+def PlanSlices(data_source_obj, max_slice_rows=None, max_slice_bytes=None):
+  """Estimate the size of each slice before any slice queries are run.
+
+  The number of rows in a slice is estimated as the product of the numbers of
+  distinct values of its dimensions, capped at the number of rows in the data
+  source. Byte sizes are estimated from the column data types.
+
+  Args:
+    data_source_obj: An object that implements the DataSource interface
+    max_slice_rows: Maximum estimated number of rows in a slice, or None for no
+                    limit
+    max_slice_bytes: Maximum estimated size of a slice table in bytes, or None
+                     for no limit
+
+  Returns:
+    A list of PlannedSlice objects, one for each slice from _CalculateSlices
+  """
+  return _PlanSlicesFromCardinalities(
+      data_source_obj.GetColumnBundle(), data_source_obj.GetCardinalities(),
+      max_slice_rows, max_slice_bytes)
+
+
+def _PlanSlicesFromCardinalities(column_bundle, cardinalities,
+                                 max_slice_rows=None, max_slice_bytes=None):
+  """Estimate the size of each slice from already counted values.
+
+  Args:
+    column_bundle: A DataSourceColumnBundle object
+    cardinalities: A (num_rows, distinct_counts) tuple, as returned by
+                   DataSource.GetCardinalities, or None if unknown; if num_rows
+                   is None, estimates aren't capped at the number of rows
+    max_slice_rows: Maximum estimated number of rows in a slice, or None for no
+                    limit
+    max_slice_bytes: Maximum estimated size of a slice table in bytes, or None
+                     for no limit
+
+  Returns:
+    A list of PlannedSlice objects, one for each slice from _CalculateSlices
+  """
+  slice_plan = []
+
+  for slice_column_set in _CalculateSlices(column_bundle):
+    if cardinalities is None:
+      slice_plan.append(PlannedSlice(slice_column_set))
+      continue
+
+    (num_rows, distinct_counts) = cardinalities
+
+    estimated_rows = 1
+    row_bytes = 0
+
+    for column in slice_column_set:
+      if column.slice_role == 'dimension':
+        estimated_rows *= max(distinct_counts.get(column.column_id, 1), 1)
+
+      # Add one byte for the separator or newline
+      row_bytes += _ESTIMATED_VALUE_BYTES.get(column.data_type, 8) + 1
+
+    if num_rows is not None:
+      estimated_rows = min(estimated_rows, num_rows)
+
+    estimated_bytes = estimated_rows * row_bytes
+
+    within_budget = (
+        (max_slice_rows is None or estimated_rows <= max_slice_rows) and
+        (max_slice_bytes is None or estimated_bytes <= max_slice_bytes))
+
+    slice_plan.append(
+        PlannedSlice(
+            slice_column_set, estimated_rows, estimated_bytes, within_budget))
+
+  return slice_plan
+
+
+def _LimitQueryWorkers(data_source_obj, slice_plan, num_workers,
+                       memory_budget):
+  """Reduce the number of slice query workers to fit in a memory budget.
+
+  Each worker is assumed to hold the largest planned slice table at once. Forked
+  worker processes may also end up with copies of the data source's memory, as
+  they touch its objects.
+
+  Args:
+    data_source_obj: An object that implements the DataSource interface
+    slice_plan: A sequence of PlannedSlice objects for the slices to query
+    num_workers: Number of workers requested
+    memory_budget: A memory.MemoryBudget object
+
+  Returns:
+    The number of workers to use
+  """
+  bytes_per_worker = max(
+      [planned_slice.estimated_bytes or 0 for planned_slice in slice_plan] +
+      [0]) * _TABLE_MEMORY_FACTOR
+
+  if data_source_obj.GetParallelQueryMode() == 'process':
+    bytes_per_worker += memory.GetMemoryUsed() or 0
+
+  return memory_budget.LimitWorkers(num_workers, bytes_per_worker)
+
+
+def _SliceFingerprint(slice_columns, column_bundle, column_fingerprints):
+  """Compute a fingerprint of everything that a slice table depends on.
+
+  This covers the metadata and values of the slice's columns and, since rows
+  are filtered on them, the total values and values of any other columns that
+  have a total_val.
+
+  Args:
+    slice_columns: Sequence of DataSourceColumn objects for the slice
+    column_bundle: The DataSourceColumnBundle for the data source
+    column_fingerprints: Dictionary mapping column IDs to fingerprints of their
+                         values, as returned by GetColumnFingerprints
+
+  Returns:
+    A hexadecimal string
+  """
+  slice_inputs = []
+
+  for column in slice_columns:
+    # Internal parameters (e.g., aggregation) are opaque, but may be a
+    # dictionary, which needs a canonical order
+    if isinstance(column.internal_parameters, dict):
+      internal_parameters = sorted(column.internal_parameters.items())
+    else:
+      internal_parameters = column.internal_parameters
+
+    slice_inputs.append(
+        (column.column_id, column.data_type, column.data_format,
+         column.slice_role, column.total_val, internal_parameters,
+         column_fingerprints[column.column_id]))
+
+  slice_column_ids = set([c.column_id for c in slice_columns])
+
+  for column in column_bundle.GetColumnIterator():
+    if column.column_id not in slice_column_ids and column.total_val:
+      slice_inputs.append(
+          (column.column_id, column.total_val,
+           column_fingerprints[column.column_id]))
+
+  return hashlib.md5(repr(slice_inputs)).hexdigest()
+
+
+def _ReadManifest(spill_path):
+  """Read the slice manifest from a previous run, if there is one.
+
+  Args:
+    spill_path: Directory that slice tables are spilled to
+
+  Returns:
+    A dictionary mapping slice table file names to dictionaries with their
+    'fingerprint' and 'size'
+  """
+  manifest_file_name = os.path.join(spill_path, _MANIFEST_FILE_NAME)
+
+  try:
+    manifest_file = open(manifest_file_name, 'r')
+  except IOError:
+    return {}
+
+  try:
+    manifest = json.load(manifest_file)
+  except ValueError:
+    return {}
+  finally:
+    manifest_file.close()
+
+  if manifest.get('version') != _MANIFEST_VERSION:
+    return {}
+
+  return manifest.get('slice_tables', {})
+
+
+def _WriteManifest(spill_path, slice_table_entries):
+  """Write the slice manifest for the current run.
+
+  Args:
+    spill_path: Directory that slice tables are spilled to
+    slice_table_entries: Dictionary mapping slice table file names to
+                         dictionaries with their 'fingerprint' and 'size'
+  """
+  manifest_file_name = os.path.join(spill_path, _MANIFEST_FILE_NAME)
+
+  # Write to a temporary file first, so an interrupted run can't leave a
+  # manifest that describes files it didn't finish writing
+  manifest_file = open(manifest_file_name + '.tmp', 'w')
+  json.dump({'version': _MANIFEST_VERSION,
+             'slice_tables': slice_table_entries},
+            manifest_file, indent=2, sort_keys=True)
+  manifest_file.close()
+
+  os.rename(manifest_file_name + '.tmp', manifest_file_name)
 
 
 def _CalculateSlices(column_bundle):
   """Calculate all the possible slices to be produced from a column bundle.
 
+  Every slice contains all of the columns without rollup, plus a combination
+  of the rollup columns. Slices that would contain both a concept and one of
+  its ancestors are never generated. The slices are yielded lazily, with
+  smaller combinations of rollup columns first and combinations of the same
+  size in column order, so only the valid slices are ever enumerated.
+
   Args:
     column_bundle: A DataSourceColumnBundle object produced by a data source
 
-  Returns:
-    A sequence of DataSourceColumn sequences; each sequence contains the columns
-    for one slice.
+  Yields:
+    A list of DataSourceColumn objects for each slice
   """
-  all_slices = []
-
   binary_elements = []
   non_binary_elements = []
 
-  child_parent_dict = {}
-
   for column in column_bundle.GetColumnIterator():
     if column.rollup:
       binary_elements.append(column)
     else:
       non_binary_elements.append(column)
 
-    if column.parent_ref:
-      child_parent_dict[column] = column_bundle.GetColumnByID(column.parent_ref)
+  # Find the ancestors of each column; a column in a parent cycle is its own
+  # ancestor
+  ancestors = {}
 
-  # Expand out slices using powerset operator
-  for selection in _Powerset(binary_elements):
-    transformed_slice = non_binary_elements + list(selection)
+  for column in column_bundle.GetColumnIterator():
+    ancestors[column] = set()
+    curr_val = column
 
-    all_slices.append([s for s in transformed_slice])
+    while curr_val.parent_ref:
+      curr_val = column_bundle.GetColumnByID(curr_val.parent_ref)
 
-  # Prune slices that contain both a concept and an ancestor
-  slices_to_evaluate = []
+      if curr_val in ancestors[column]:
+        break
 
-  for data_slice in all_slices:
-    keep_slice = True
+      ancestors[column].add(curr_val)
 
-    for key in child_parent_dict.keys():
-      if key in data_slice:
-        curr_val = child_parent_dict[key]
+  def _Conflicts(column1, column2):
+    return column1 in ancestors[column2] or column2 in ancestors[column1]
 
-        # Loop through concept ancestors
-        while True:
-          if curr_val in data_slice:
-            keep_slice = False
-            break
-          elif curr_val in child_parent_dict:
-            curr_val = child_parent_dict[curr_val]
-          else:
-            break
+  # If columns without rollup conflict, every slice contains both of them
+  for i, column in enumerate(non_binary_elements):
+    for other_column in non_binary_elements[i:]:
+      if _Conflicts(column, other_column):
+        return
 
-        if not keep_slice:
-          break
+  # Rollup columns that conflict with columns without rollup are never used
+  binary_elements = [
+      column for column in binary_elements
+      if not [c for c in non_binary_elements + [column]
+              if _Conflicts(column, c)]]
 
-    if keep_slice:
-      slices_to_evaluate.append(data_slice)
+  # For each rollup column, the positions of the later rollup columns that it
+  # conflicts with
+  later_conflicts = []
 
-  return slices_to_evaluate
+  for i, column in enumerate(binary_elements):
+    later_conflicts.append(set(
+        [j for j in range(i + 1, len(binary_elements))
+         if _Conflicts(column, binary_elements[j])]))
 
+  for size in range(len(binary_elements) + 1):
+    for selection in _IterCompatibleCombinations(
+        len(binary_elements), size, later_conflicts):
+      yield non_binary_elements + [binary_elements[i] for i in selection]
 
-def _Powerset(input_list):
-  """Create powerset iterator from the elements in a list.
 
-  Note: Based on example in official Python itertools documentation.
+def _IterCompatibleCombinations(num_elements, size, later_conflicts,
+                                start=0, selection=(), excluded=frozenset()):
+  """Enumerate the combinations of elements that contain no conflicting pair.
+
+  Combinations are built up one element at a time in increasing order, and
+  elements that conflict with one already chosen are skipped, so no branch
+  containing a conflict is ever explored.
 
   Example:
-    [p for p in Powerset(['a', 'b')] == [(), ('a',), ('b'), ('a', 'b')]
+    With 3 elements where 0 conflicts with 2, the combinations of size 2 are
+    (0, 1) and (1, 2).
 
   Args:
-    input_list: A sequence of Python objects
+    num_elements: Number of elements to choose from
+    size: Number of elements in each combination
+    later_conflicts: For each element, the set of larger elements it conflicts
+                     with
+    start: Smallest element that can be added to the selection
+    selection: Tuple of the elements chosen so far
+    excluded: Set of elements that conflict with the ones chosen so far
+
+  Yields:
+    A tuple of element positions, in increasing order, for each combination
+  """
+  if len(selection) == size:
+    yield selection
+    return
+
+  # Leave enough elements to fill out the combination
+  for i in range(start, num_elements - (size - len(selection)) + 1):
+    if i not in excluded:
+      for combination in _IterCompatibleCombinations(
+          num_elements, size, later_conflicts, i + 1, selection + (i,),
+          excluded | later_conflicts[i]):
+        yield combination
+
+
+def _ChooseSortOrder(slice_column_sets):
+  """Choose one column order to sort the data by for a set of slices.
+
+  Non-time dimensions are picked greedily: each next column is the one that,
+  together with the columns already picked, is shared by the most slices. A
+  slice can be grouped without sorting if it contains the first of these
+  columns, and the longer the prefix it shares, the smaller its groups. Time
+  dimensions come last, as they do in the slice tables.
+
+  Args:
+    slice_column_sets: A sequence of DataSourceColumn sequences, one for each
+                       slice
 
   Returns:
-    An iterator which loops through all (tuple) elements in the powerset of
-    the input_list.
+    A list of column IDs, most significant first
   """
-  return (
-      itertools.chain.from_iterable(
-          itertools.combinations(input_list, r) for r
-          in range(len(input_list) + 1)))
+  slice_dimension_sets = []
+  candidate_ids = []
+  time_ids = []
+
+  for slice_column_set in slice_column_sets:
+    dimension_ids = set()
+
+    for column in slice_column_set:
+      if column.slice_role != 'dimension':
+        continue
+
+      if column.data_type == 'date':
+        if column.column_id not in time_ids:
+          time_ids.append(column.column_id)
+      else:
+        dimension_ids.add(column.column_id)
+
+        if column.column_id not in candidate_ids:
+          candidate_ids.append(column.column_id)
+
+    slice_dimension_sets.append(dimension_ids)
+
+  sort_order = []
+
+  while candidate_ids:
+    best_id = None
+    best_count = 0
+
+    # Ties go to the column that comes first in the slices
+    for column_id in candidate_ids:
+      count = len([s for s in slice_dimension_sets if column_id in s])
+
+      if count > best_count:
+        best_id = column_id
+        best_count = count
+
+    if not best_count:
+      break
+
+    sort_order.append(best_id)
+    candidate_ids.remove(best_id)
+    slice_dimension_sets = [
+        s for s in slice_dimension_sets if best_id in s]
+
+  return sort_order + time_ids
 
 
 def _CreateConceptTable(
@@ -210,12 +630,43 @@ def _CreateSliceTable(slice_columns, table_id, file_name,
   return slice_table
 
 
-def PopulateDataset(data_source_obj, verbose):
+def PopulateDataset(data_source_obj, verbose, num_workers=1, spill_path=None,
+                    max_slice_rows=None, max_slice_bytes=None,
+                    incremental=False, run_report=None, memory_budget=None,
+                    archive=None, write_statistics=False):
   """Create a DSPL dataset from a data source.
 
   Loops through the set of possible slices (provided by the _CalculateSlices
   function), creating the necessary DSPL concept, slice, and table objects as
-  needed.
+  needed. If num_workers is greater than one, the slice queries are run in
+  parallel, but the slices and tables are still added in slice order. Before
+  the slice queries are run, the data source is given a shared sort order for
+  them with SetSortOrder.
+
+  If spill_path is set, each slice table is written to a CSV file in that
+  directory as soon as it is created, and only a reference to the file is kept
+  in the dataset. Peak memory is then one slice table rather than all of them.
+  Spilling to the directory the dataset will be materialized in means the
+  files don't need to be written again. If write_statistics is also set, the
+  statistics of each spilled table are written next to it, as
+  DataSet.Materialize does with the same argument.
+
+  If archive is set instead, each slice table is streamed into that zip archive
+  as soon as it is created, and DataSet.MaterializeArchive later adds the rest
+  of the dataset files to it.
+
+  If max_slice_rows or max_slice_bytes is set, the slices are first planned
+  with PlanSlices, and those estimated to exceed the budget are skipped with a
+  warning.
+
+  If incremental is set along with spill_path, a fingerprint of each slice's
+  inputs is recorded in a manifest file in the spill path. Slice tables whose
+  fingerprints match those from a previous run against the same path are
+  reused as they are, without running their queries. Fingerprints cover whole
+  columns, and every slice has all of the metric columns, so adding or changing
+  any rows (e.g., for a new time period) means that no slices are reused. Only
+  changes confined to dimension columns that a slice leaves out let that slice
+  be reused.
 
   The following naming convention is used:
 
@@ -228,12 +679,41 @@ def PopulateDataset(data_source_obj, verbose):
   Args:
     data_source_obj: An object that implements the DataSource interface
     verbose: Print out status messages to stdout
+    num_workers: Number of worker processes or threads to use for slice
+                 queries
+    spill_path: Directory to write slice table CSV files to as they are
+                created, or None to keep the tables in memory
+    max_slice_rows: Maximum estimated number of rows in a slice, or None for no
+                    limit
+    max_slice_bytes: Maximum estimated size of a slice table in bytes, or None
+                     for no limit
+    incremental: Reuse unchanged slice tables from a previous run in the spill
+                 path
+    run_report: A reporting.RunReport object to record the time taken by each
+                query in, or None
+    memory_budget: A memory.MemoryBudget object; if set, fewer than
+                   num_workers workers are used for slice queries when their
+                   tables, estimated from the distinct values found by the
+                   concept queries, wouldn't fit in the budget
+    archive: A dspl_archive.DatasetArchive object to write slice tables into
+             as they are created, or None; can't be used with spill_path
+    write_statistics: Whether to write the statistics of spilled slice tables
+                      to sidecar files, for the validator
 
   Returns:
     A DSPL DataSet object
+
+  Raises:
+    DataSourceError: If both spill_path and archive are set
   """
+  if spill_path is not None and archive is not None:
+    raise data_source.DataSourceError(
+        'Slice tables can be spilled to a path or written to an archive, but '
+        'not both')
+
   column_bundle = data_source_obj.GetColumnBundle()
   dataset = dspl_model.DataSet(verbose=verbose)
+  run_report = run_report or reporting.RunReport()
 
   # Add standard imports
   dataset.AddImport(
@@ -270,6 +750,40 @@ def PopulateDataset(data_source_obj, verbose):
   # Store concept ID to column ID mappings for imported dimension concepts
   dimension_map = {}
 
+  # Enumerate the instances of all the dimensions defined inside the dataset
+  # with a single batch of concept queries
+  concept_query_column_ids = []
+
+  for column in column_bundle.GetColumnIterator():
+    if column.slice_role != 'metric' and not column.concept_ref:
+      if verbose:
+        print ('Enumerating instances of \'%s\' concept' %
+               (column.column_id))
+
+      if column.parent_ref:
+        concept_query_column_ids.append([column.column_id, column.parent_ref])
+      else:
+        concept_query_column_ids.append([column.column_id])
+
+  # Sizing the slice query workers for a memory budget needs the number of
+  # distinct values of every dimension, so count those of imported dimensions
+  # in the same batch rather than with another pass over the data
+  if memory_budget and num_workers > 1:
+    for column in column_bundle.GetColumnIterator():
+      if column.slice_role == 'dimension' and column.concept_ref:
+        concept_query_column_ids.append([column.column_id])
+
+  phase = run_report.StartPhase('concept_queries')
+  concept_table_data = dict(zip(
+      [query_column_ids[0] for query_column_ids in concept_query_column_ids],
+      data_source_obj.GetTableDataBatch(
+          [data_source.QueryParameters(
+              query_type=data_source.QueryParameters.CONCEPT_QUERY,
+              column_ids=query_column_ids)
+           for query_column_ids in concept_query_column_ids])))
+  phase.Finish(rows_out=sum([len(table_data.rows) for table_data
+                             in concept_table_data.values()]))
+
   # Generate concept metadata
   for column in column_bundle.GetColumnIterator():
     if column.slice_role == 'metric':
@@ -289,26 +803,19 @@ def PopulateDataset(data_source_obj, verbose):
 
         dimension_map[column.concept_ref] = column.column_id
       else:
-        # Dimension defined inside the dataset; need to enumerate instances
-        if verbose:
-          print ('Enumerating instances of \'%s\' concept' %
-                 (column.column_id))
-
+        # Dimension defined inside the dataset; instances were enumerated above
         if column.parent_ref:
           parent_column = column_bundle.GetColumnByID(column.parent_ref)
-          query_column_ids = [column.column_id, column.parent_ref]
         else:
           parent_column = None
-          query_column_ids = [column.column_id]
-
-        concept_table_rows = data_source_obj.GetTableData(
-            data_source.QueryParameters(
-                query_type=data_source.QueryParameters.CONCEPT_QUERY,
-                column_ids=query_column_ids))
 
+        phase = run_report.StartPhase(
+            'concept_table', '%s_table' % column.column_id)
         dataset.AddTable(
             _CreateConceptTable(
-                column, concept_table_rows, parent_column, verbose))
+                column, concept_table_data[column.column_id], parent_column,
+                verbose))
+        phase.Finish(rows_out=len(concept_table_data[column.column_id].rows))
 
         dimension_concept = dspl_model.Concept(
             concept_id=column.column_id,
@@ -324,51 +831,204 @@ def PopulateDataset(data_source_obj, verbose):
       dataset.AddConcept(dimension_concept)
 
   # Generate slice metadata
-  for i, slice_column_set in enumerate(_CalculateSlices(column_bundle)):
+  slice_plan = None
+
+  if max_slice_rows is None and max_slice_bytes is None:
+    slice_column_sets = list(_CalculateSlices(column_bundle))
+  else:
+    phase = run_report.StartPhase('plan_slices')
+    slice_plan = PlanSlices(data_source_obj, max_slice_rows, max_slice_bytes)
+    phase.Finish()
+    slice_column_sets = []
+
     if verbose:
-      print 'Evaluating slice: %s' % ([c.column_id for c in slice_column_set])
+      print 'Slice plan:'
 
-    dimension_ids = []
-    metric_ids = []
+    for planned_slice in slice_plan:
+      if verbose:
+        print '  %s' % planned_slice
 
-    for column in slice_column_set:
-      if column.slice_role == 'dimension':
-        if column.concept_ref:
-          dimension_ids.append(column.concept_ref)
-        else:
-          dimension_ids.append(column.column_id)
+      if planned_slice.within_budget:
+        slice_column_sets.append(planned_slice.slice_columns)
       else:
-        if column.concept_ref:
-          metric_ids.append(column.concept_ref)
+        warnings.warn(
+            'Skipping slice %s, which is estimated to have %d rows and %d '
+            'bytes' % ([c.column_id for c in planned_slice.slice_columns],
+                       planned_slice.estimated_rows,
+                       planned_slice.estimated_bytes),
+            data_source.DataSourceWarning)
+
+  # Fingerprint slice inputs to find slice tables that can be reused
+  slice_fingerprints = [None] * len(slice_column_sets)
+  reused_slices = set()
+
+  if incremental and spill_path is not None:
+    phase = run_report.StartPhase('fingerprint')
+    column_fingerprints = data_source_obj.GetColumnFingerprints()
+    phase.Finish()
+    previous_manifest = _ReadManifest(spill_path)
+
+    # Slice tables are about to be overwritten, so the previous manifest must
+    # not outlive an interrupted run
+    manifest_file_name = os.path.join(spill_path, _MANIFEST_FILE_NAME)
+
+    if os.path.isfile(manifest_file_name):
+      os.remove(manifest_file_name)
+
+    if column_fingerprints is not None:
+      for i, slice_column_set in enumerate(slice_column_sets):
+        slice_fingerprints[i] = _SliceFingerprint(
+            slice_column_set, column_bundle, column_fingerprints)
+
+        manifest_entry = previous_manifest.get('slice_%d_table.csv' % i)
+        file_path = os.path.join(spill_path, 'slice_%d_table.csv' % i)
+
+        if (manifest_entry and
+            manifest_entry['fingerprint'] == slice_fingerprints[i] and
+            os.path.isfile(file_path) and
+            os.path.getsize(file_path) == manifest_entry['size']):
+          reused_slices.add(i)
+
+  # Sort the data once in an order that most slice queries can group by
+  queried_slice_column_sets = [
+      slice_column_set for i, slice_column_set in enumerate(slice_column_sets)
+      if i not in reused_slices]
+
+  if queried_slice_column_sets:
+    data_source_obj.SetSortOrder(_ChooseSortOrder(queried_slice_column_sets))
+
+  if memory_budget and num_workers > 1 and len(queried_slice_column_sets) > 1:
+    if slice_plan is None:
+      slice_plan = _PlanSlicesFromCardinalities(
+          column_bundle,
+          (None, dict([(column_id, len(table_data.rows)) for column_id,
+                       table_data in concept_table_data.iteritems()])))
+
+    queried_slice_ids = set(
+        [tuple([c.column_id for c in slice_column_set])
+         for slice_column_set in queried_slice_column_sets])
+    budgeted_num_workers = _LimitQueryWorkers(
+        data_source_obj,
+        [planned_slice for planned_slice in slice_plan
+         if tuple([c.column_id for c in planned_slice.slice_columns]) in
+         queried_slice_ids],
+        num_workers, memory_budget)
+
+    if budgeted_num_workers < num_workers:
+      if verbose:
+        print ('Reducing slice query workers from %d to %d to stay within '
+               'the memory budget' % (num_workers, budgeted_num_workers))
+
+      num_workers = budgeted_num_workers
+
+  # Execute slice queries
+  if verbose:
+    print 'Getting slice values'
+
+  slice_table_data = _RunQueries(
+      data_source_obj,
+      [data_source.QueryParameters(
+          query_type=data_source.QueryParameters.SLICE_QUERY,
+          column_ids=[c.column_id for c in slice_column_set])
+       for slice_column_set in queried_slice_column_sets],
+      num_workers)
+
+  manifest_entries = {}
+
+  # The queries run in a worker pool, which is only shut down when the
+  # generator finishes or is closed, so close it even if a slice fails
+  try:
+    for i, slice_column_set in enumerate(slice_column_sets):
+      if verbose:
+        print 'Evaluating slice: %s' % ([c.column_id for c in slice_column_set])
+
+      dimension_ids = []
+      metric_ids = []
+
+      for column in slice_column_set:
+        if column.slice_role == 'dimension':
+          if column.concept_ref:
+            dimension_ids.append(column.concept_ref)
+          else:
+            dimension_ids.append(column.column_id)
         else:
-          metric_ids.append(column.column_id)
+          if column.concept_ref:
+            metric_ids.append(column.concept_ref)
+          else:
+            metric_ids.append(column.column_id)
 
-    # Execute slice query
-    if verbose:
-      print 'Getting slice values'
-
-    slice_table_rows = data_source_obj.GetTableData(
-        data_source.QueryParameters(
-            query_type=data_source.QueryParameters.SLICE_QUERY,
-            column_ids=[c.column_id for c in slice_column_set]))
-
-    # Add slice and table metadata to dataset model
-    slice_table = _CreateSliceTable(
-        slice_column_set,
-        'slice_%d_table' % i,
-        'slice_%d_table.csv' % i,
-        slice_table_rows,
-        verbose)
-
-    dataset.AddTable(slice_table)
-
-    new_slice = dspl_model.Slice(
-        slice_id='slice_%d' % (i),
-        dimension_refs=dimension_ids,
-        metric_refs=metric_ids,
-        dimension_map=dimension_map,
-        table_ref='slice_%d_table' % i)
-
-    dataset.AddSlice(new_slice)
+      phase = run_report.StartPhase('slice_query', 'slice_%d_table' % i)
+
+      if i in reused_slices:
+        if verbose:
+          print 'Reusing unchanged slice table'
+
+        slice_table_rows = data_source.TableData(rows=[])
+        phase.Finish(wall_time=0.0, reused=True)
+      else:
+        (query_seconds, slice_table_rows) = slice_table_data.next()
+        phase.Finish(rows_out=len(slice_table_rows.rows),
+                     wall_time=query_seconds)
+
+      # Add slice and table metadata to dataset model
+      slice_table = _CreateSliceTable(
+          slice_column_set,
+          'slice_%d_table' % i,
+          'slice_%d_table.csv' % i,
+          slice_table_rows,
+          verbose)
+
+      if spill_path is not None:
+        file_path = os.path.join(spill_path, slice_table.file_name)
+
+        if i in reused_slices:
+          slice_table.table_data = []
+          slice_table.spill_file_path = file_path
+
+          if not write_statistics:
+            dspl_statistics.RemoveStatistics(file_path)
+        else:
+          # Key the statistics like DataSet.Materialize does, with the rows
+          # grouped by the non-time dimensions
+          non_time_column_ids = []
+          time_column_ids = []
+
+          for column in slice_column_set:
+            if column.slice_role == 'dimension':
+              if (column.concept_ref or '').startswith('time:'):
+                time_column_ids.append(column.column_id)
+              else:
+                non_time_column_ids.append(column.column_id)
+
+          spill_phase = run_report.StartPhase('spill', slice_table.file_name)
+          slice_table.SpillData(file_path,
+                                non_time_column_ids + time_column_ids,
+                                non_time_column_ids, write_statistics)
+          spill_phase.Finish(rows_out=len(slice_table_rows.rows))
+
+        if slice_fingerprints[i]:
+          manifest_entries[slice_table.file_name] = {
+              'fingerprint': slice_fingerprints[i],
+              'size': os.path.getsize(file_path)}
+      elif archive is not None:
+        spill_phase = run_report.StartPhase('spill', slice_table.file_name)
+        slice_table.ArchiveData(archive)
+        spill_phase.Finish(rows_out=len(slice_table_rows.rows))
+
+      dataset.AddTable(slice_table)
+
+      new_slice = dspl_model.Slice(
+          slice_id='slice_%d' % (i),
+          dimension_refs=dimension_ids,
+          metric_refs=metric_ids,
+          dimension_map=dimension_map,
+          table_ref='slice_%d_table' % i)
+
+      dataset.AddSlice(new_slice)
+  finally:
+    slice_table_data.close()
+
+  if incremental and spill_path is not None:
+    _WriteManifest(spill_path, manifest_entries)
 
   return dataset
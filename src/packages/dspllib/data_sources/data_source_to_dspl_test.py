@@ -34,10 +34,18 @@
 
 __author__ = 'Benjamin Yolken <yolken@google.com>'
 
+import functools
+import os
+import shutil
+import tempfile
+import threading
 import unittest
+import warnings
 
 import data_source
 import data_source_to_dspl
+from dspllib.model import dspl_model_loader
+from dspllib.validation import dspl_validation
 
 
 class _MockDataSource(data_source.DataSource):
@@ -100,6 +108,82 @@ class _MockDataSource(data_source.DataSource):
     pass
 
 
+class _ThreadedMockDataSource(_MockDataSource):
+  """A fake DataSource that can be queried from several threads."""
+
+  def GetParallelQueryMode(self):
+    return 'thread'
+
+
+class _CountedMockDataSource(_MockDataSource):
+  """A fake DataSource that can count its distinct dimension values."""
+
+  def GetCardinalities(self):
+    return (100, {'col1': 3, 'col2': 3, 'col3': 4, 'col6': 2})
+
+
+class _CountedThreadedMockDataSource(_CountedMockDataSource):
+  """A fake DataSource that can count its values and use several threads."""
+
+  def GetParallelQueryMode(self):
+    return 'thread'
+
+
+class _RecordedMemoryBudget(object):
+  """A fake MemoryBudget that records requests for workers."""
+
+  def __init__(self):
+    self.worker_requests = []
+
+  def LimitWorkers(self, num_workers, bytes_per_worker):
+    self.worker_requests.append((num_workers, bytes_per_worker))
+    return 1
+
+
+class _FingerprintedMockDataSource(_MockDataSource):
+  """A fake DataSource that fingerprints its columns and counts queries."""
+
+  def __init__(self, data_source_identifier, verbose=True):
+    self.column_fingerprints = dict(
+        [('col%d' % c, 'fingerprint%d' % c) for c in range(1, 7)])
+    self.slice_queries = []
+
+  def GetTableData(self, query_parameters):
+    if query_parameters.query_type == (
+        data_source.QueryParameters.SLICE_QUERY):
+      self.slice_queries.append(query_parameters.column_ids)
+
+    return super(_FingerprintedMockDataSource, self).GetTableData(
+        query_parameters)
+
+  def GetColumnFingerprints(self):
+    return self.column_fingerprints
+
+
+class _SortedMockDataSource(_MockDataSource):
+  """A fake DataSource that records its sort order hints."""
+
+  def __init__(self, data_source_identifier, verbose=True):
+    self.sort_orders = []
+
+  def SetSortOrder(self, column_ids):
+    self.sort_orders.append(list(column_ids))
+
+
+class _ForkedMockDataSource(_MockDataSource):
+  """A fake DataSource that can be queried from forked processes."""
+
+  def GetParallelQueryMode(self):
+    return 'process'
+
+
+class _ProcessIDDataSource(_ForkedMockDataSource):
+  """A fake DataSource whose queries return the ID of the querying process."""
+
+  def GetTableData(self, query_parameters):
+    return os.getpid()
+
+
 class CalculateSlicesTests(unittest.TestCase):
   """Tests of _CalculateSlices function."""
 
@@ -140,6 +224,51 @@ class CalculateSlicesTests(unittest.TestCase):
                                     ['col2', 'col4'], ['col2', 'col5'],
                                     ['col2']]]))
 
+  def testWideHierarchy(self):
+    """Test that only valid slices are generated for a deep hierarchy."""
+    columns = [data_source.DataSourceColumn('col0', rollup=True)]
+
+    for c in range(1, 40):
+      columns.append(data_source.DataSourceColumn(
+          'col%d' % c, rollup=True, parent_ref='col%d' % (c - 1)))
+
+    columns.append(data_source.DataSourceColumn('other', rollup=True))
+
+    slice_column_ids = [
+        [c.column_id for c in slice_column_set] for slice_column_set in
+        data_source_to_dspl._CalculateSlices(
+            data_source.DataSourceColumnBundle(columns=columns))]
+
+    # Smaller slices come first
+    self.assertEqual(
+        slice_column_ids,
+        [[]] + [['col%d' % c] for c in range(40)] + [['other']] +
+        [['col%d' % c, 'other'] for c in range(40)])
+
+
+class ChooseSortOrderTests(unittest.TestCase):
+  """Tests of _ChooseSortOrder function."""
+
+  def testChooseSortOrder(self):
+    """Test that shared dimensions come first and time comes last."""
+    year = data_source.DataSourceColumn(
+        'year', data_type='date', slice_role='dimension')
+    country = data_source.DataSourceColumn(
+        'country', data_type='string', slice_role='dimension')
+    state = data_source.DataSourceColumn(
+        'state', data_type='string', slice_role='dimension')
+    gender = data_source.DataSourceColumn(
+        'gender', data_type='string', slice_role='dimension')
+    metric = data_source.DataSourceColumn(
+        'metric', data_type='integer', slice_role='metric')
+
+    self.assertEqual(
+        data_source_to_dspl._ChooseSortOrder(
+            [[year, gender, metric], [year, country, metric],
+             [year, country, state, metric], [year, country, gender, metric],
+             [year, metric]]),
+        ['country', 'gender', 'year'])
+
 
 class PopulateDatasetTest(unittest.TestCase):
   """Tests of PopulateDataset functionality."""
@@ -331,5 +460,230 @@ class PopulateDatasetTest(unittest.TestCase):
           expected_data[column.column_id])
 
 
+class SortedPopulateDatasetTest(unittest.TestCase):
+  """Tests of the sort order PopulateDataset gives the data source."""
+
+  def testSortOrder(self):
+    """Test that one sort order is set before the slice queries."""
+    data_source_obj = _SortedMockDataSource(None)
+    data_source_to_dspl.PopulateDataset(data_source_obj, verbose=False)
+
+    self.assertEqual(data_source_obj.sort_orders, [['col2', 'col1', 'col3']])
+
+
+class ParallelPopulateDatasetTest(unittest.TestCase):
+  """Tests of PopulateDataset with parallel slice queries."""
+
+  def testMatchesSerial(self):
+    """Test that parallel queries produce the same slices and tables."""
+    serial_dataset = data_source_to_dspl.PopulateDataset(
+        _MockDataSource(None), verbose=False)
+
+    for data_source_class in [_ThreadedMockDataSource, _ForkedMockDataSource]:
+      parallel_dataset = data_source_to_dspl.PopulateDataset(
+          data_source_class(None), verbose=False, num_workers=2)
+
+      self.assertEqual(
+          [(s.slice_id, s.dimension_refs, s.table_ref)
+           for s in parallel_dataset.slices],
+          [(s.slice_id, s.dimension_refs, s.table_ref)
+           for s in serial_dataset.slices])
+      self.assertEqual(
+          [(t.table_id, t.table_data) for t in parallel_dataset.tables],
+          [(t.table_id, t.table_data) for t in serial_dataset.tables])
+
+  def testProcessWorkers(self):
+    """Test that worker processes are given the data source to query."""
+    query_results = data_source_to_dspl._RunQueries(
+        _ProcessIDDataSource(None), [None] * 4, 2)
+    process_ids = [table_data for (seconds, table_data) in query_results]
+
+    self.assertEqual(len(process_ids), 4)
+    self.assertFalse(os.getpid() in process_ids)
+    self.assertEqual(data_source_to_dspl._worker_data_source, None)
+
+  def testProcessWorkersWithoutFork(self):
+    """Test that threads are used if worker processes can't be forked."""
+    saved_can_fork = data_source_to_dspl._CAN_FORK
+    data_source_to_dspl._CAN_FORK = False
+
+    try:
+      query_results = data_source_to_dspl._RunQueries(
+          _ProcessIDDataSource(None), [None] * 4, 2)
+      process_ids = [table_data for (seconds, table_data) in query_results]
+    finally:
+      data_source_to_dspl._CAN_FORK = saved_can_fork
+
+    self.assertEqual(process_ids, [os.getpid()] * 4)
+
+  def testWorkersShutDownOnError(self):
+    """Test that the query workers are shut down if a slice fails."""
+    num_threads = threading.active_count()
+    spill_path = os.path.join(tempfile.gettempdir(), 'nonexistent_directory')
+
+    try:
+      data_source_to_dspl.PopulateDataset(
+          _ThreadedMockDataSource(None), verbose=False, num_workers=2,
+          spill_path=spill_path)
+    except IOError:
+      # The traceback keeps the query generator alive, so the workers must
+      # have been shut down explicitly
+      self.assertEqual(threading.active_count(), num_threads)
+    else:
+      self.fail('Spilling to a nonexistent directory should fail')
+
+  def testMemoryBudget(self):
+    """Test that workers are limited by the estimated slice table sizes."""
+    memory_budget = _RecordedMemoryBudget()
+    data_source_obj = _CountedThreadedMockDataSource(None)
+
+    # The sizes come from the concept queries, not another pass over the data
+    data_source_obj.GetCardinalities = None
+
+    data_source_to_dspl.PopulateDataset(
+        data_source_obj, verbose=False, num_workers=4,
+        memory_budget=memory_budget)
+
+    self.assertEqual(len(memory_budget.worker_requests), 1)
+    self.assertEqual(memory_budget.worker_requests[0][0], 4)
+
+    # The largest slice has 3 * 3 * 4 rows, of three dimensions and two metrics
+    self.assertEqual(memory_budget.worker_requests[0][1],
+                     36 * (13 + 13 + 11 + 11 + 7) * 8)
+
+
+class PlanSlicesTest(unittest.TestCase):
+  """Tests of slice planning and budgets."""
+
+  def testPlanSlices(self):
+    """Test that slice sizes are estimated from distinct value counts."""
+    slice_plan = data_source_to_dspl.PlanSlices(
+        _CountedMockDataSource(None), max_slice_rows=20)
+
+    self.assertEqual(
+        sorted([(p.estimated_rows, p.within_budget) for p in slice_plan]),
+        [(12, True), (36, False)])
+
+    # Sizes are unknown if the data source can't count values
+    slice_plan = data_source_to_dspl.PlanSlices(
+        _MockDataSource(None), max_slice_rows=20)
+
+    self.assertEqual(
+        [(p.estimated_rows, p.within_budget) for p in slice_plan],
+        [(None, True), (None, True)])
+
+  def testSliceBudget(self):
+    """Test that slices over budget are skipped."""
+    with warnings.catch_warnings(record=True) as caught_warnings:
+      warnings.simplefilter('always')
+      dataset = data_source_to_dspl.PopulateDataset(
+          _CountedMockDataSource(None), verbose=False, max_slice_rows=20)
+
+    self.assertEqual(len(caught_warnings), 1)
+
+    self.assertEqual([s.slice_id for s in dataset.slices], ['slice_0'])
+    self.assertEqual(sorted(dataset.slices[0].dimension_refs),
+                     ['col2', 'time:year'])
+
+
+class SpilledPopulateDatasetTest(unittest.TestCase):
+  """Tests of PopulateDataset with slice tables spilled to disk."""
+
+  def setUp(self):
+    self.spill_path = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.spill_path)
+
+  def testSpilledSlices(self):
+    """Test that slice tables are written out and released from memory."""
+    serial_dataset = data_source_to_dspl.PopulateDataset(
+        _MockDataSource(None), verbose=False)
+    spilled_dataset = data_source_to_dspl.PopulateDataset(
+        _MockDataSource(None), verbose=False, spill_path=self.spill_path)
+
+    self.assertEqual(sorted(os.listdir(self.spill_path)),
+                     ['slice_0_table.csv', 'slice_1_table.csv'])
+
+    for serial_table, spilled_table in zip(serial_dataset.tables,
+                                           spilled_dataset.tables):
+      if spilled_table.table_id.startswith('slice'):
+        self.assertEqual(spilled_table.table_data, [])
+      else:
+        self.assertEqual(spilled_table.spill_file_path, None)
+
+      self.assertEqual(
+          list(spilled_table.IterRows()),
+          [[str(v) for v in row] for row in serial_table.IterRows()])
+
+  def testSpilledStatistics(self):
+    """Test that the validator trusts the statistics of spilled slices."""
+    dataset = data_source_to_dspl.PopulateDataset(
+        _MockDataSource(None), verbose=False, spill_path=self.spill_path,
+        write_statistics=True)
+    dataset.Materialize(self.spill_path, write_statistics=True)
+
+    loaded_dataset = dspl_model_loader.LoadDSPLFromFiles(
+        os.path.join(self.spill_path, 'dataset.xml'), use_statistics=True)
+    rows_read = {}
+
+    def _CountedRows(table_id, iter_rows):
+      for row in iter_rows():
+        rows_read[table_id] = rows_read.get(table_id, 0) + 1
+        yield row
+
+    for table in loaded_dataset.tables:
+      if table.table_id.startswith('slice'):
+        table.IterRows = functools.partial(
+            _CountedRows, table.table_id, table.IterRows)
+
+    validator = dspl_validation.DSPLDatasetValidator(loaded_dataset)
+
+    self.assertEqual(validator.RunValidation(), 'No issues found!')
+
+    # Only the headers of the slice tables are read
+    self.assertEqual(rows_read, {'slice_0_table': 1, 'slice_1_table': 1})
+
+  def testIncrementalRegeneration(self):
+    """Test that only slices with changed inputs are regenerated."""
+    data_source_obj = _FingerprintedMockDataSource(None)
+    data_source_to_dspl.PopulateDataset(
+        data_source_obj, verbose=False, spill_path=self.spill_path,
+        incremental=True)
+
+    self.assertEqual(len(data_source_obj.slice_queries), 2)
+    self.assertTrue(
+        'slice_manifest.json' in os.listdir(self.spill_path))
+
+    slice_table_paths = [
+        os.path.join(self.spill_path, 'slice_%d_table.csv' % i)
+        for i in range(2)]
+    slice_table_contents = [open(p).read() for p in slice_table_paths]
+
+    # Nothing has changed, so no slices are queried
+    data_source_obj = _FingerprintedMockDataSource(None)
+    dataset = data_source_to_dspl.PopulateDataset(
+        data_source_obj, verbose=False, spill_path=self.spill_path,
+        incremental=True)
+
+    self.assertEqual(data_source_obj.slice_queries, [])
+    self.assertEqual(
+        [open(p).read() for p in slice_table_paths], slice_table_contents)
+    self.assertEqual(
+        [t.spill_file_path for t in dataset.tables
+         if t.table_id.startswith('slice')],
+        slice_table_paths)
+
+    # Only the slice with col1 depends on its values
+    data_source_obj = _FingerprintedMockDataSource(None)
+    data_source_obj.column_fingerprints['col1'] = 'changed'
+    data_source_to_dspl.PopulateDataset(
+        data_source_obj, verbose=False, spill_path=self.spill_path,
+        incremental=True)
+
+    self.assertEqual(len(data_source_obj.slice_queries), 1)
+    self.assertTrue('col1' in data_source_obj.slice_queries[0])
+
+
 if __name__ == '__main__':
   unittest.main()
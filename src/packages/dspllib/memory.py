@@ -0,0 +1,107 @@
+#!/usr/bin/python2.4
+#
+# Copyright 2011, Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Measure memory use and track it against an overall budget."""
+
+__author__ = 'Benjamin Yolken <yolken@google.com>'
+
+
+import reporting
+
+
+# Fraction of the budget above which it is considered to be approached, to
+# leave room for estimation errors
+_HIGH_WATER_FRACTION = 0.8
+
+
+def GetMemoryUsed():
+  """Get the current resident memory of this process.
+
+  Falls back to the peak resident memory where the current value isn't
+  available (i.e., outside of Linux).
+
+  Returns:
+    A number of bytes, or None if it can't be determined on this platform
+  """
+  memory_used = reporting.GetCurrentMemory()
+
+  if memory_used is None:
+    return reporting.GetPeakMemory()
+
+  return memory_used
+
+
+class MemoryBudget(object):
+  """An upper bound on the memory used by a run.
+
+  The budget is shared by the stages of a run, each of which checks how much
+  of it is left before choosing how to do its work (e.g., in memory or on
+  disk, and with how many workers).
+
+  Attributes:
+    limit: Maximum number of bytes that the process should use
+  """
+
+  def __init__(self, limit):
+    """Create a new MemoryBudget object.
+
+    Args:
+      limit: Maximum number of bytes that the process should use
+    """
+    self.limit = limit
+
+  def GetAvailable(self):
+    """Get the number of bytes that can still be used within the budget.
+
+    Returns:
+      A number of bytes, which is zero if the budget is already used up
+    """
+    return max(int(self.limit * _HIGH_WATER_FRACTION) -
+               (GetMemoryUsed() or 0), 0)
+
+  def Fits(self, num_bytes):
+    """Check whether using num_bytes more memory would stay within budget."""
+    return num_bytes <= self.GetAvailable()
+
+  def LimitWorkers(self, num_workers, bytes_per_worker):
+    """Reduce a number of workers so that they all fit within the budget.
+
+    Args:
+      num_workers: Number of workers requested
+      bytes_per_worker: Estimated number of bytes that each worker will use
+
+    Returns:
+      The number of workers to use, which is at least one
+    """
+    if bytes_per_worker <= 0:
+      return num_workers
+
+    return max(min(num_workers, self.GetAvailable() // bytes_per_worker), 1)
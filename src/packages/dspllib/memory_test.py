@@ -0,0 +1,70 @@
+#!/usr/bin/python2.4
+#
+# Copyright 2011, Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tests of memory module."""
+
+
+__author__ = 'Benjamin Yolken <yolken@google.com>'
+
+import unittest
+
+import memory
+
+
+class MemoryBudgetTests(unittest.TestCase):
+  """Tests of MemoryBudget object."""
+
+  def testMemoryUsed(self):
+    """Test that the memory used by this process can be measured."""
+    memory_used = memory.GetMemoryUsed()
+
+    if memory_used is not None:
+      self.assertTrue(memory_used > 0)
+
+  def testLargeBudget(self):
+    """Test that a large budget doesn't limit anything."""
+    budget = memory.MemoryBudget(1 << 50)
+
+    self.assertTrue(budget.Fits(1 << 30))
+    self.assertEqual(budget.LimitWorkers(4, 1 << 30), 4)
+
+  def testSmallBudget(self):
+    """Test that a budget that's already used up limits everything."""
+    budget = memory.MemoryBudget(1)
+
+    self.assertEqual(budget.GetAvailable(), 0)
+    self.assertFalse(budget.Fits(1))
+    self.assertEqual(budget.LimitWorkers(4, 1 << 20), 1)
+    self.assertEqual(budget.LimitWorkers(4, 0), 4)
+
+
+if __name__ == '__main__':
+  unittest.main()
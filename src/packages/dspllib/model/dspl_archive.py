@@ -0,0 +1,322 @@
+#!/usr/bin/python2.4
+#
+# Copyright 2011, Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Write DSPL datasets directly into zip archives, one entry at a time.
+
+Entries are compressed as their data are written and followed by data
+descriptors, so table rows can be streamed into the archive as they are
+generated, without first being written to loose files or held in memory.
+"""
+
+
+__author__ = 'Benjamin Yolken <yolken@google.com>'
+
+import csv
+import struct
+import time
+import zipfile
+import zlib
+
+import dspl_model
+
+
+# Number of bytes read at a time when copying a file into the archive
+_COPY_BLOCK_SIZE = 1 << 16
+
+# Formats of the data descriptor that follows each entry; the second is used
+# for entries whose local headers have zip64 extra fields
+_DATA_DESCRIPTOR_FORMAT = '<4sLLL'
+_ZIP64_DATA_DESCRIPTOR_FORMAT = '<4sLQQ'
+_DATA_DESCRIPTOR_SIGNATURE = 'PK\x07\x08'
+
+# General purpose flag indicating that sizes and CRC follow the entry data
+_DATA_DESCRIPTOR_FLAG = 0x08
+
+# Format and header ID of the zip64 extra field in local headers, which holds
+# 64-bit sizes; these are left as zero since they are in the data descriptor
+_ZIP64_EXTRA_FORMAT = '<HHQQ'
+_ZIP64_EXTRA_ID = 0x0001
+
+# Zip version needed to extract entries that use zip64 extensions
+_ZIP64_VERSION = 45
+
+# Value of 32-bit size fields whose real values are in a zip64 extra field
+_ZIP64_SIZE_MARKER = 0xffffffff
+
+
+def _LocalFileHeader(zip_info, zip64):
+  """Build the local header of an entry whose sizes follow its data.
+
+  Args:
+    zip_info: A zipfile.ZipInfo object describing the entry
+    zip64: Whether to add a zip64 extra field, which tells readers that the
+           data descriptor has 64-bit sizes
+
+  Returns:
+    The header as a string
+  """
+  extra = zip_info.extra
+
+  if zip64:
+    extra += struct.pack(
+        _ZIP64_EXTRA_FORMAT, _ZIP64_EXTRA_ID,
+        struct.calcsize(_ZIP64_EXTRA_FORMAT) - 4, 0, 0)
+    zip_info.extract_version = max(zip_info.extract_version, _ZIP64_VERSION)
+    zip_info.create_version = max(zip_info.create_version, _ZIP64_VERSION)
+    size = _ZIP64_SIZE_MARKER
+  else:
+    size = 0
+
+  date_time = zip_info.date_time
+  dos_date = (date_time[0] - 1980) << 9 | date_time[1] << 5 | date_time[2]
+  dos_time = (date_time[3] << 11 | date_time[4] << 5 |
+              (date_time[5] // 2))
+
+  return struct.pack(
+      zipfile.structFileHeader, zipfile.stringFileHeader,
+      zip_info.extract_version, zip_info.reserved, zip_info.flag_bits,
+      zip_info.compress_type, dos_time, dos_date, 0, size, size,
+      len(zip_info.filename), len(extra)) + zip_info.filename + extra
+
+
+def _AddToDirectory(zip_file, zip_info):
+  """Add a finished entry to the central directory of a zip file.
+
+  ZipFile has no public way of adding an entry that was written to its file by
+  someone else, so this updates the same attributes as ZipFile.write does. It
+  is the only place that touches ZipFile internals, and was checked against
+  the zipfile module of Python 2.7, where a ZipFile opened for writing always
+  writes its central directory on close.
+
+  Args:
+    zip_file: A zipfile.ZipFile object opened for writing
+    zip_info: A zipfile.ZipInfo object describing the entry
+  """
+  zip_file.filelist.append(zip_info)
+  zip_file.NameToInfo[zip_info.filename] = zip_info
+
+
+class ArchiveEntry(object):
+  """A file-like object that compresses data written to it into a zip entry.
+
+  Only one entry of an archive can be open at a time. Create these with
+  DatasetArchive.OpenEntry.
+  """
+
+  def __init__(self, archive, zip_info):
+    """Create a new ArchiveEntry object and write its local header.
+
+    Args:
+      archive: The DatasetArchive object the entry belongs to
+      zip_info: A zipfile.ZipInfo object describing the entry
+    """
+    self.archive = archive
+    self.zip_info = zip_info
+    self.output_file = archive.output_file
+    self.compressor = zlib.compressobj(
+        zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    self.crc = 0
+    self.file_size = 0
+    self.compress_size = 0
+
+    zip_info.header_offset = self.output_file.tell()
+    self.output_file.write(_LocalFileHeader(zip_info, archive.allow_zip64))
+
+  def write(self, data):
+    """Compress data into the entry."""
+    self.crc = zlib.crc32(data, self.crc)
+    self.file_size += len(data)
+
+    compressed_data = self.compressor.compress(data)
+
+    if compressed_data:
+      self.compress_size += len(compressed_data)
+      self.output_file.write(compressed_data)
+
+  def close(self):
+    """Finish the entry, writing its data descriptor."""
+    compressed_data = self.compressor.flush()
+    self.compress_size += len(compressed_data)
+    self.output_file.write(compressed_data)
+
+    self.zip_info.CRC = self.crc & 0xffffffff
+    self.zip_info.file_size = self.file_size
+    self.zip_info.compress_size = self.compress_size
+
+    if self.archive.allow_zip64:
+      descriptor_format = _ZIP64_DATA_DESCRIPTOR_FORMAT
+    elif max(self.file_size, self.compress_size) > zipfile.ZIP64_LIMIT:
+      raise zipfile.LargeZipFile(
+          'Archive entry %s would require zip64 extensions' %
+          self.zip_info.filename)
+    else:
+      descriptor_format = _DATA_DESCRIPTOR_FORMAT
+
+    self.output_file.write(
+        struct.pack(descriptor_format, _DATA_DESCRIPTOR_SIGNATURE,
+                    self.zip_info.CRC, self.compress_size, self.file_size))
+
+    self.archive._FinishEntry(self.zip_info)
+
+
+class DatasetArchive(object):
+  """A zip archive that the files of a DSPL dataset are written into.
+
+  Attributes:
+    zip_file: The underlying zipfile.ZipFile object, opened for writing
+    output_file: The file object that entries are written to
+    allow_zip64: Whether entries may be larger than 4 GB; if so, every entry
+                 is written with zip64 sizes
+  """
+
+  def __init__(self, archive_file, allow_zip64=True):
+    """Create a new DatasetArchive object.
+
+    Args:
+      archive_file: Path of the zip file to create, or a file-like object
+                    opened for binary writing
+      allow_zip64: Whether to use zip64 extensions, which allow entries larger
+                   than 4 GB but can't be read by some old unzip tools
+    """
+    if isinstance(archive_file, basestring):
+      self.output_file = open(archive_file, 'wb')
+      self.close_output_file = True
+    else:
+      self.output_file = archive_file
+      self.close_output_file = False
+
+    self.allow_zip64 = allow_zip64
+    self.zip_file = zipfile.ZipFile(
+        self.output_file, 'w', zipfile.ZIP_DEFLATED, allowZip64=allow_zip64)
+    self.open_entry = None
+
+  def OpenEntry(self, name):
+    """Start a new entry in the archive.
+
+    Args:
+      name: Name of the file in the archive
+
+    Returns:
+      An ArchiveEntry object, which must be closed before the next entry is
+      opened
+
+    Raises:
+      DSPLModelError: If another entry is still open, or if there's already
+                      an entry with this name
+    """
+    if self.open_entry:
+      raise dspl_model.DSPLModelError(
+          'Archive entry %s must be closed before opening %s' %
+          (self.open_entry.zip_info.filename, name))
+
+    if self.Contains(name):
+      raise dspl_model.DSPLModelError(
+          'Archive already has an entry named %s' % name)
+
+    zip_info = zipfile.ZipInfo(name, time.localtime()[:6])
+    zip_info.compress_type = zipfile.ZIP_DEFLATED
+    zip_info.flag_bits |= _DATA_DESCRIPTOR_FLAG
+    zip_info.external_attr = 0644 << 16
+
+    self.open_entry = ArchiveEntry(self, zip_info)
+
+    return self.open_entry
+
+  def _FinishEntry(self, zip_info):
+    """Add a closed entry to the archive's central directory."""
+    _AddToDirectory(self.zip_file, zip_info)
+    self.open_entry = None
+
+  def WriteRows(self, name, rows):
+    """Write CSV rows into a new entry.
+
+    Args:
+      name: Name of the CSV file in the archive
+      rows: An iterable of sequences of values, one for each row
+    """
+    entry = self.OpenEntry(name)
+    csv.writer(entry).writerows(rows)
+    entry.close()
+
+  def WriteString(self, name, data):
+    """Write a string into a new entry.
+
+    Args:
+      name: Name of the file in the archive
+      data: String holding the contents of the file
+    """
+    entry = self.OpenEntry(name)
+    entry.write(data)
+    entry.close()
+
+  def WriteFile(self, name, file_path):
+    """Copy a file on disk into a new entry.
+
+    Args:
+      name: Name of the file in the archive
+      file_path: Path of the file to copy
+    """
+    input_file = open(file_path, 'rb')
+
+    try:
+      entry = self.OpenEntry(name)
+
+      while True:
+        data = input_file.read(_COPY_BLOCK_SIZE)
+
+        if not data:
+          break
+
+        entry.write(data)
+
+      entry.close()
+    finally:
+      input_file.close()
+
+  def Contains(self, name):
+    """Check whether the archive has a finished entry with the given name."""
+    try:
+      self.zip_file.getinfo(name)
+    except KeyError:
+      return False
+
+    return True
+
+  def GetEntrySize(self, name):
+    """Get the uncompressed size, in bytes, of a finished entry."""
+    return self.zip_file.getinfo(name).file_size
+
+  def Close(self):
+    """Write the archive's central directory and close it."""
+    self.zip_file.close()
+
+    if self.close_output_file:
+      self.output_file.close()
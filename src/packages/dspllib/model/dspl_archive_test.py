@@ -0,0 +1,157 @@
+#!/usr/bin/python2.4
+#
+# Copyright 2011, Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tests of dspl_archive module."""
+
+
+__author__ = 'Benjamin Yolken <yolken@google.com>'
+
+import os
+import StringIO
+import struct
+import tempfile
+import unittest
+import zipfile
+
+import dspl_archive
+import dspl_model
+
+
+class DatasetArchiveTests(unittest.TestCase):
+  """Test cases for DatasetArchive object."""
+
+  def setUp(self):
+    self.archive_file = StringIO.StringIO()
+    self.archive = dspl_archive.DatasetArchive(self.archive_file)
+
+  def tearDown(self):
+    self.archive.Close()
+    self.archive_file.close()
+
+  def _ReadArchive(self):
+    """Read back the entries of the closed archive."""
+    zip_file = zipfile.ZipFile(StringIO.StringIO(self.archive_file.getvalue()))
+
+    self.assertEqual(zip_file.testzip(), None)
+
+    entries = dict(
+        [(name, zip_file.read(name)) for name in zip_file.namelist()])
+    zip_file.close()
+
+    return entries
+
+  def testWriteEntries(self):
+    """Test that rows, strings and files are streamed into entries."""
+    csv_file_params = tempfile.mkstemp()
+    os.write(csv_file_params[0], 'a,b\n' * 50000)
+    os.close(csv_file_params[0])
+
+    try:
+      self.archive.WriteRows('table.csv', [['col1', 'col2'], ['x', 1]])
+      self.archive.WriteString('dataset.xml', '<dspl/>')
+      self.archive.WriteFile('big_table.csv', csv_file_params[1])
+    finally:
+      os.remove(csv_file_params[1])
+
+    self.assertTrue(self.archive.Contains('table.csv'))
+    self.assertFalse(self.archive.Contains('other.csv'))
+    self.assertEqual(self.archive.GetEntrySize('big_table.csv'), 200000)
+
+    self.archive.Close()
+
+    self.assertEqual(
+        self._ReadArchive(),
+        {'table.csv': 'col1,col2\r\nx,1\r\n',
+         'dataset.xml': '<dspl/>',
+         'big_table.csv': 'a,b\n' * 50000})
+
+  def testZip64LocalHeaders(self):
+    """Test that local headers say whether data descriptors are zip64."""
+    self.archive.WriteString('dataset.xml', '<dspl/>')
+    self.archive.Close()
+
+    archive_data = self.archive_file.getvalue()
+    zip_file = zipfile.ZipFile(StringIO.StringIO(archive_data))
+    zip_info = zip_file.getinfo('dataset.xml')
+    zip_file.close()
+
+    # The local header's extra field follows its fixed part and file name
+    extra_start = zipfile.sizeFileHeader + len('dataset.xml')
+    self.assertEqual(
+        struct.unpack('<HHQQ', archive_data[extra_start:extra_start + 20]),
+        (1, 16, 0, 0))
+
+    # The data descriptor, with 64-bit sizes, is right before the next header
+    descriptor_end = archive_data.index(zipfile.stringCentralDir)
+    self.assertEqual(
+        struct.unpack('<4sLQQ', archive_data[descriptor_end - 24:
+                                             descriptor_end]),
+        ('PK\x07\x08', zip_info.CRC, zip_info.compress_size, 7))
+
+  def testWithoutZip64(self):
+    """Test that archives can be written without zip64 extensions."""
+    archive_file = StringIO.StringIO()
+    archive = dspl_archive.DatasetArchive(archive_file, allow_zip64=False)
+    archive.WriteString('dataset.xml', '<dspl/>')
+    archive.Close()
+
+    archive_data = archive_file.getvalue()
+    zip_file = zipfile.ZipFile(StringIO.StringIO(archive_data))
+
+    self.assertEqual(zip_file.read('dataset.xml'), '<dspl/>')
+
+    # The local header's extra field length is in its last two bytes
+    self.assertEqual(
+        struct.unpack('<H', archive_data[zipfile.sizeFileHeader - 2:
+                                         zipfile.sizeFileHeader]),
+        (0,))
+
+    zip_file.close()
+    archive_file.close()
+
+  def testEntryErrors(self):
+    """Test that overlapping and duplicate entries cause errors."""
+    entry = self.archive.OpenEntry('table.csv')
+
+    self.assertRaises(dspl_model.DSPLModelError,
+                      self.archive.OpenEntry, 'other.csv')
+
+    entry.write('data')
+    entry.close()
+
+    self.assertRaises(dspl_model.DSPLModelError,
+                      self.archive.OpenEntry, 'table.csv')
+
+    self.archive.Close()
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,344 @@
+#!/usr/bin/python2.4
+#
+# Copyright 2011, Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Compact, column-oriented storage for DSPL table data.
+
+Numeric columns are held in arrays of machine values, and all other columns
+as indices into lists of their distinct values, which takes far less memory
+than a list of Python objects for each row.
+"""
+
+
+__author__ = 'Benjamin Yolken <yolken@google.com>'
+
+import array
+import itertools
+
+
+# Type codes of the arrays holding value indices, from smallest to largest
+_INDEX_TYPECODES = ['B', 'H', 'I', 'L']
+
+
+class _EncodedColumn(object):
+  """A column stored as indices into a list of its distinct values."""
+
+  def __init__(self):
+    """Create a new, empty _EncodedColumn object."""
+    self.values = []
+    self.value_indices = {}
+    self.indices = array.array(_INDEX_TYPECODES[0])
+
+  def Append(self, value):
+    """Add a value to the end of the column.
+
+    Args:
+      value: The value to add, which must be hashable
+    """
+    try:
+      self.indices.append(self.value_indices[value])
+    except KeyError:
+      index = len(self.values)
+
+      # Switch to a larger index type if the new index doesn't fit
+      if index >> (8 * self.indices.itemsize):
+        typecode = _INDEX_TYPECODES[
+            _INDEX_TYPECODES.index(self.indices.typecode) + 1]
+        self.indices = array.array(typecode, self.indices)
+
+      self.values.append(value)
+      self.value_indices[value] = index
+      self.indices.append(index)
+
+  def Finish(self):
+    """Release the memory only needed while values are being added."""
+    self.value_indices = None
+
+  def Dump(self):
+    """Get the column contents, for storing outside of Python objects.
+
+    Returns:
+      A (description, array) tuple, where the description is a tuple of basic
+      Python values and the array holds the column's value indices
+    """
+    return (('encoded', self.values), self.indices)
+
+  def __iter__(self):
+    return itertools.imap(self.values.__getitem__, self.indices)
+
+
+class _NumericColumn(object):
+  """A column of integer or float values stored in an array.
+
+  Values can be added either as numbers or as their string representations,
+  but not a mix of both; string values are only accepted if they are the
+  canonical representations of their numbers, so they are iterated over
+  exactly as they were added.
+  """
+
+  def __init__(self, typecode, value_type):
+    """Create a new, empty _NumericColumn object.
+
+    Args:
+      typecode: Type code of the array holding the values
+      value_type: Either int or float
+    """
+    self.values = array.array(typecode)
+    self.value_type = value_type
+    self.as_strings = None
+
+    # Function giving the canonical string representation of a value
+    if value_type is float:
+      self.format_function = repr
+    else:
+      self.format_function = str
+
+  def Append(self, value):
+    """Add a value to the end of the column.
+
+    Args:
+      value: The value to add
+
+    Raises:
+      TypeError: If the value isn't of the column's type
+      ValueError: If the value is a string that isn't the canonical
+                  representation of a number of the column's type
+      OverflowError: If the value is too large to store in the array
+    """
+    value_class = value.__class__
+
+    if value_class is str:
+      if self.as_strings is False:
+        raise TypeError('Column mixes strings and numbers')
+
+      number = self.value_type(value)
+
+      if self.format_function(number) != value:
+        raise ValueError('Value changes when parsed: %s' % value)
+
+      self.as_strings = True
+    elif (value_class is self.value_type or
+          (value_class is long and self.value_type is int)):
+      if self.as_strings:
+        raise TypeError('Column mixes strings and numbers')
+
+      number = value
+      self.as_strings = False
+    else:
+      raise TypeError('Value is not of the column type: %r' % (value,))
+
+    self.values.append(number)
+
+  def Finish(self):
+    """Release the memory only needed while values are being added."""
+    pass
+
+  def Dump(self):
+    """Get the column contents, for storing outside of Python objects.
+
+    Returns:
+      A (description, array) tuple, where the description is a tuple of basic
+      Python values and the array holds the column's values
+    """
+    return (('numeric', self.value_type is float, self.as_strings),
+            self.values)
+
+  def __iter__(self):
+    if self.as_strings:
+      return itertools.imap(self.format_function, self.values)
+    else:
+      return iter(self.values)
+
+
+def _LoadColumn(description, column_array):
+  """Recreate a column from the results of its Dump method.
+
+  Args:
+    description: Description of the column returned by Dump
+    column_array: Array returned by Dump
+
+  Returns:
+    A finished column object
+  """
+  if description[0] == 'encoded':
+    column = _EncodedColumn()
+    column.values = description[1]
+    column.indices = column_array
+    column.Finish()
+  else:
+    if description[1]:
+      column = _NumericColumn(column_array.typecode, float)
+    else:
+      column = _NumericColumn(column_array.typecode, int)
+
+    column.values = column_array
+    column.as_strings = description[2]
+
+  return column
+
+
+def _NewColumn(data_type):
+  """Create an empty column suited to a DSPL data type.
+
+  Args:
+    data_type: One of {'boolean', 'date', 'float', 'integer', 'string'}
+
+  Returns:
+    An empty column object
+  """
+  if data_type == 'integer':
+    return _NumericColumn('l', int)
+  elif data_type == 'float':
+    return _NumericColumn('d', float)
+  else:
+    return _EncodedColumn()
+
+
+class ColumnarData(object):
+  """Table data stored as one compact column object for each column.
+
+  Integer and float columns are stored in arrays, falling back to the encoding
+  used for other columns if they hold values that an array can't reproduce
+  exactly (e.g., empty strings or numbers with leading zeros).
+
+  Attributes:
+    header: List of the column IDs, in the order of the row values
+    num_rows: Number of rows stored, not counting the header
+  """
+
+  def __init__(self, header, data_types):
+    """Create a new, empty ColumnarData object.
+
+    Args:
+      header: Sequence of column IDs
+      data_types: Sequence of the DSPL data types of the columns, in the same
+                  order as the header
+    """
+    self.header = list(header)
+    self.num_rows = 0
+    self._columns = [_NewColumn(data_type) for data_type in data_types]
+    self._column_appends = [column.Append for column in self._columns]
+
+  def AppendRow(self, row):
+    """Add a row of values to the end of the data.
+
+    Args:
+      row: Sequence of values, one for each column
+
+    Raises:
+      ValueError: If the row doesn't have a value for each column
+    """
+    if len(row) != len(self._columns):
+      raise ValueError('Row has %d values; expected %d' %
+                       (len(row), len(self._columns)))
+
+    for c, value in enumerate(row):
+      try:
+        self._column_appends[c](value)
+      except (TypeError, ValueError, OverflowError):
+        # Re-encode the column's values so far, without the type restriction
+        encoded_column = _EncodedColumn()
+
+        for previous_value in self._columns[c]:
+          encoded_column.Append(previous_value)
+
+        encoded_column.Append(value)
+        self._columns[c] = encoded_column
+        self._column_appends[c] = encoded_column.Append
+
+    self.num_rows += 1
+
+  def Finish(self):
+    """Release the memory only needed while rows are being added."""
+    for column in self._columns:
+      column.Finish()
+
+  def Dump(self):
+    """Get the data, for storing outside of Python objects.
+
+    Returns:
+      A (description, arrays) tuple, where the description is a tuple of basic
+      Python values, which can be written with marshal, and the arrays list
+      holds one array for each column
+    """
+    column_descriptions = []
+    column_arrays = []
+
+    for column in self._columns:
+      (column_description, column_array) = column.Dump()
+      column_descriptions.append(column_description)
+      column_arrays.append(column_array)
+
+    return ((self.header, self.num_rows, column_descriptions), column_arrays)
+
+  @staticmethod
+  def Load(description, column_arrays):
+    """Recreate a ColumnarData object from the results of its Dump method.
+
+    Args:
+      description: Description of the data returned by Dump
+      column_arrays: List of arrays returned by Dump
+
+    Returns:
+      A finished ColumnarData object
+    """
+    (header, num_rows, column_descriptions) = description
+
+    columnar_data = ColumnarData(header, [])
+    columnar_data.num_rows = num_rows
+    columnar_data._columns = [
+        _LoadColumn(column_description, column_array)
+        for column_description, column_array
+        in zip(column_descriptions, column_arrays)]
+    columnar_data._column_appends = None
+
+    return columnar_data
+
+  def IterColumn(self, column_id):
+    """Iterate over the values of a single column.
+
+    Args:
+      column_id: ID of the column, as given in the header
+
+    Returns:
+      An iterator over the column values, in row order
+    """
+    return iter(self._columns[self.header.index(column_id)])
+
+  def __iter__(self):
+    """Iterate over the rows, as lists of values, not including the header."""
+    if not self._columns:
+      return iter([[]] * self.num_rows)
+
+    return itertools.imap(list, itertools.izip(*self._columns))
+
+  def __len__(self):
+    return self.num_rows
@@ -0,0 +1,107 @@
+#!/usr/bin/python2.4
+#
+# Copyright 2011, Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Tests of dspl_columns module."""
+
+
+__author__ = 'Benjamin Yolken <yolken@google.com>'
+
+import unittest
+
+import dspl_columns
+
+
+class ColumnarDataTests(unittest.TestCase):
+  """Test cases for ColumnarData object."""
+
+  def _StoreRows(self, header, data_types, rows):
+    """Store rows in a new ColumnarData object and check they are unchanged."""
+    columnar_data = dspl_columns.ColumnarData(header, data_types)
+
+    for row in rows:
+      columnar_data.AppendRow(row)
+
+    columnar_data.Finish()
+
+    self.assertEqual(len(columnar_data), len(rows))
+    self.assertEqual(list(columnar_data), rows)
+
+    return columnar_data
+
+  def testTypedValues(self):
+    """Test storing numeric values as numbers."""
+    columnar_data = self._StoreRows(
+        ['state', 'year', 'population'], ['string', 'date', 'integer'],
+        [['AL', '1980', 3894025], ['AK', '1980', 401851],
+         ['AL', '1990', 4040587]])
+
+    self.assertEqual(list(columnar_data.IterColumn('state')),
+                     ['AL', 'AK', 'AL'])
+    self.assertEqual(columnar_data._columns[0].values, ['AL', 'AK'])
+    self.assertEqual(columnar_data._columns[2].values.typecode, 'l')
+
+  def testStringValues(self):
+    """Test that numbers read as strings are read back as the same strings."""
+    columnar_data = self._StoreRows(
+        ['count', 'ratio'], ['integer', 'float'],
+        [['12', '0.5'], ['-3', '1e-05'], ['400', '2.25']])
+
+    self.assertEqual(columnar_data._columns[0].values.typecode, 'l')
+    self.assertEqual(columnar_data._columns[1].values.typecode, 'd')
+
+  def testFallbackEncoding(self):
+    """Test numeric columns with values that arrays can't reproduce."""
+    rows = [['1', '1.0', 1], ['007', '2', 2.5], ['', '3.0', 2 ** 70],
+            ['4', '', None]]
+    columnar_data = self._StoreRows(
+        ['a', 'b', 'c'], ['integer', 'float', 'integer'], rows)
+
+    for c in range(3):
+      self.assertEqual(columnar_data._columns[c].values,
+                       [row[c] for row in rows])
+
+  def testWideIndices(self):
+    """Test columns with more distinct values than fit in a byte."""
+    rows = [['value%d' % (r % 1000)] for r in range(3000)]
+    columnar_data = self._StoreRows(['value'], ['string'], rows)
+
+    self.assertEqual(columnar_data._columns[0].indices.typecode, 'H')
+
+  def testBadRow(self):
+    """Test that rows must have a value for each column."""
+    columnar_data = dspl_columns.ColumnarData(['a', 'b'], ['string', 'string'])
+
+    self.assertRaises(ValueError, columnar_data.AppendRow, ['x'])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,370 @@
+#!/usr/bin/python2.4
+#
+# Copyright 2011, Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Find the differences between two versions of a DSPL dataset.
+
+Metadata are compared by ID, using the same summaries of each object that
+are used to cache its XML. Table data are compared row by row, matching rows
+on their dimension (key) columns. Only an MD5 digest of the other values in
+each row of the old table is kept in memory while the new table is read, so
+neither version of a table needs to be held in memory as a whole.
+"""
+
+
+__author__ = 'Benjamin Yolken <yolken@google.com>'
+
+import hashlib
+
+
+class EntityDiff(object):
+  """Differences between the objects of one kind (e.g., concepts).
+
+  Attributes:
+    added: List of the IDs of objects only in the new dataset
+    removed: List of the IDs of objects only in the old dataset
+    changed: List of the IDs of objects in both datasets that differ
+  """
+
+  def __init__(self, added=(), removed=(), changed=()):
+    """Create a new EntityDiff object.
+
+    Args:
+      added: Sequence of the IDs of objects only in the new dataset
+      removed: Sequence of the IDs of objects only in the old dataset
+      changed: Sequence of the IDs of objects in both datasets that differ
+    """
+    self.added = list(added)
+    self.removed = list(removed)
+    self.changed = list(changed)
+
+  def IsEmpty(self):
+    """Whether no objects were added, removed or changed."""
+    return not (self.added or self.removed or self.changed)
+
+
+class RowDiff(EntityDiff):
+  """Differences between the data of the two versions of a table.
+
+  Rows are identified by tuples of their key column values, as strings.
+
+  Attributes:
+    key_columns: List of the IDs of the columns rows are matched on
+  """
+
+  def __init__(self, key_columns, added=(), removed=(), changed=()):
+    """Create a new RowDiff object.
+
+    Args:
+      key_columns: Sequence of the IDs of the columns rows are matched on
+      added: Sequence of the keys of rows only in the new table
+      removed: Sequence of the keys of rows only in the old table
+      changed: Sequence of the keys of rows in both tables that differ
+    """
+    EntityDiff.__init__(self, added, removed, changed)
+    self.key_columns = list(key_columns)
+
+
+class DataSetDiff(object):
+  """Differences between two versions of a dataset.
+
+  Attributes:
+    changed_fields: List of the names of changed top-level dataset fields
+                    (e.g., 'name')
+    imports: EntityDiff for the imports, by namespace ID
+    topics: EntityDiff for the topics, including nested ones
+    concepts: EntityDiff for the concepts
+    slices: EntityDiff for the slices
+    tables: EntityDiff for the table metadata (columns and file names)
+    table_rows: Dictionary mapping the ID of each table in both datasets to
+                a RowDiff for its data
+  """
+
+  def __init__(self):
+    """Create a new, empty DataSetDiff object."""
+    self.changed_fields = []
+    self.imports = EntityDiff()
+    self.topics = EntityDiff()
+    self.concepts = EntityDiff()
+    self.slices = EntityDiff()
+    self.tables = EntityDiff()
+    self.table_rows = {}
+
+  def IsEmpty(self):
+    """Whether the two versions of the dataset are the same."""
+    return (not self.changed_fields and
+            self.imports.IsEmpty() and self.topics.IsEmpty() and
+            self.concepts.IsEmpty() and self.slices.IsEmpty() and
+            self.tables.IsEmpty() and
+            all(row_diff.IsEmpty() for row_diff in self.table_rows.values()))
+
+  def __str__(self):
+    """Summarize the differences, one kind of object per line."""
+    lines = []
+
+    if self.changed_fields:
+      lines.append('Changed dataset fields: %s' %
+                   ', '.join(self.changed_fields))
+
+    for (entity_name, entity_diff) in [
+        ('imports', self.imports), ('topics', self.topics),
+        ('concepts', self.concepts), ('slices', self.slices),
+        ('tables', self.tables)]:
+      for (change_name, ids) in [('Added', entity_diff.added),
+                                 ('Removed', entity_diff.removed),
+                                 ('Changed', entity_diff.changed)]:
+        if ids:
+          lines.append('%s %s: %s' % (change_name, entity_name,
+                                      ', '.join(ids)))
+
+    for table_id in sorted(self.table_rows):
+      row_diff = self.table_rows[table_id]
+
+      if not row_diff.IsEmpty():
+        lines.append(
+            'Rows of table %s: %d added, %d removed, %d changed' %
+            (table_id, len(row_diff.added), len(row_diff.removed),
+             len(row_diff.changed)))
+
+    if not lines:
+      return 'No differences found'
+
+    return '\n'.join(lines)
+
+
+def _DiffEntities(old_objects, new_objects, get_id, get_key):
+  """Compare two sequences of model objects by ID.
+
+  Args:
+    old_objects: Sequence of objects in the old dataset
+    new_objects: Sequence of objects in the new dataset
+    get_id: Function returning the ID of an object
+    get_key: Function returning a summary of an object that changes whenever
+             the object does
+
+  Returns:
+    An EntityDiff object; IDs are in the order of the sequences
+  """
+  old_keys = dict((get_id(old_object), get_key(old_object))
+                  for old_object in old_objects)
+  new_ids = set()
+  entity_diff = EntityDiff()
+
+  for new_object in new_objects:
+    object_id = get_id(new_object)
+    new_ids.add(object_id)
+
+    if object_id not in old_keys:
+      entity_diff.added.append(object_id)
+    elif old_keys[object_id] != get_key(new_object):
+      entity_diff.changed.append(object_id)
+
+  entity_diff.removed = [get_id(old_object) for old_object in old_objects
+                         if get_id(old_object) not in new_ids]
+
+  return entity_diff
+
+
+def _IterTopics(topics):
+  """Iterate over topics and, recursively, all of their children."""
+  for topic in topics:
+    yield topic
+
+    for child_topic in _IterTopics(topic.children):
+      yield child_topic
+
+
+def _ValueString(value):
+  """Convert a table value into the string written to its CSV file."""
+  if isinstance(value, float):
+    return repr(value)
+  elif isinstance(value, unicode):
+    return value.encode('utf-8')
+  else:
+    return str(value)
+
+
+def _IterKeyedRows(table, key_columns):
+  """Iterate over the rows of a table, giving the key and digest of each.
+
+  Args:
+    table: dspl_model.Table object
+    key_columns: List of the IDs of the key columns
+
+  Yields:
+    A (key, digest) tuple for each row, where the key is a tuple of the key
+    column values and the digest is a hash of the names and values of all of
+    the other columns
+  """
+  rows = table.IterRows()
+  header = next(rows, None)
+
+  if header is None:
+    return
+
+  key_indices = [header.index(column_id) for column_id in key_columns
+                 if column_id in header]
+  value_indices = sorted([c for c in range(len(header))
+                          if c not in key_indices],
+                         key=lambda c: header[c])
+
+  for row in rows:
+    key = tuple([_ValueString(row[c]) for c in key_indices])
+    row_hash = hashlib.md5()
+
+    for c in value_indices:
+      row_hash.update('%s\x00%s\x00' % (header[c], _ValueString(row[c])))
+
+    yield (key, row_hash.digest())
+
+
+def DiffTableRows(old_table, new_table, key_columns=None):
+  """Compare the data of two versions of a table.
+
+  The old table is read first, keeping only the key and digest of each row,
+  and then the new table is read and compared against them.
+
+  Keys should be unique, but every row of a key that isn't is still compared:
+  the new rows with the key are matched with old ones with the same digest
+  where possible, and any left over are reported as added, changed or removed
+  once each.
+
+  Args:
+    old_table: dspl_model.Table object from the old dataset
+    new_table: dspl_model.Table object from the new dataset
+    key_columns: List of the IDs of the columns identifying each row, or None
+                 to identify rows by all of their values, in the columns of
+                 the new table
+
+  Returns:
+    A RowDiff object
+  """
+  if key_columns is None:
+    key_columns = (next(new_table.IterRows(), None) or
+                   next(old_table.IterRows(), None) or [])
+
+  # Maps each key to its row's digest, or to a list of the digests of all of
+  # its rows if there are several
+  old_digests = {}
+
+  for (key, digest) in _IterKeyedRows(old_table, key_columns):
+    old_digest = old_digests.get(key)
+
+    if old_digest is None:
+      old_digests[key] = digest
+    elif isinstance(old_digest, list):
+      old_digest.append(digest)
+    else:
+      old_digests[key] = [old_digest, digest]
+
+  row_diff = RowDiff(key_columns)
+
+  for (key, digest) in _IterKeyedRows(new_table, key_columns):
+    old_digest = old_digests.get(key)
+
+    if old_digest is None:
+      row_diff.added.append(key)
+    elif isinstance(old_digest, list):
+      if digest in old_digest:
+        old_digest.remove(digest)
+      else:
+        old_digest.pop(0)
+        row_diff.changed.append(key)
+
+      if not old_digest:
+        del old_digests[key]
+    else:
+      del old_digests[key]
+
+      if old_digest != digest:
+        row_diff.changed.append(key)
+
+  for key in sorted(old_digests):
+    if isinstance(old_digests[key], list):
+      row_diff.removed.extend([key] * len(old_digests[key]))
+    else:
+      row_diff.removed.append(key)
+
+  return row_diff
+
+
+def DiffDataSets(old_dataset, new_dataset, compare_data=True):
+  """Find the differences between two versions of a dataset.
+
+  Args:
+    old_dataset: dspl_model.DataSet object for the old version
+    new_dataset: dspl_model.DataSet object for the new version
+    compare_data: Whether to compare the data of the tables in both datasets,
+                  as well as their metadata
+
+  Returns:
+    A DataSetDiff object
+  """
+  dataset_diff = DataSetDiff()
+
+  for field_name in ['namespace', 'name', 'description', 'url',
+                     'provider_name', 'provider_url']:
+    if getattr(old_dataset, field_name) != getattr(new_dataset, field_name):
+      dataset_diff.changed_fields.append(field_name)
+
+  dataset_diff.imports = _DiffEntities(
+      old_dataset.imports, new_dataset.imports,
+      lambda import_obj: import_obj.namespace_id,
+      lambda import_obj: import_obj.namespace_url)
+  dataset_diff.topics = _DiffEntities(
+      list(_IterTopics(old_dataset.topics)),
+      list(_IterTopics(new_dataset.topics)),
+      lambda topic: topic.topic_id,
+      lambda topic: (topic.topic_name,
+                     [child_topic.topic_id for child_topic in topic.children]))
+  dataset_diff.concepts = _DiffEntities(
+      old_dataset.concepts, new_dataset.concepts,
+      lambda concept: concept.concept_id,
+      lambda concept: (concept.concept_reference, concept.XMLCacheKey()))
+  dataset_diff.slices = _DiffEntities(
+      old_dataset.slices, new_dataset.slices,
+      lambda data_slice: data_slice.slice_id,
+      lambda data_slice: data_slice.XMLCacheKey())
+  dataset_diff.tables = _DiffEntities(
+      old_dataset.tables, new_dataset.tables,
+      lambda table: table.table_id,
+      lambda table: table.XMLCacheKey())
+
+  if compare_data:
+    for new_table in new_dataset.tables:
+      old_table = old_dataset.GetTable(new_table.table_id)
+
+      if old_table is not None:
+        dataset_diff.table_rows[new_table.table_id] = DiffTableRows(
+            old_table, new_table,
+            new_dataset.GetTableKeyColumns(new_table.table_id))
+
+  return dataset_diff
@@ -0,0 +1,204 @@
+#!/usr/bin/python2.4
+#
+# Copyright 2011, Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Tests of dspl_diff module."""
+
+
+__author__ = 'Benjamin Yolken <yolken@google.com>'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import dspl_diff
+import dspl_model
+import dspl_model_loader
+import dspl_snapshot
+
+
+def _MakeDataSet(population_rows, state_name='State'):
+  """Make a small dataset with a state concept and a population slice."""
+  dataset = dspl_model.DataSet(name='Population', verbose=False)
+  dataset.AddConcept(
+      dspl_model.Concept('state', state_name, data_type='string',
+                         table_ref='state_table'))
+  dataset.AddConcept(dspl_model.Concept('population', data_type='integer'))
+  dataset.AddConcept(
+      dspl_model.Concept('time:year', concept_reference='time:year'))
+  dataset.AddSlice(
+      dspl_model.Slice('slice', ('state', 'time:year'), ('population',),
+                       {'time:year': 'year'}, {}, 'slice_table'))
+  dataset.AddTable(
+      dspl_model.Table(
+          'state_table', [dspl_model.TableColumn('state', 'string'),
+                          dspl_model.TableColumn('name', 'string')],
+          'state.csv', [['state', 'name'], ['AL', 'Alabama']],
+          verbose=False))
+  dataset.AddTable(
+      dspl_model.Table(
+          'slice_table', [dspl_model.TableColumn('state', 'string'),
+                          dspl_model.TableColumn('year', 'date'),
+                          dspl_model.TableColumn('population', 'integer')],
+          'slice.csv', [['state', 'year', 'population']] + population_rows,
+          verbose=False))
+
+  return dataset
+
+
+class DSPLDiffTests(unittest.TestCase):
+  """Test cases for dspl_diff module."""
+
+  def setUp(self):
+    self.old_dataset = _MakeDataSet(
+        [['AL', '1990', '4040587'], ['AK', '1990', '550043'],
+         ['AZ', '1990', '3665228']])
+
+  def testNoDifferences(self):
+    """Test comparing a dataset with an equal copy of itself."""
+    new_dataset = _MakeDataSet(
+        [['AL', '1990', 4040587], ['AK', '1990', 550043],
+         ['AZ', '1990', 3665228]])
+
+    dataset_diff = dspl_diff.DiffDataSets(self.old_dataset, new_dataset)
+
+    self.assertTrue(dataset_diff.IsEmpty())
+    self.assertEqual(str(dataset_diff), 'No differences found')
+
+  def testMetadataDifferences(self):
+    """Test finding added, removed and changed metadata."""
+    new_dataset = _MakeDataSet([], state_name='US State')
+    new_dataset.name = 'US Population'
+    new_dataset.AddConcept(dspl_model.Concept('area', data_type='float'))
+    new_dataset.concepts.remove(new_dataset.GetConcept('population'))
+    new_dataset.GetTable('slice_table').columns[1].data_format = 'yyyy'
+
+    dataset_diff = dspl_diff.DiffDataSets(
+        self.old_dataset, new_dataset, compare_data=False)
+
+    self.assertEqual(dataset_diff.changed_fields, ['name'])
+    self.assertEqual(dataset_diff.concepts.added, ['area'])
+    self.assertEqual(dataset_diff.concepts.removed, ['population'])
+    self.assertEqual(dataset_diff.concepts.changed, ['state'])
+    self.assertTrue(dataset_diff.slices.IsEmpty())
+    self.assertEqual(dataset_diff.tables.changed, ['slice_table'])
+    self.assertEqual(dataset_diff.table_rows, {})
+
+  def testRowDifferences(self):
+    """Test finding rows added, removed and changed, keyed on dimensions."""
+    new_dataset = _MakeDataSet(
+        [['AZ', '1990', '3665228'], ['AL', '1990', '4040588'],
+         ['CA', '1990', '29760021']])
+    new_slice_table = new_dataset.GetTable('slice_table')
+    new_slice_table.CompactData()
+
+    dataset_diff = dspl_diff.DiffDataSets(self.old_dataset, new_dataset)
+
+    row_diff = dataset_diff.table_rows['slice_table']
+    self.assertEqual(row_diff.key_columns, ['state', 'year'])
+    self.assertEqual(row_diff.added, [('CA', '1990')])
+    self.assertEqual(row_diff.removed, [('AK', '1990')])
+    self.assertEqual(row_diff.changed, [('AL', '1990')])
+    self.assertTrue(dataset_diff.table_rows['state_table'].IsEmpty())
+    self.assertEqual(
+        str(dataset_diff),
+        'Rows of table slice_table: 1 added, 1 removed, 1 changed')
+
+  def testColumnOrder(self):
+    """Test that rows match when the columns are in a different order."""
+    new_table = dspl_model.Table(
+        'slice_table',
+        table_data=[['population', 'year', 'state'],
+                    ['4040587', '1990', 'AL'], ['550043', '1990', 'AK'],
+                    ['3665228', '1990', 'AZ']])
+
+    row_diff = dspl_diff.DiffTableRows(
+        self.old_dataset.GetTable('slice_table'), new_table,
+        ['state', 'year'])
+
+    self.assertTrue(row_diff.IsEmpty())
+
+  def testDuplicateKeys(self):
+    """Test that no rows are lost when keys aren't unique."""
+    old_table = dspl_model.Table(
+        'table', table_data=[['key', 'value'], ['x', '1'], ['x', '2'],
+                             ['y', '3'], ['y', '3']])
+    new_table = dspl_model.Table(
+        'table', table_data=[['key', 'value'], ['x', '2'], ['x', '4'],
+                             ['x', '5'], ['y', '3']])
+
+    row_diff = dspl_diff.DiffTableRows(old_table, new_table, ['key'])
+
+    self.assertEqual(row_diff.added, [('x',)])
+    self.assertEqual(row_diff.removed, [('y',)])
+    self.assertEqual(row_diff.changed, [('x',)])
+
+    # Without key columns, rows are identified by all of their values
+    row_diff = dspl_diff.DiffTableRows(old_table, new_table)
+
+    self.assertEqual(row_diff.key_columns, ['key', 'value'])
+    self.assertEqual(row_diff.added, [('x', '4'), ('x', '5')])
+    self.assertEqual(row_diff.removed, [('x', '1'), ('y', '3')])
+    self.assertEqual(row_diff.changed, [])
+
+  def testLoadedDataSets(self):
+    """Test that datasets built in different ways are compared by content."""
+    output_path = tempfile.mkdtemp()
+
+    try:
+      self.old_dataset.Materialize(output_path)
+      loaded_dataset = dspl_model_loader.LoadDSPLFromFiles(
+          os.path.join(output_path, 'dataset.xml'))
+
+      snapshot_path = os.path.join(output_path, 'dataset.snapshot')
+      snapshot_file = open(snapshot_path, 'wb')
+      dspl_snapshot.SaveSnapshot(loaded_dataset, snapshot_file)
+      snapshot_file.close()
+
+      dataset_diff = dspl_diff.DiffDataSets(
+          loaded_dataset, dspl_snapshot.LoadSnapshot(snapshot_path))
+      self.assertTrue(dataset_diff.IsEmpty())
+
+      # Materializing fills in placeholder names and descriptions, but the
+      # slices and tables are the same as those of the original
+      dataset_diff = dspl_diff.DiffDataSets(self.old_dataset, loaded_dataset)
+      self.assertTrue(dataset_diff.slices.IsEmpty())
+      self.assertTrue(dataset_diff.tables.IsEmpty())
+      self.assertTrue(
+          all(row_diff.IsEmpty()
+              for row_diff in dataset_diff.table_rows.values()))
+    finally:
+      shutil.rmtree(output_path)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,297 @@
+#!/usr/bin/python2.4
+#
+# Copyright 2011, Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Merge several DSPL datasets, e.g. generated separately by region, into one.
+
+Imports, topics, concepts, slices and tables are combined by ID; objects with
+the same ID must be the same in every dataset they appear in. The data of
+tables with the same ID are concatenated with a k-way merge on the tables' key
+columns, which streams through the tables, so that the merged table stays
+sorted without the input rows being collected into lists.
+"""
+
+
+__author__ = 'Benjamin Yolken <yolken@google.com>'
+
+import heapq
+
+import dspl_model
+
+
+class DSPLMergeError(Exception):
+  """Base class for exceptions in the dspl_merge module."""
+  pass
+
+
+def _MergeEntities(entity_name, object_lists, get_id, get_key):
+  """Combine lists of model objects by ID, checking for conflicts.
+
+  Args:
+    entity_name: Name of the kind of object, for error messages
+    object_lists: Sequence of lists of objects, one from each dataset
+    get_id: Function returning the ID of an object
+    get_key: Function returning a summary of an object that differs whenever
+             two objects differ
+
+  Returns:
+    List of the first object with each ID, in the order they were found
+
+  Raises:
+    DSPLMergeError: If two objects with the same ID differ
+  """
+  merged_keys = {}
+  merged_objects = []
+
+  for object_list in object_lists:
+    for model_object in object_list:
+      object_id = get_id(model_object)
+      object_key = get_key(model_object)
+
+      if object_id not in merged_keys:
+        merged_keys[object_id] = object_key
+        merged_objects.append(model_object)
+      elif merged_keys[object_id] != object_key:
+        raise DSPLMergeError(
+            'Datasets have conflicting definitions of %s: %s' %
+            (entity_name, object_id))
+
+  return merged_objects
+
+
+def _IterReorderedRows(rows, header, merged_header):
+  """Reorder the values in rows to match the merged table's header.
+
+  Args:
+    rows: Iterable of rows, not including the header
+    header: List of the column IDs of the rows
+    merged_header: List of the column IDs of the merged table
+
+  Returns:
+    An iterable of rows with their values in the order of the merged header
+  """
+  if header == merged_header:
+    return rows
+
+  value_indices = [header.index(column_id) for column_id in merged_header]
+
+  return ([row[c] for c in value_indices] for row in rows)
+
+
+def _IterKeyedRows(table, header, merged_header, key_indices, table_index):
+  """Iterate over the rows of a table, together with their keys.
+
+  Args:
+    table: dspl_model.Table object
+    header: List of the column IDs of the table
+    merged_header: List of the column IDs of the merged table
+    key_indices: Positions of the key columns in the merged header
+    table_index: Position of the table among those being merged
+
+  Yields:
+    A (key, table index, row) tuple for each row, not including the header,
+    with the row values in the order of the merged header
+  """
+  rows = table.IterRows()
+  next(rows)
+
+  for row in _IterReorderedRows(rows, header, merged_header):
+    yield (tuple([row[c] for c in key_indices]), table_index, row)
+
+
+def _IsSorted(keyed_rows):
+  """Check whether (key, table index, row) tuples are in key order."""
+  previous_key = None
+
+  for r, (key, unused_table_index, unused_row) in enumerate(keyed_rows):
+    if r > 0 and key < previous_key:
+      return False
+
+    previous_key = key
+
+  return True
+
+
+def MergeTableRows(tables, key_columns=None):
+  """Merge the rows of several versions of a table, in key order.
+
+  Each table is first read once to check that it is sorted by the key columns;
+  tables that aren't are sorted in memory. Rows with the same key are only
+  included once, and must be the same in every table.
+
+  Args:
+    tables: Sequence of dspl_model.Table objects, with the same columns
+    key_columns: List of the IDs of the columns identifying each row, or None
+                 to identify rows by all of their values
+
+  Yields:
+    The header of the merged table, and then each of its rows
+
+  Raises:
+    DSPLMergeError: If the tables have different columns, or rows with the
+                    same key but different values
+  """
+  merged_header = None
+  table_headers = []
+
+  for table in tables:
+    rows = table.IterRows()
+    header = next(rows, None)
+
+    if header is None:
+      continue
+
+    header = list(header)
+
+    if merged_header is None:
+      merged_header = header
+    elif sorted(header) != sorted(merged_header):
+      raise DSPLMergeError(
+          'Versions of table %s have different columns' % table.table_id)
+
+    table_headers.append((table, header))
+
+  if merged_header is None:
+    return
+
+  if key_columns is None:
+    key_indices = range(len(merged_header))
+  else:
+    key_indices = [merged_header.index(column_id)
+                   for column_id in key_columns if column_id in merged_header]
+
+  keyed_row_iterables = []
+
+  for (table_index, (table, header)) in enumerate(table_headers):
+    keyed_rows = _IterKeyedRows(
+        table, header, merged_header, key_indices, table_index)
+
+    if _IsSorted(keyed_rows):
+      keyed_row_iterables.append(
+          _IterKeyedRows(table, header, merged_header, key_indices,
+                         table_index))
+    else:
+      keyed_row_iterables.append(
+          sorted(_IterKeyedRows(table, header, merged_header, key_indices,
+                                table_index)))
+
+  yield merged_header
+
+  previous_key = None
+  previous_row = None
+
+  for (key, unused_index, row) in heapq.merge(*keyed_row_iterables):
+    if previous_row is not None and key == previous_key:
+      if row != previous_row:
+        raise DSPLMergeError(
+            'Versions of table %s have different rows for key: %s' %
+            (tables[0].table_id, ', '.join([str(value) for value in key])))
+
+      continue
+
+    yield row
+
+    previous_key = key
+    previous_row = row
+
+
+def MergeDataSets(datasets):
+  """Merge several datasets into one.
+
+  The top-level information of the merged dataset (e.g., its name) is taken
+  from the first dataset. The merged dataset shares its import, topic, concept
+  and slice objects with the argument datasets; its tables are new, and hold
+  their data as typed columns (see Table.CompactData).
+
+  Args:
+    datasets: Sequence of dspl_model.DataSet objects
+
+  Returns:
+    A new dspl_model.DataSet object
+
+  Raises:
+    DSPLMergeError: If there are no datasets, or objects with the same ID
+                    that differ between datasets
+  """
+  if not datasets:
+    raise DSPLMergeError('No datasets to merge')
+
+  first_dataset = datasets[0]
+
+  merged_dataset = dspl_model.DataSet(
+      namespace=first_dataset.namespace,
+      name=first_dataset.name,
+      description=first_dataset.description,
+      url=first_dataset.url,
+      provider_name=first_dataset.provider_name,
+      provider_url=first_dataset.provider_url,
+      verbose=first_dataset.verbose)
+
+  merged_dataset.imports = _MergeEntities(
+      'import', [dataset.imports for dataset in datasets],
+      lambda import_obj: import_obj.namespace_id,
+      lambda import_obj: import_obj.namespace_url)
+  merged_dataset.topics = _MergeEntities(
+      'topic', [dataset.topics for dataset in datasets],
+      lambda topic: topic.topic_id,
+      lambda topic: topic.XMLCacheKey())
+  merged_dataset.concepts = _MergeEntities(
+      'concept', [dataset.concepts for dataset in datasets],
+      lambda concept: concept.concept_id,
+      lambda concept: (concept.concept_reference, concept.XMLCacheKey()))
+  merged_dataset.slices = _MergeEntities(
+      'slice', [dataset.slices for dataset in datasets],
+      lambda data_slice: data_slice.slice_id,
+      lambda data_slice: data_slice.XMLCacheKey())
+
+  merged_tables = _MergeEntities(
+      'table', [dataset.tables for dataset in datasets],
+      lambda table: table.table_id,
+      lambda table: table.XMLCacheKey())
+
+  for merged_table in merged_tables:
+    table_versions = [dataset.GetTable(merged_table.table_id)
+                      for dataset in datasets]
+    table_versions = [table for table in table_versions if table is not None]
+
+    new_table = dspl_model.Table(
+        table_id=merged_table.table_id,
+        columns=merged_table.columns,
+        file_name=merged_table.file_name,
+        verbose=merged_table.verbose)
+    new_table.CompactData(
+        MergeTableRows(
+            table_versions,
+            merged_dataset.GetTableKeyColumns(merged_table.table_id)))
+
+    merged_dataset.AddTable(new_table)
+
+  return merged_dataset
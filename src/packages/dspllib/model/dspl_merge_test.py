@@ -0,0 +1,168 @@
+#!/usr/bin/python2.4
+#
+# Copyright 2011, Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Tests of dspl_merge module."""
+
+
+__author__ = 'Benjamin Yolken <yolken@google.com>'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import dspl_merge
+import dspl_model
+import dspl_model_loader
+
+
+def _MakeRegionalDataSet(state_rows, population_rows):
+  """Make a dataset with the states and populations of one region."""
+  dataset = dspl_model.DataSet(name='Population', verbose=False)
+  dataset.AddImport(
+      dspl_model.Import('time', 'http://www.google.com/publicdata/time'))
+  dataset.AddConcept(
+      dspl_model.Concept('state', 'State', 'A US state', data_type='string',
+                         table_ref='state_table'))
+  dataset.AddConcept(
+      dspl_model.Concept('population', 'Population', 'Number of people',
+                         data_type='integer'))
+  dataset.AddConcept(
+      dspl_model.Concept('time:year', concept_reference='time:year'))
+  dataset.AddSlice(
+      dspl_model.Slice('slice', ('time:year', 'state'), ('population',),
+                       {'time:year': 'year'}, {}, 'slice_table'))
+  dataset.AddTable(
+      dspl_model.Table(
+          'state_table', [dspl_model.TableColumn('state', 'string'),
+                          dspl_model.TableColumn('name', 'string')],
+          'state.csv', [['state', 'name']] + state_rows, verbose=False))
+  dataset.AddTable(
+      dspl_model.Table(
+          'slice_table', [dspl_model.TableColumn('year', 'date'),
+                          dspl_model.TableColumn('state', 'string'),
+                          dspl_model.TableColumn('population', 'integer')],
+          'slice.csv', [['year', 'state', 'population']] + population_rows,
+          verbose=False))
+
+  return dataset
+
+
+class DSPLMergeTests(unittest.TestCase):
+  """Test cases for dspl_merge module."""
+
+  def setUp(self):
+    self.west_dataset = _MakeRegionalDataSet(
+        [['AK', 'Alaska'], ['CA', 'California']],
+        [['1990', 'AK', '550043'], ['2000', 'AK', '626932'],
+         ['1990', 'CA', '29760021'], ['2000', 'CA', '33871648']])
+    self.south_dataset = _MakeRegionalDataSet(
+        [['AL', 'Alabama'], ['CA', 'California']],
+        [['1990', 'AL', '4040587'], ['2000', 'AL', '4447100']])
+
+  def testMergeDataSets(self):
+    """Test merging datasets with overlapping metadata and data."""
+    merged_dataset = dspl_merge.MergeDataSets(
+        [self.west_dataset, self.south_dataset])
+
+    self.assertEqual(
+        [concept.concept_id for concept in merged_dataset.concepts],
+        ['state', 'population', 'time:year'])
+    self.assertEqual(len(merged_dataset.imports), 1)
+    self.assertEqual(len(merged_dataset.slices), 1)
+
+    # Rows are merged by key, with time dimensions last, and duplicates
+    # dropped
+    self.assertEqual(
+        list(merged_dataset.GetTable('state_table').IterRows()),
+        [['state', 'name'], ['AK', 'Alaska'], ['AL', 'Alabama'],
+         ['CA', 'California']])
+    self.assertEqual(
+        list(merged_dataset.GetTable('slice_table').IterRows()),
+        [['year', 'state', 'population'],
+         ['1990', 'AK', '550043'], ['2000', 'AK', '626932'],
+         ['1990', 'AL', '4040587'], ['2000', 'AL', '4447100'],
+         ['1990', 'CA', '29760021'], ['2000', 'CA', '33871648']])
+    self.assertNotEqual(
+        merged_dataset.GetTable('slice_table').columnar_data, None)
+
+    # The input datasets are left as they were
+    self.assertEqual(len(self.west_dataset.GetTable('slice_table').table_data),
+                     5)
+
+  def testLoadedDataSet(self):
+    """Test merging a dataset loaded from files with a generated one."""
+    output_path = tempfile.mkdtemp()
+
+    try:
+      self.west_dataset.Materialize(output_path)
+      loaded_dataset = dspl_model_loader.LoadDSPLFromFiles(
+          os.path.join(output_path, 'dataset.xml'))
+
+      merged_dataset = dspl_merge.MergeDataSets(
+          [loaded_dataset, self.south_dataset])
+    finally:
+      shutil.rmtree(output_path)
+
+    self.assertEqual(len(merged_dataset.slices), 1)
+    self.assertEqual(
+        len(list(merged_dataset.GetTable('slice_table').IterRows())), 7)
+
+  def testUnsortedAndReorderedTables(self):
+    """Test merging tables that are unsorted or have reordered columns."""
+    first_table = dspl_model.Table(
+        'table', table_data=[['a', 'b'], ['3', 'x'], ['1', 'y']])
+    second_table = dspl_model.Table(
+        'table', table_data=[['b', 'a'], ['z', '2']])
+
+    self.assertEqual(
+        list(dspl_merge.MergeTableRows([first_table, second_table], ['a'])),
+        [['a', 'b'], ['1', 'y'], ['2', 'z'], ['3', 'x']])
+
+  def testConflicts(self):
+    """Test that conflicting objects and rows are detected."""
+    self.south_dataset.GetConcept('state').concept_name = 'US State'
+
+    self.assertRaises(dspl_merge.DSPLMergeError, dspl_merge.MergeDataSets,
+                      [self.west_dataset, self.south_dataset])
+
+    self.south_dataset.GetConcept('state').concept_name = 'State'
+    self.south_dataset.GetTable('state_table').table_data[2] = ['CA', 'Calif.']
+
+    self.assertRaises(dspl_merge.DSPLMergeError, dspl_merge.MergeDataSets,
+                      [self.west_dataset, self.south_dataset])
+
+    self.assertRaises(dspl_merge.DSPLMergeError, dspl_merge.MergeDataSets, [])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -39,13 +39,25 @@ concept properties, etc.).
 __author__ = 'Benjamin Yolken <yolken@google.com>'
 
 import csv
+import functools
+import itertools
+import multiprocessing.pool
 import os
-import xml.dom.minidom
+import shutil
+import StringIO
+import time
 import xml.etree.ElementTree
 
+import dspl_columns
+import dspl_statistics
+import dspl_xml_writer
+
 
 _VALUE_LANGUAGE = 'en'
 
+# Size of the buffers used when writing and copying dataset files
+_WRITE_BUFFER_SIZE = 1 << 20
+
 
 class DSPLModelError(Exception):
   """Base class for exceptions in the dspl_model module."""
@@ -75,8 +87,253 @@ def _ValueOrPlaceHolder(value_string, description):
   return value_element
 
 
+def _CachedValue(model_object, cache_name, cache_key, build_function):
+  """Get a value cached on a model object, rebuilding it if its key changed.
+
+  Args:
+    model_object: Object the value is cached on
+    cache_name: Name of the attribute holding the cached key and value
+    cache_key: Summary of all of the object fields that the value depends
+               on
+    build_function: Function taking no arguments that builds the value
+
+  Returns:
+    The cached value, if its key equals the argument one, or else the newly
+    built value
+  """
+  cache = getattr(model_object, cache_name, None)
+
+  if cache is None or cache[0] != cache_key:
+    cache = (cache_key, build_function())
+    setattr(model_object, cache_name, cache)
+
+  return cache[1]
+
+
+def _TimedMaterializeData(arguments, output_path, write_statistics=False):
+  """Write a table's data to CSV, returning the number of seconds taken.
+
+  Args:
+    arguments: Tuple of the table and the lists of its key and group columns
+    output_path: Directory to write the CSV file to
+    write_statistics: Whether to write the statistics of the data too
+
+  Returns:
+    The number of seconds taken
+  """
+  (table, key_columns, group_columns) = arguments
+  start_time = time.time()
+  table.MaterializeData(
+      output_path, key_columns, group_columns, write_statistics)
+
+  return time.time() - start_time
+
+
+class _CompactObject(object):
+  """Base class for model objects that use __slots__ instead of a __dict__.
+
+  Datasets can hold hundreds of thousands of concepts, slices and columns, so
+  these objects leave out the per-instance dictionary. This class lets them be
+  pickled with any protocol, as objects with dictionaries can.
+  """
+
+  __slots__ = ()
+
+  def __getstate__(self):
+    state = {}
+
+    for cls in type(self).__mro__:
+      for name in getattr(cls, '__slots__', ()):
+        if hasattr(self, name):
+          state[name] = getattr(self, name)
+
+    return state
+
+  def __setstate__(self, state):
+    for name, value in state.items():
+      setattr(self, name, value)
+
+
+class _ObservedList(list):
+  """A list that calls its _Invalidate method whenever it is changed."""
+
+  def _Invalidate(self):
+    """Handle a change to the list; subclasses override this."""
+    pass
+
+  def append(self, item):
+    list.append(self, item)
+    self._Invalidate()
+
+  def extend(self, items):
+    list.extend(self, items)
+    self._Invalidate()
+
+  def __iadd__(self, items):
+    self.extend(items)
+    return self
+
+  def insert(self, position, item):
+    list.insert(self, position, item)
+    self._Invalidate()
+
+  def remove(self, item):
+    list.remove(self, item)
+    self._Invalidate()
+
+  def pop(self, *args):
+    self._Invalidate()
+    return list.pop(self, *args)
+
+  def sort(self, *args, **kwargs):
+    list.sort(self, *args, **kwargs)
+    self._Invalidate()
+
+  def reverse(self):
+    list.reverse(self)
+    self._Invalidate()
+
+  def __setitem__(self, key, value):
+    list.__setitem__(self, key, value)
+    self._Invalidate()
+
+  def __delitem__(self, key):
+    list.__delitem__(self, key)
+    self._Invalidate()
+
+  def __setslice__(self, start, end, items):
+    list.__setslice__(self, start, end, items)
+    self._Invalidate()
+
+  def __delslice__(self, start, end):
+    list.__delslice__(self, start, end)
+    self._Invalidate()
+
+  def __imul__(self, count):
+    list.__imul__(self, count)
+    self._Invalidate()
+    return self
+
+
+class _IndexedList(_ObservedList):
+  """A list of DSPL objects that also indexes them by ID.
+
+  The index is extended as objects are appended, and rebuilt on the next
+  lookup after any other change to the list. As with a linear search, the
+  first object with a given ID is the one found. The IDs of objects can also
+  be changed after they are indexed, so lookups that miss the index, or find
+  an object whose ID has changed, fall back to searching the list.
+  """
+
+  def __init__(self, id_attribute, items=()):
+    """Create a new _IndexedList object.
+
+    Args:
+      id_attribute: Name of the attribute holding the ID of each object
+      items: Sequence of objects to start the list with
+    """
+    list.__init__(self, items)
+    self.id_attribute = id_attribute
+    self.id_index = None
+
+  def _BuildIndex(self):
+    """Index every object in the list by its ID."""
+    self.id_index = {}
+
+    for item in self:
+      self.id_index.setdefault(getattr(item, self.id_attribute), item)
+
+  def Get(self, object_id):
+    """Get the first object with the argument ID, or None if there isn't one."""
+    if self.id_index is None:
+      self._BuildIndex()
+
+      return self.id_index.get(object_id)
+
+    item = self.id_index.get(object_id)
+
+    if item is None or getattr(item, self.id_attribute) != object_id:
+      # An ID was changed after the object was indexed; the index is only
+      # rebuilt if it's out of date, so lookups of missing IDs stay as cheap
+      # as a linear search
+      index_is_stale = item is not None
+      item = None
+
+      for list_item in self:
+        if getattr(list_item, self.id_attribute) == object_id:
+          item = list_item
+          index_is_stale = True
+          break
+
+      if index_is_stale:
+        self._BuildIndex()
+
+    return item
+
+  def __reduce__(self):
+    # Pickle the ID attribute along with the objects, but not the index
+    return (_IndexedList, (self.id_attribute, list(self)))
+
+  def _Invalidate(self):
+    """Drop the index, so that it's rebuilt on the next lookup."""
+    self.id_index = None
+
+  def append(self, item):
+    list.append(self, item)
+
+    if self.id_index is not None:
+      self.id_index.setdefault(getattr(item, self.id_attribute), item)
+
+  def extend(self, items):
+    for item in items:
+      self.append(item)
+
+
+class _TopicList(_ObservedList):
+  """A list of topics, either of a dataset or of the children of a topic.
+
+  Every change to any topic list is counted, so that DataSet.GetTopic can tell
+  whether its index of the topic tree is out of date.
+  """
+
+  modification_count = 0
+
+  def _Invalidate(self):
+    """Count the change."""
+    _TopicList.modification_count += 1
+
+
+def _IndexedListProperty(attribute_name, id_attribute):
+  """Create a property that stores any sequence assigned to it indexed.
+
+  Args:
+    attribute_name: Name of the attribute that holds the _IndexedList
+    id_attribute: Name of the attribute holding the ID of each object
+
+  Returns:
+    A property object
+  """
+  def _Get(self):
+    return getattr(self, attribute_name)
+
+  def _Set(self, items):
+    setattr(self, attribute_name, _IndexedList(id_attribute, items))
+
+  return property(_Get, _Set)
+
+
 class DataSet(object):
-  """Top-level representation of a DSPL dataset."""
+  """Top-level representation of a DSPL dataset.
+
+  The imports, concepts, slices and tables are kept in lists indexed by ID,
+  so that the Get* methods don't need to search them. These lists can be
+  changed or replaced directly, as well as through the Add* methods.
+  """
+
+  imports = _IndexedListProperty('_imports', 'namespace_id')
+  concepts = _IndexedListProperty('_concepts', 'concept_id')
+  slices = _IndexedListProperty('_slices', 'slice_id')
+  tables = _IndexedListProperty('_tables', 'table_id')
 
   def __init__(self, namespace='', name='', description='', url='',
                provider_name='', provider_url='', imports=(), topics=(),
@@ -104,11 +361,11 @@ class DataSet(object):
     self.provider_name = provider_name
     self.provider_url = provider_url
 
-    self.imports = list(imports)
+    self.imports = imports
     self.topics = list(topics)
-    self.concepts = list(concepts)
-    self.slices = list(slices)
-    self.tables = list(tables)
+    self.concepts = concepts
+    self.slices = slices
+    self.tables = tables
 
     self.verbose = verbose
 
@@ -118,16 +375,35 @@ class DataSet(object):
 
   def GetImport(self, namespace_id):
     """Get the import matching the argument namespace id."""
-    for import_obj in self.imports:
-      if import_obj.namespace_id == namespace_id:
-        return import_obj
+    return self.imports.Get(namespace_id)
 
-    return None
+  def _GetTopics(self):
+    return self._topics
+
+  def _SetTopics(self, topics):
+    self._topics = _TopicList(topics)
+    self.topic_index = None
+
+  topics = property(_GetTopics, _SetTopics)
 
   def AddTopic(self, topic_obj):
     """Add a top-level topic to this dataset."""
     self.topics.append(topic_obj)
 
+  def _BuildTopicIndex(self):
+    """Index all of the topics in the topic tree by ID."""
+    self.topic_index = {}
+    self.topic_index_count = _TopicList.modification_count
+    self._IndexTopics(self.topics)
+
+  def _IndexTopics(self, topic_list):
+    """Recursively add topics in a list, and their children, to the index."""
+    for topic_obj in topic_list:
+      self.topic_index.setdefault(topic_obj.topic_id, topic_obj)
+
+      if topic_obj.children:
+        self._IndexTopics(topic_obj.children)
+
   def _TopicSearchHelper(self, topic_list, topic_id):
     """Recursively search a list for the topic with the argument id."""
     for topic_obj in topic_list:
@@ -142,8 +418,26 @@ class DataSet(object):
     return None
 
   def GetTopic(self, topic_id):
-    """Get the topic matching the argument topic id."""
-    return self._TopicSearchHelper(self.topics, topic_id)
+    """Get the topic matching the argument topic id.
+
+    Topics are found through an index of the topic tree, which is rebuilt
+    after any change to the list of topics or of the children of a topic. IDs
+    of topics can also be changed directly, so topics missing from the index
+    are searched for in the tree, and the index is rebuilt if they are found.
+    """
+    if (self.topic_index is None or
+        self.topic_index_count != _TopicList.modification_count):
+      self._BuildTopicIndex()
+
+    topic_obj = self.topic_index.get(topic_id)
+
+    if topic_obj is None or topic_obj.topic_id != topic_id:
+      topic_obj = self._TopicSearchHelper(self.topics, topic_id)
+
+      if topic_obj:
+        self._BuildTopicIndex()
+
+    return topic_obj
 
   def AddConcept(self, concept):
     """Add a concept to this dataset."""
@@ -151,11 +445,7 @@ class DataSet(object):
 
   def GetConcept(self, concept_id):
     """Find the concept matching the argument ID."""
-    for concept in self.concepts:
-      if concept.concept_id == concept_id:
-        return concept
-
-    return None
+    return self.concepts.Get(concept_id)
 
   def AddSlice(self, data_slice):
     """Add a slice to this dataset."""
@@ -163,11 +453,7 @@ class DataSet(object):
 
   def GetSlice(self, slice_id):
     """Find slice matching the argument ID."""
-    for data_slice in self.slices:
-      if data_slice.slice_id == slice_id:
-        return data_slice
-
-    return None
+    return self.slices.Get(slice_id)
 
   def AddTable(self, table):
     """Add a table to this dataset."""
@@ -175,54 +461,206 @@ class DataSet(object):
 
   def GetTable(self, table_id):
     """Find the table matching the argument ID."""
-    for table in self.tables:
-      if table.table_id == table_id:
-        return table
+    return self.tables.Get(table_id)
 
-    return None
+  def GetTableKeyColumns(self, table_id):
+    """Get the IDs of the columns that identify the rows of a table.
+
+    Args:
+      table_id: ID of the table
+
+    Returns:
+      For a slice table, the list of the slice's dimension columns, with time
+      dimensions last; for a concept table, a list of the concept's column;
+      otherwise, None
+    """
+    table_keys = self._GetTableKeyMap().get(table_id)
+
+    if table_keys is None:
+      return None
+
+    return table_keys[0] + table_keys[1]
+
+  def _GetTableKeyMap(self):
+    """Map table IDs to their key columns, split by whether they're time.
+
+    Returns:
+      A dictionary mapping the IDs of slice and concept tables to tuples of the
+      lists of their non-time and time key columns, as for GetTableKeyColumns
+    """
+    table_keys = {}
 
-  def Materialize(self, output_path):
-    """Write the dataset XML and CSV files to the argument output path."""
+    for data_slice in self.slices:
+      if data_slice.table_ref in table_keys:
+        continue
+
+      non_time_columns = []
+      time_columns = []
+
+      for dimension_ref in data_slice.dimension_refs:
+        column_id = data_slice.dimension_map.get(dimension_ref, dimension_ref)
+        dimension = self.GetConcept(dimension_ref)
+
+        if dimension and 'time:' in dimension.concept_reference:
+          time_columns.append(column_id)
+        else:
+          non_time_columns.append(column_id)
+
+      table_keys[data_slice.table_ref] = (non_time_columns, time_columns)
+
+    for concept in self.concepts:
+      if concept.table_ref and concept.table_ref not in table_keys:
+        table_keys[concept.table_ref] = ([concept.concept_id], [])
+
+    return table_keys
+
+  def Materialize(self, output_path, run_report=None, num_workers=1,
+                  write_statistics=False):
+    """Write the dataset XML and CSV files to the argument output path.
+
+    Args:
+      output_path: Directory to write the files to
+      run_report: A reporting.RunReport object to record the time taken to
+                  write each file in, or None
+      num_workers: Number of threads to write the CSV files with
+      write_statistics: Whether to write the statistics of each table to a
+                        sidecar file next to its CSV file, for the validator;
+                        see dspl_statistics. This roughly doubles the time
+                        taken to write the CSV files.
+    """
     output_file_name = os.path.join(output_path, 'dataset.xml')
 
     if self.verbose:
       print 'Writing file: %s' % output_file_name
 
+    if run_report:
+      phase = run_report.StartPhase('materialize', 'dataset.xml')
+
     # Write XML file
-    xml_file = open(output_file_name, 'w')
-    xml_file.write(str(self))
-    xml_file.close()
+    xml_file = open(output_file_name, 'w', _WRITE_BUFFER_SIZE)
+
+    try:
+      self.WriteXML(xml_file)
+    finally:
+      xml_file.close()
+
+    if run_report:
+      phase.Finish(bytes_out=os.path.getsize(output_file_name))
+
+    # Write CSV files, which are independent of each other, so can be written
+    # at the same time. The statistics of each cover the keys and grouping
+    # that the validator checks the data for.
+    tables = list(self.tables)
+    write_arguments = []
+
+    if write_statistics:
+      table_keys = self._GetTableKeyMap()
+    else:
+      table_keys = {}
+
+    for table in tables:
+      (non_time_columns, time_columns) = table_keys.get(
+          table.table_id, ([], []))
+      write_arguments.append(
+          (table, non_time_columns + time_columns, non_time_columns))
+
+    worker_pool = None
+
+    if num_workers > 1 and len(tables) > 1:
+      worker_pool = multiprocessing.pool.ThreadPool(
+          min(num_workers, len(tables)))
+      write_times = worker_pool.imap(
+          functools.partial(_TimedMaterializeData, output_path=output_path,
+                            write_statistics=write_statistics),
+          write_arguments)
+    else:
+      write_times = (
+          _TimedMaterializeData(arguments, output_path, write_statistics)
+          for arguments in write_arguments)
+
+    try:
+      for table, wall_time in itertools.izip(tables, write_times):
+        if run_report:
+          phase = run_report.StartPhase('materialize', table.file_name)
+          phase.Finish(
+              wall_time=wall_time,
+              bytes_out=os.path.getsize(
+                  os.path.join(output_path, table.file_name)),
+              spilled=bool(table.spill_file_path))
+    finally:
+      if worker_pool:
+        worker_pool.terminate()
+        worker_pool.join()
+
+  def MaterializeArchive(self, archive, run_report=None):
+    """Write the dataset XML and CSV files into a zip archive and close it.
+
+    Tables that were already written to the archive with Table.ArchiveData are
+    left as they are. Spilled tables are copied into the archive from their
+    files.
 
-    # Write CSV files
+    Args:
+      archive: A dspl_archive.DatasetArchive object
+      run_report: A reporting.RunReport object to record the time taken to
+                  write each file in, or None
+    """
     for table in self.tables:
-      table.MaterializeData(output_path)
+      if archive.Contains(table.file_name):
+        continue
 
-  def ToXMLElement(self):
-    """Convert object to its ElementTree XML representation.
+      if self.verbose:
+        print 'Archiving file: %s' % table.file_name
 
-    Recursively calls the ToXMLElement method for all of its concept, slice,
-    and table children.
+      if run_report:
+        phase = run_report.StartPhase('materialize', table.file_name)
 
-    TODO(yolken): Cache results for better performance.
+      if table.spill_file_path:
+        archive.WriteFile(table.file_name, table.spill_file_path)
+      else:
+        archive.WriteRows(table.file_name, table.IterRows())
+
+      if run_report:
+        phase.Finish(bytes_out=archive.GetEntrySize(table.file_name),
+                     spilled=bool(table.spill_file_path))
+
+    if self.verbose:
+      print 'Archiving file: dataset.xml'
+
+    if run_report:
+      phase = run_report.StartPhase('materialize', 'dataset.xml')
+
+    xml_entry = archive.OpenEntry('dataset.xml')
+    self.WriteXML(xml_entry)
+    xml_entry.close()
+
+    if run_report:
+      phase.Finish(bytes_out=archive.GetEntrySize('dataset.xml'))
+
+    archive.Close()
+
+  def _RootAttributes(self):
+    """Get the attributes of the root dspl element.
 
     Returns:
-      An ElementTree Element.
+      A dictionary of attribute names to values
     """
-    root_element = xml.etree.ElementTree.Element('dspl')
+    root_attributes = {'xmlns': 'http://schemas.google.com/dspl/2010'}
 
     if self.namespace:
-      root_element.set('targetNamespace', self.namespace)
-
-    # Add namespace and imports
-    root_element.set('xmlns',
-                     'http://schemas.google.com/dspl/2010')
+      root_attributes['targetNamespace'] = self.namespace
 
     for import_obj in self.imports:
-      root_element.set('xmlns:%s' % import_obj.namespace_id,
-                       import_obj.namespace_url)
-      root_element.append(import_obj.ToXMLElement())
+      root_attributes['xmlns:%s' % import_obj.namespace_id] = (
+          import_obj.namespace_url)
 
-    # Basic dataset information
+    return root_attributes
+
+  def _InfoXMLElement(self):
+    """Get the ElementTree representation of the basic dataset information.
+
+    Returns:
+      An ElementTree Element.
+    """
     dataset_info = xml.etree.ElementTree.Element('info')
 
     dataset_name = xml.etree.ElementTree.Element('name')
@@ -239,9 +677,14 @@ class DataSet(object):
         _ValueOrPlaceHolder(self.url, 'DATASET URL'))
     dataset_info.append(dataset_url)
 
-    root_element.append(dataset_info)
+    return dataset_info
 
-    # Provider information
+  def _ProviderXMLElement(self):
+    """Get the ElementTree representation of the provider information.
+
+    Returns:
+      An ElementTree Element.
+    """
     provider_info = xml.etree.ElementTree.Element('provider')
 
     provider_name = xml.etree.ElementTree.Element('name')
@@ -254,7 +697,53 @@ class DataSet(object):
         _ValueOrPlaceHolder(self.provider_url, 'PROVIDER URL'))
     provider_info.append(provider_url)
 
-    root_element.append(provider_info)
+    return provider_info
+
+  def XMLCacheKey(self):
+    """Get a summary of the fields that the dataset XML is built from.
+
+    Returns:
+      A tuple that changes whenever the dataset XML would
+    """
+    return (tuple(sorted(self._RootAttributes().items())),
+            tuple(import_obj.namespace_url for import_obj in self.imports),
+            self.name, self.description, self.url,
+            self.provider_name, self.provider_url,
+            tuple(topic.XMLCacheKey() for topic in self.topics),
+            tuple(concept.XMLCacheKey() for concept in self.concepts
+                  if not concept.concept_reference),
+            tuple(data_slice.XMLCacheKey() for data_slice in self.slices),
+            tuple(table.XMLCacheKey() for table in self.tables))
+
+  def ToXMLElement(self):
+    """Convert object to its ElementTree XML representation.
+
+    Recursively calls the ToXMLElement method for all of its concept, slice,
+    and table children. The result is cached until the dataset or one of its
+    children changes, and then only the changed children are rebuilt.
+
+    Returns:
+      An ElementTree Element.
+    """
+    return _CachedValue(self, '_xml_element_cache', self.XMLCacheKey(),
+                        self._BuildXMLElement)
+
+  def _BuildXMLElement(self):
+    """Build the ElementTree XML representation of the dataset.
+
+    Returns:
+      An ElementTree Element.
+    """
+    root_element = xml.etree.ElementTree.Element('dspl')
+
+    for attribute_name, attribute_value in self._RootAttributes().items():
+      root_element.set(attribute_name, attribute_value)
+
+    for import_obj in self.imports:
+      root_element.append(import_obj.ToXMLElement())
+
+    root_element.append(self._InfoXMLElement())
+    root_element.append(self._ProviderXMLElement())
 
     # Add topic info
     if self.topics:
@@ -292,19 +781,71 @@ class DataSet(object):
 
     return root_element
 
+  def WriteXML(self, output_file):
+    """Write the dataset XML, with two-space indents, to a file object.
+
+    Unlike ToXMLElement, this never holds the XML for the entire dataset in
+    memory; each import, topic, concept, slice, and table is converted and
+    written on its own.
+
+    If the dataset hasn't changed since it was last converted to a string, the
+    string is written out again instead.
+
+    Args:
+      output_file: A file-like object to write the XML to
+    """
+    cache = getattr(self, '_xml_string_cache', None)
+
+    if cache is not None and cache[0] == self.XMLCacheKey():
+      output_file.write(cache[1])
+      return
+
+    writer = dspl_xml_writer.XMLWriter(output_file)
+    writer.WriteDeclaration()
+    writer.StartElement('dspl', self._RootAttributes())
+
+    for import_obj in self.imports:
+      writer.WriteElement(import_obj.ToXMLElement())
+
+    writer.WriteElement(self._InfoXMLElement())
+    writer.WriteElement(self._ProviderXMLElement())
+
+    if self.topics:
+      writer.WriteElements(
+          'topics', (topic.ToXMLElement() for topic in self.topics))
+
+    writer.WriteElements(
+        'concepts', (concept.ToXMLElement() for concept in self.concepts
+                     if not concept.concept_reference))
+    writer.WriteElements(
+        'slices',
+        (data_slice.ToXMLElement(self) for data_slice in self.slices))
+    writer.WriteElements(
+        'tables', (table.ToXMLElement() for table in self.tables))
+
+    writer.EndElement()
+
+  def _BuildXMLString(self):
+    """Write the dataset XML to a string.
+
+    Returns:
+      A string of the dataset XML
+    """
+    output_file = StringIO.StringIO()
+    self.WriteXML(output_file)
+
+    return output_file.getvalue()
+
   def __str__(self):
     """Make a 'pretty' version of the dataset XML, with two-space indents.
 
-    TODO(yolken): Cache results for better performance.
+    The result is cached until the dataset or one of its children changes.
 
     Returns:
       A string of the dataset XML
     """
-    result = xml.dom.minidom.parseString(
-        xml.etree.ElementTree.tostring(
-            self.ToXMLElement(), encoding='utf-8')).toprettyxml(indent='  ')
-
-    return result
+    return _CachedValue(self, '_xml_string_cache', self.XMLCacheKey(),
+                        self._BuildXMLString)
 
 
 class Import(object):
@@ -332,9 +873,11 @@ class Import(object):
     return import_element
 
 
-class Topic(object):
+class Topic(_CompactObject):
   """Representation of a DSPL topic."""
 
+  __slots__ = ('topic_id', 'topic_name', '_children', '_xml_element_cache')
+
   def __init__(self, topic_id='', topic_name='', children=()):
     """Create a new Topic object.
 
@@ -347,9 +890,40 @@ class Topic(object):
     self.topic_name = topic_name
     self.children = children
 
+  def _GetChildren(self):
+    return self._children
+
+  def _SetChildren(self, children):
+    # Replacing the children changes the topic tree as much as changing the
+    # list of them does
+    self._children = _TopicList(children)
+    self._children._Invalidate()
+
+  children = property(_GetChildren, _SetChildren)
+
+  def XMLCacheKey(self):
+    """Get a summary of the fields that the topic XML is built from.
+
+    Returns:
+      A tuple that changes whenever the topic XML would
+    """
+    return (self.topic_id, self.topic_name,
+            tuple(child_topic.XMLCacheKey() for child_topic in self.children))
+
   def ToXMLElement(self):
     """Convert object to its ElementTree XML representation.
 
+    The result is cached until the topic or one of its children changes.
+
+    Returns:
+      An ElementTree Element.
+    """
+    return _CachedValue(self, '_xml_element_cache', self.XMLCacheKey(),
+                        self._BuildXMLElement)
+
+  def _BuildXMLElement(self):
+    """Build the ElementTree XML representation of the topic.
+
     Returns:
       An ElementTree Element.
     """
@@ -372,9 +946,14 @@ class Topic(object):
     return topic_element
 
 
-class Concept(object):
+class Concept(_CompactObject):
   """Representation of a DSPL concept."""
 
+  __slots__ = ('concept_id', 'concept_name', 'concept_description',
+               'data_type', 'table_ref', 'concept_reference',
+               'concept_extension_reference', 'topic_references', 'attributes',
+               'properties', '_xml_element_cache')
+
   def __init__(self, concept_id='', concept_name='', concept_description='',
                data_type='', table_ref='', concept_reference='',
                concept_extension_reference='', topic_references=(),
@@ -406,9 +985,34 @@ class Concept(object):
     self.attributes = list(attributes)
     self.properties = list(properties)
 
+  def XMLCacheKey(self):
+    """Get a summary of the fields that the concept XML is built from.
+
+    Returns:
+      A tuple that changes whenever the concept XML would
+    """
+    return (self.concept_id, self.concept_name, self.concept_description,
+            self.data_type, self.table_ref, self.concept_extension_reference,
+            tuple(self.topic_references),
+            tuple((concept_attribute.concept_ref, concept_attribute.value)
+                  for concept_attribute in self.attributes),
+            tuple((concept_property.concept_ref, concept_property.is_parent)
+                  for concept_property in self.properties))
+
   def ToXMLElement(self):
     """Convert object to its ElementTree XML representation.
 
+    The result is cached until one of the concept fields changes.
+
+    Returns:
+      An ElementTree Element.
+    """
+    return _CachedValue(self, '_xml_element_cache', self.XMLCacheKey(),
+                        self._BuildXMLElement)
+
+  def _BuildXMLElement(self):
+    """Build the ElementTree XML representation of the concept.
+
     Returns:
       An ElementTree Element.
     """
@@ -460,13 +1064,15 @@ class Concept(object):
     return concept_element
 
 
-class Attribute(object):
+class Attribute(_CompactObject):
   """Representation of a simple DSPL concept attribute.
 
   For now, this representation is limited to attributes with just a concept
   reference and value.
   """
 
+  __slots__ = ('concept_ref', 'value')
+
   def __init__(self, concept_ref='', value=''):
     """Create a new Attribute instance.
 
@@ -495,13 +1101,15 @@ class Attribute(object):
     return attribute_element
 
 
-class Property(object):
+class Property(_CompactObject):
   """Representation of a simple DSPL concept property.
 
   For now, this representation is limited to properties with just a concept
   reference and (optional) isParent attribute.
   """
 
+  __slots__ = ('concept_ref', 'is_parent')
+
   def __init__(self, concept_ref='', is_parent=False):
     """Create a new Property instance.
 
@@ -528,9 +1136,12 @@ class Property(object):
     return property_element
 
 
-class Slice(object):
+class Slice(_CompactObject):
   """Representation of a DSPL slice."""
 
+  __slots__ = ('slice_id', 'dimension_refs', 'metric_refs', 'dimension_map',
+               'metric_map', 'table_ref', '_xml_element_cache')
+
   def __init__(self, slice_id='', dimension_refs=(), metric_refs=(),
                dimension_map=(), metric_map=(), table_ref=''):
     """Create a new Slice object.
@@ -550,9 +1161,33 @@ class Slice(object):
     self.metric_map = dict(metric_map)
     self.table_ref = table_ref
 
+  def XMLCacheKey(self):
+    """Get a summary of the fields that the slice XML is built from.
+
+    Returns:
+      A tuple that changes whenever the slice XML would
+    """
+    return (self.slice_id, tuple(self.dimension_refs), tuple(self.metric_refs),
+            tuple(sorted(self.dimension_map.items())),
+            tuple(sorted(self.metric_map.items())), self.table_ref)
+
   def ToXMLElement(self, dataset):
     """Convert object to its ElementTree XML representation.
 
+    The result is cached until one of the slice fields changes.
+
+    Args:
+      dataset: DataSet object that this slice belongs to.
+
+    Returns:
+      An ElementTree Element.
+    """
+    return _CachedValue(self, '_xml_element_cache', self.XMLCacheKey(),
+                        lambda: self._BuildXMLElement(dataset))
+
+  def _BuildXMLElement(self, dataset):
+    """Build the ElementTree XML representation of the slice.
+
     Args:
       dataset: DataSet object that this slice belongs to.
 
@@ -610,9 +1245,11 @@ class Slice(object):
     return slice_element
 
 
-class TableColumn(object):
+class TableColumn(_CompactObject):
   """A column in a DSPL table."""
 
+  __slots__ = ('column_id', 'data_type', 'data_format', 'constant_value')
+
   def __init__(self, column_id='', data_type='', data_format='',
                constant_value=''):
     """Create a new TableColumn object.
@@ -650,7 +1287,12 @@ class TableColumn(object):
 
 
 class Table(object):
-  """Representation of a DSPL table."""
+  """Representation of a DSPL table.
+
+  The table data are either held as a list of rows, with the header first, or,
+  after CompactData, as a dspl_columns.ColumnarData object. Either way, they
+  can be read with IterRows.
+  """
 
   def __init__(self, table_id='', columns=(),
                file_name='', table_data=(), verbose=True):
@@ -669,24 +1311,270 @@ class Table(object):
     self.table_data = list(table_data)
     self.verbose = verbose
 
-  def MaterializeData(self, output_path):
-    """Write table data to CSV, using argument path."""
-    output_file_name = os.path.join(output_path, self.file_name)
+    # Path of the CSV file holding the table data, if it has been spilled
+    self.spill_file_path = None
+
+    # Whether the table data have been written to an archive and released
+    self.archived = False
+
+  def _GetTableData(self):
+    """Get the table data as a list of rows, with the header first.
+
+    If the data are held in columns, they are converted back to a list of rows
+    first, which the table keeps, so that changes to the list take effect.
+    """
+    if self.columnar_data is not None:
+      self._table_data = [self.columnar_data.header]
+      self._table_data.extend(self.columnar_data)
+      self.columnar_data = None
+
+    return self._table_data
+
+  def _SetTableData(self, table_data):
+    self._table_data = table_data
+    self.columnar_data = None
+
+  table_data = property(_GetTableData, _SetTableData)
 
+  def CompactData(self, rows=None):
+    """Store the table data as typed columns, instead of as a list of rows.
+
+    Integer and float columns are stored as arrays and the others as indices
+    into lists of distinct values. The rows read back by IterRows are equal to
+    those stored. Tables whose rows don't all have the same length as the
+    header are kept as lists of rows.
+
+    Args:
+      rows: Iterable of rows, with the header first, to store in place of the
+            current table data, or None to compact the current table data
+
+    Returns:
+      True if the data are now held in columns, or False otherwise
+    """
+    if rows is None:
+      rows = self.table_data
+
+    row_iterator = iter(rows)
+    header = next(row_iterator, None)
+
+    if header is None:
+      self.table_data = []
+      return False
+
+    data_types = dict((column.column_id, column.data_type)
+                      for column in self.columns)
+    columnar_data = dspl_columns.ColumnarData(
+        header, [data_types.get(column_id, 'string') for column_id in header])
+
+    for row in row_iterator:
+      if len(row) != len(header):
+        self.table_data = [header]
+        self.table_data.extend(columnar_data)
+        self.table_data.append(row)
+        self.table_data.extend(row_iterator)
+        return False
+
+      columnar_data.AppendRow(row)
+
+    columnar_data.Finish()
+    self.table_data = []
+    self.columnar_data = columnar_data
+
+    return True
+
+  def _WriteData(self, output_file_name, key_columns=(), group_columns=(),
+                 write_statistics=False):
+    """Write the in-memory table data to a CSV file.
+
+    If write_statistics is set, the statistics of the data are collected as
+    they are written, and written to a sidecar file next to the CSV file; see
+    dspl_statistics. Otherwise, any old sidecar file is removed.
+
+    Args:
+      output_file_name: Path of the CSV file to write
+      key_columns: Sequence of IDs of the columns that identify each row
+      group_columns: Sequence of IDs of the columns that rows should be grouped
+                     by
+      write_statistics: Whether to write the statistics of the data
+    """
     if self.verbose:
       print 'Writing file: %s' % output_file_name
 
-    csv_output_file = open(output_file_name, 'wb')
-    csv_writer = csv.writer(csv_output_file)
+    rows = self.IterRows()
+
+    if write_statistics:
+      statistics_collector = dspl_statistics.StatisticsCollector(
+          dict((column.column_id, column.data_type)
+               for column in self.columns),
+          key_columns, group_columns)
+      rows = statistics_collector.Collect(rows)
 
-    for row in self.table_data:
-      csv_writer.writerow(row)
+    csv_output_file = open(output_file_name, 'wb', _WRITE_BUFFER_SIZE)
 
-    csv_output_file.close()
+    try:
+      csv_writer = csv.writer(csv_output_file)
+      csv_writer.writerows(rows)
+    finally:
+      csv_output_file.close()
+
+    if write_statistics:
+      dspl_statistics.WriteStatistics(
+          statistics_collector.GetStatistics(), output_file_name)
+    else:
+      dspl_statistics.RemoveStatistics(output_file_name)
+
+  def SpillData(self, file_path, key_columns=(), group_columns=(),
+                write_statistics=False):
+    """Write the table data to a CSV file and release it from memory.
+
+    Afterwards, the table data are read back from the file by IterRows and
+    copied from it by MaterializeData. Writing to the table's final location
+    means that MaterializeData has nothing left to do.
+
+    Args:
+      file_path: Path of the CSV file to write
+      key_columns: Sequence of IDs of the columns that identify each row, for
+                   the statistics of the data
+      group_columns: Sequence of IDs of the columns that rows should be grouped
+                     by, for the statistics of the data
+      write_statistics: Whether to write the statistics of the data to a
+                        sidecar file
+    """
+    self._WriteData(file_path, key_columns, group_columns, write_statistics)
+    self.spill_file_path = file_path
+    self.table_data = []
+
+  def ArchiveData(self, archive):
+    """Write the table data into a dataset archive and release it from memory.
+
+    Archives can't be read back while they are being written, so afterwards the
+    table data are no longer available, and DataSet.MaterializeArchive leaves
+    the table's entry as it is.
+
+    Args:
+      archive: A dspl_archive.DatasetArchive object
+    """
+    if self.verbose:
+      print 'Archiving file: %s' % self.file_name
+
+    archive.WriteRows(self.file_name, self.IterRows())
+    self.spill_file_path = None
+    self.table_data = []
+    self.archived = True
+
+  def IterRows(self):
+    """Iterate over the rows of the table, including the header row.
+
+    Yields:
+      A sequence of values for each row; values from spilled tables are strings
+
+    Raises:
+      DSPLModelError: If the table data have been archived
+    """
+    if self.archived:
+      raise DSPLModelError(
+          'Data of table %s were written to an archive and are no longer '
+          'available' % self.table_id)
+
+    if self.spill_file_path:
+      csv_file = open(self.spill_file_path, 'rb')
+
+      try:
+        for row in csv.reader(csv_file):
+          yield row
+      finally:
+        csv_file.close()
+    elif self.columnar_data is not None:
+      yield self.columnar_data.header
+
+      for row in self.columnar_data:
+        yield row
+    elif self._table_data:
+      for row in self._table_data:
+        yield row
+
+  def MaterializeData(self, output_path, key_columns=(), group_columns=(),
+                      write_statistics=False):
+    """Write table data to CSV, using argument path.
+
+    If write_statistics is set, the statistics of the data are written to a
+    sidecar file next to the CSV file. Those of spilled tables are copied
+    along with their files.
+
+    Args:
+      output_path: Directory to write the CSV file to
+      key_columns: Sequence of IDs of the columns that identify each row, for
+                   the statistics of the data
+      group_columns: Sequence of IDs of the columns that rows should be grouped
+                     by, for the statistics of the data
+      write_statistics: Whether to write the statistics of the data to a
+                        sidecar file
+
+    Raises:
+      DSPLModelError: If the table data have been archived
+    """
+    if self.archived:
+      raise DSPLModelError(
+          'Data of table %s were written to an archive and are no longer '
+          'available' % self.table_id)
+
+    output_file_name = os.path.join(output_path, self.file_name)
+
+    if self.spill_file_path:
+      if (os.path.abspath(self.spill_file_path) !=
+          os.path.abspath(output_file_name)):
+        if self.verbose:
+          print 'Copying file: %s' % output_file_name
+
+        spill_file = open(self.spill_file_path, 'rb')
+        csv_output_file = open(output_file_name, 'wb')
+
+        try:
+          shutil.copyfileobj(spill_file, csv_output_file, _WRITE_BUFFER_SIZE)
+        finally:
+          csv_output_file.close()
+          spill_file.close()
+
+        if write_statistics:
+          statistics = dspl_statistics.ReadStatistics(self.spill_file_path)
+        else:
+          statistics = None
+
+        if statistics is not None:
+          dspl_statistics.WriteStatistics(statistics, output_file_name)
+        else:
+          dspl_statistics.RemoveStatistics(output_file_name)
+    else:
+      self._WriteData(
+          output_file_name, key_columns, group_columns, write_statistics)
+
+  def XMLCacheKey(self):
+    """Get a summary of the fields that the table XML is built from.
+
+    The table data aren't part of the XML, so changing them doesn't change the
+    key.
+
+    Returns:
+      A tuple that changes whenever the table XML would
+    """
+    return (self.table_id, self.file_name,
+            tuple((column.column_id, column.data_type, column.data_format,
+                   column.constant_value) for column in self.columns))
 
   def ToXMLElement(self):
     """Convert object to its ElementTree XML representation.
 
+    The result is cached until the table or one of its columns changes.
+
+    Returns:
+      An ElementTree Element.
+    """
+    return _CachedValue(self, '_xml_element_cache', self.XMLCacheKey(),
+                        self._BuildXMLElement)
+
+  def _BuildXMLElement(self):
+    """Build the ElementTree XML representation of the table.
+
     Returns:
       An ElementTree Element.
     """
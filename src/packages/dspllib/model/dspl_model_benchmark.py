@@ -0,0 +1,185 @@
+#!/usr/bin/python2.4
+#
+# Copyright 2011, Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Measure the memory used by each kind of compact DSPL model object.
+
+Each model class that uses __slots__ is compared with an otherwise identical
+class that keeps its fields in a per-instance dictionary, as the model classes
+used to. Run this module as a script to print the comparison, e.g.:
+
+  python dspl_model_benchmark.py --num_objects=100000
+"""
+
+
+__author__ = 'Benjamin Yolken <yolken@google.com>'
+
+import gc
+import optparse
+import sys
+
+import dspl_model
+from dspllib import memory
+
+
+# Functions creating a typical object of each benchmarked class
+_OBJECT_FACTORIES = [
+    (dspl_model.Topic,
+     lambda cls: cls(topic_id='topic', topic_name='Topic')),
+    (dspl_model.Concept,
+     lambda cls: cls(concept_id='concept', concept_name='Concept',
+                     data_type='string', table_ref='concept_table')),
+    (dspl_model.Attribute,
+     lambda cls: cls(concept_ref='concept', value='value')),
+    (dspl_model.Property,
+     lambda cls: cls(concept_ref='concept', is_parent=True)),
+    (dspl_model.Slice,
+     lambda cls: cls(slice_id='slice', dimension_refs=['concept', 'year'],
+                     metric_refs=['population'], table_ref='slice_table')),
+    (dspl_model.TableColumn,
+     lambda cls: cls(column_id='column', data_type='integer'))]
+
+
+def MakeDictClass(cls):
+  """Make a version of a slotted class that stores its fields in a __dict__.
+
+  Args:
+    cls: A class defining __slots__
+
+  Returns:
+    A new class with the same methods as the argument one
+  """
+  namespace = {}
+
+  for base_class in reversed(cls.__mro__[:-1]):
+    slots = getattr(base_class, '__slots__', ())
+
+    for name, value in vars(base_class).items():
+      if name not in slots and name not in ('__slots__', '__dict__',
+                                            '__weakref__'):
+        namespace[name] = value
+
+  return type(cls.__name__, (object,), namespace)
+
+
+def GetObjectSize(model_object):
+  """Get the bytes taken by an object itself, including any __dict__.
+
+  Field values aren't counted, since they are the same whichever way the
+  object stores them.
+
+  Args:
+    model_object: Object to measure
+
+  Returns:
+    Number of bytes
+  """
+  object_size = sys.getsizeof(model_object)
+
+  if hasattr(model_object, '__dict__'):
+    object_size += sys.getsizeof(model_object.__dict__)
+
+  return object_size
+
+
+def _MeasureAllocation(cls, factory, num_objects):
+  """Measure the process memory taken by many objects of a class.
+
+  Args:
+    cls: Class to create objects of
+    factory: Function taking the class and returning a new object
+    num_objects: Number of objects to create
+
+  Returns:
+    Average number of bytes of process memory per object
+  """
+  gc.collect()
+  memory_before = memory.GetMemoryUsed()
+  objects = [factory(cls) for _ in xrange(num_objects)]
+  memory_after = memory.GetMemoryUsed()
+  del objects
+
+  return float(memory_after - memory_before) / num_objects
+
+
+def RunBenchmark(num_objects=0):
+  """Compare the memory used by slotted and dictionary-based model objects.
+
+  Args:
+    num_objects: Number of objects of each class to create when measuring
+                 process memory, or 0 to only measure object sizes
+
+  Returns:
+    List of (class name, bytes with __dict__, bytes with __slots__) tuples,
+    one for each benchmarked class
+  """
+  results = []
+
+  for cls, factory in _OBJECT_FACTORIES:
+    dict_class = MakeDictClass(cls)
+
+    if num_objects:
+      dict_bytes = _MeasureAllocation(dict_class, factory, num_objects)
+      slot_bytes = _MeasureAllocation(cls, factory, num_objects)
+    else:
+      dict_bytes = GetObjectSize(factory(dict_class))
+      slot_bytes = GetObjectSize(factory(cls))
+
+    results.append((cls.__name__, dict_bytes, slot_bytes))
+
+  return results
+
+
+def main(argv):
+  """Parse command-line flags and print the benchmark results.
+
+  Args:
+    argv: The program argument vector (excluding the script name)
+  """
+  parser = optparse.OptionParser(usage='%prog [options]')
+  parser.add_option('-n', '--num_objects', dest='num_objects', type='int',
+                    default=0,
+                    help=('Number of objects of each class to create to '
+                          'measure process memory; if 0, only object sizes '
+                          'are measured (default: 0)'))
+  (options, unused_args) = parser.parse_args(argv)
+
+  print '%-12s %12s %12s %8s' % ('Class', '__dict__', '__slots__', 'Saved')
+
+  for (class_name, dict_bytes, slot_bytes) in RunBenchmark(
+      options.num_objects):
+    print '%-12s %12.1f %12.1f %7.0f%%' % (
+        class_name, dict_bytes, slot_bytes,
+        100.0 * (dict_bytes - slot_bytes) / dict_bytes)
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -0,0 +1,69 @@
+#!/usr/bin/python2.4
+#
+# Copyright 2011, Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Tests of dspl_model_benchmark module."""
+
+
+__author__ = 'Benjamin Yolken <yolken@google.com>'
+
+import unittest
+
+import dspl_model
+import dspl_model_benchmark
+
+
+class DSPLModelBenchmarkTests(unittest.TestCase):
+  """Test cases for dspl_model_benchmark module."""
+
+  def testMakeDictClass(self):
+    """Test that dictionary versions of classes behave like the originals."""
+    dict_class = dspl_model_benchmark.MakeDictClass(dspl_model.TableColumn)
+    column = dict_class(column_id='column', data_type='integer')
+
+    self.assertEqual(column.__dict__['column_id'], 'column')
+    self.assertEqual(column.ToXMLElement().get('type'), 'integer')
+
+  def testRunBenchmark(self):
+    """Test that slotted objects are smaller than dictionary-based ones."""
+    results = dspl_model_benchmark.RunBenchmark()
+
+    self.assertEqual(
+        [class_name for (class_name, unused_dict_bytes, unused_slot_bytes)
+         in results],
+        ['Topic', 'Concept', 'Attribute', 'Property', 'Slice', 'TableColumn'])
+
+    for (unused_class_name, dict_bytes, slot_bytes) in results:
+      self.assertTrue(slot_bytes < dict_bytes)
+
+
+if __name__ == '__main__':
+  unittest.main()
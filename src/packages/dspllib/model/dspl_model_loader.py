@@ -39,6 +39,7 @@ import os.path
 import xml.etree.ElementTree
 
 import dspl_model
+import dspl_statistics
 
 _DSPL_SCHEMA_PREFIX = '{http://schemas.google.com/dspl/2010}'
 
@@ -102,7 +103,7 @@ def _ReadCSVData(csv_file_path, load_all_data, strip_whitespace=True):
                       each value
 
   Returns:
-    List of lists, representing rows and row elements of CSV
+    Iterator over lists, representing rows and row elements of CSV
 
   Raises:
     DSPLModelLoaderError: If file can't be read
@@ -112,34 +113,34 @@ def _ReadCSVData(csv_file_path, load_all_data, strip_whitespace=True):
   except IOError as io_error:
     raise DSPLModelLoaderError(str(io_error))
 
-  csv_reader = csv.reader(csv_file)
+  return _IterCSVRows(csv_file, load_all_data, strip_whitespace)
 
-  data_rows = []
 
-  if load_all_data:
-    for row in csv_reader:
-      if strip_whitespace:
-        cleaned_row = [r.strip() for r in row]
-      else:
-        cleaned_row = row
+def _IterCSVRows(csv_file, load_all_data, strip_whitespace):
+  """Iterate over the rows of an open CSV file, closing it at the end.
+
+  Args:
+    csv_file: CSV file object
+    load_all_data: Boolean indicating whether all CSV data should be loaded;
+                   if False, only the first two rows are read
+    strip_whitespace: Boolean indicating whether to strip whitespace around
+                      each value
 
-      data_rows.append(cleaned_row)
-  else:
-    # Read the first two rows only
-    for r, row in enumerate(csv_reader):
-      if r > 1:
+  Yields:
+    A list of values for each row
+  """
+  try:
+    for r, row in enumerate(csv.reader(csv_file)):
+      # Read the first two rows only, unless loading all data
+      if r > 1 and not load_all_data:
         break
 
       if strip_whitespace:
-        cleaned_row = [r.strip() for r in row]
+        yield [value.strip() for value in row]
       else:
-        cleaned_row = row
-
-      data_rows.append(cleaned_row)
-
-  csv_file.close()
-
-  return data_rows
+        yield row
+  finally:
+    csv_file.close()
 
 
 def ElementToTopic(topic_element):
@@ -380,7 +381,8 @@ def ElementToSlice(slice_element, dspl_dataset):
   return dspl_slice
 
 
-def ElementToTable(table_element, csv_path, load_all_data):
+def ElementToTable(table_element, csv_path, load_all_data,
+                   use_statistics=False):
   """Convert an ElementTree table element into a Table object.
 
   Args:
@@ -389,6 +391,9 @@ def ElementToTable(table_element, csv_path, load_all_data):
     csv_path: Path to directory where CSV file associated with this table can
               be found
     load_all_data: Boolean indicating whether all CSV data should be loaded
+    use_statistics: Boolean indicating whether to leave the data of CSV files
+                    with up-to-date statistics (see dspl_statistics) in their
+                    files, to be read only if they are needed
 
   Returns:
     dspl_model.Table object
@@ -431,12 +436,21 @@ def ElementToTable(table_element, csv_path, load_all_data):
         csv_path,
         dspl_table.file_name)
 
-    dspl_table.table_data = _ReadCSVData(csv_file_path, load_all_data)
+    if (use_statistics and load_all_data and
+        dspl_statistics.ReadStatistics(csv_file_path) is not None):
+      # Checks that can trust the statistics don't need the data, so they're
+      # only read from the file by IterRows, if at all
+      dspl_table.spill_file_path = csv_file_path
+    else:
+      # Loaded values are stored in typed columns, which take far less memory
+      # than lists of strings
+      dspl_table.CompactData(_ReadCSVData(csv_file_path, load_all_data))
 
   return dspl_table
 
 
-def ElementTreeToDataset(element_tree, namespaces, csv_path, load_all_data):
+def ElementTreeToDataset(element_tree, namespaces, csv_path, load_all_data,
+                         use_statistics=False):
   """Convert an ElementTree tree model into a DataSet object.
 
   Args:
@@ -445,6 +459,9 @@ def ElementTreeToDataset(element_tree, namespaces, csv_path, load_all_data):
     namespaces: A list of (namespace_id, namespace_url) tuples
     csv_path: Directory where CSV files associated with dataset can be found
     load_all_data: Boolean indicating whether all CSV data should be loaded
+    use_statistics: Boolean indicating whether to leave the data of CSV files
+                    with up-to-date statistics in their files; see
+                    ElementToTable
 
   Returns:
     dspl_model.DataSet object
@@ -514,17 +531,21 @@ def ElementTreeToDataset(element_tree, namespaces, csv_path, load_all_data):
 
     for table_element in table_elements:
       dspl_dataset.AddTable(
-          ElementToTable(table_element, csv_path, load_all_data))
+          ElementToTable(table_element, csv_path, load_all_data,
+                         use_statistics))
 
   return dspl_dataset
 
 
-def LoadDSPLFromFiles(xml_file_path, load_all_data=True):
+def LoadDSPLFromFiles(xml_file_path, load_all_data=True, use_statistics=False):
   """Create a fully populated DSPL DataSet given the argument XML path.
 
   Args:
     xml_file_path: Path to a DSPL XML file
     load_all_data: Boolean indicating whether all CSV data should be loaded
+    use_statistics: Boolean indicating whether to leave the data of CSV files
+                    with up-to-date statistics in their files; see
+                    ElementToTable
 
   Returns:
     dspl_model.DataSet object
@@ -535,4 +556,5 @@ def LoadDSPLFromFiles(xml_file_path, load_all_data=True):
   xml_file.close()
 
   return ElementTreeToDataset(
-      xml_model, namespaces, os.path.split(xml_file_path)[0], load_all_data)
+      xml_model, namespaces, os.path.split(xml_file_path)[0], load_all_data,
+      use_statistics)
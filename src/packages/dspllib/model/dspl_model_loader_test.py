@@ -40,6 +40,7 @@ import shutil
 import tempfile
 import unittest
 
+import dspl_model
 import dspl_model_loader
 import dspl_model_test
 
@@ -190,6 +191,32 @@ class DSPLModelLoaderTests(unittest.TestCase):
 
     self.assertEqual(dspl_dataset.tables[0].table_data, expected_table_data)
 
+  def testLoadedSliceChanges(self):
+    """Test that in-place changes to loaded slices rebuild their XML."""
+    dspl_dataset = dspl_model_loader.LoadDSPLFromFiles(self.xml_file_path)
+    data_slice = dspl_dataset.GetSlice('data_slice')
+    slice_element = data_slice.ToXMLElement(dspl_dataset)
+
+    self.assertEqual(
+        [e.get('concept') for e in slice_element.findall('dimension')],
+        ['concept1', 'geo:country'])
+
+    data_slice.dimension_refs.remove('geo:country')
+    slice_element = data_slice.ToXMLElement(dspl_dataset)
+
+    self.assertEqual(
+        [e.get('concept') for e in slice_element.findall('dimension')],
+        ['concept1'])
+
+    # The cache key doesn't depend on the type of sequence the refs are in
+    self.assertEqual(
+        data_slice.XMLCacheKey(),
+        dspl_model.Slice(
+            slice_id='data_slice', dimension_refs=('concept1',),
+            metric_refs=('concept2',), dimension_map=data_slice.dimension_map,
+            metric_map=data_slice.metric_map,
+            table_ref='table3').XMLCacheKey())
+
   def testBadFileReference(self):
     """Test case in which CSV file does not exist."""
     os.remove(os.path.join(self.input_dir, 'mydata.csv'))
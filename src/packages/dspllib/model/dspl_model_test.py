@@ -37,12 +37,19 @@ __author__ = 'Benjamin Yolken <yolken@google.com>'
 import csv
 import itertools
 import os
+import pickle
 import re
+import shutil
+import StringIO
 import tempfile
 import unittest
 import xml.etree.ElementTree
+import zipfile
 
+import dspl_archive
 import dspl_model
+import dspl_statistics
+from dspllib import reporting
 
 
 TEST_DSPL_XML = """
@@ -199,6 +206,69 @@ class DSPLModelTests(unittest.TestCase):
     self.assertEqual(self.dspl_dataset.GetSlice('slice3'), None)
     self.assertEqual(self.dspl_dataset.GetTable('table3'), None)
 
+  def testIndexedGetters(self):
+    """Test that getters follow direct changes to the dataset's lists."""
+    concept1 = dspl_model.Concept(concept_id='concept1')
+    concept2 = dspl_model.Concept(concept_id='concept2')
+
+    self.dspl_dataset.AddConcept(concept1)
+    self.assertEqual(self.dspl_dataset.GetConcept('concept1'), concept1)
+
+    # Appending to and removing from the list directly
+    self.dspl_dataset.concepts.append(concept2)
+    self.assertEqual(self.dspl_dataset.GetConcept('concept2'), concept2)
+
+    self.dspl_dataset.concepts.remove(concept1)
+    self.assertEqual(self.dspl_dataset.GetConcept('concept1'), None)
+
+    # Replacing the list and its contents
+    self.dspl_dataset.concepts = [concept1]
+    self.assertEqual(self.dspl_dataset.GetConcept('concept1'), concept1)
+    self.assertEqual(self.dspl_dataset.GetConcept('concept2'), None)
+
+    self.dspl_dataset.concepts[0:1] = [concept2]
+    self.assertEqual(self.dspl_dataset.GetConcept('concept1'), None)
+    self.assertEqual(self.dspl_dataset.GetConcept('concept2'), concept2)
+
+    # The first object with an ID is found, as with a linear search
+    duplicate_concept = dspl_model.Concept(concept_id='concept2')
+    self.dspl_dataset.AddConcept(duplicate_concept)
+    self.assertEqual(self.dspl_dataset.GetConcept('concept2'), concept2)
+
+    del self.dspl_dataset.concepts[0]
+    self.assertEqual(self.dspl_dataset.GetConcept('concept2'),
+                     duplicate_concept)
+
+    # Changing the ID of an object that is already indexed
+    duplicate_concept.concept_id = 'concept3'
+    self.assertEqual(self.dspl_dataset.GetConcept('concept3'),
+                     duplicate_concept)
+    self.assertEqual(self.dspl_dataset.GetConcept('concept2'), None)
+
+    # Topics added as children of other topics
+    topic1 = dspl_model.Topic(topic_id='topic1', children=[])
+    self.dspl_dataset.AddTopic(topic1)
+    self.assertEqual(self.dspl_dataset.GetTopic('topic2'), None)
+
+    topic2 = dspl_model.Topic(topic_id='topic2')
+    topic1.children.append(topic2)
+    self.assertEqual(self.dspl_dataset.GetTopic('topic2'), topic2)
+
+    # Removing topics and changing their IDs directly
+    topic2.topic_id = 'topic3'
+    self.assertEqual(self.dspl_dataset.GetTopic('topic3'), topic2)
+    self.assertEqual(self.dspl_dataset.GetTopic('topic2'), None)
+
+    topic1.children.remove(topic2)
+    self.assertEqual(self.dspl_dataset.GetTopic('topic3'), None)
+
+    topic1.children = [topic2]
+    self.assertEqual(self.dspl_dataset.GetTopic('topic3'), topic2)
+
+    self.dspl_dataset.topics.remove(topic1)
+    self.assertEqual(self.dspl_dataset.GetTopic('topic1'), None)
+    self.assertEqual(self.dspl_dataset.GetTopic('topic3'), None)
+
   def testDatasetXMLCreation(self):
     """Create dataset using models, then compare output to expected XML."""
     self.dspl_dataset.name = 'My Dataset'
@@ -317,6 +387,170 @@ class DSPLModelTests(unittest.TestCase):
       self.assertEqual(constructed_text,
                        expected_text)
 
+  def testXMLCaching(self):
+    """Test that XML is only rebuilt for the objects that have changed."""
+    concept1 = dspl_model.Concept(concept_id='concept1', data_type='string')
+    concept2 = dspl_model.Concept(concept_id='concept2', data_type='integer')
+    table = dspl_model.Table(
+        table_id='table', columns=[dspl_model.TableColumn('col1', 'string')],
+        file_name='table.csv', verbose=False)
+
+    self.dspl_dataset.AddConcept(concept1)
+    self.dspl_dataset.AddConcept(concept2)
+    self.dspl_dataset.AddTable(table)
+
+    root_element = self.dspl_dataset.ToXMLElement()
+    concept1_element = concept1.ToXMLElement()
+    concept2_element = concept2.ToXMLElement()
+    table_element = table.ToXMLElement()
+    dataset_xml = str(self.dspl_dataset)
+
+    self.assertTrue(self.dspl_dataset.ToXMLElement() is root_element)
+    self.assertTrue(str(self.dspl_dataset) is dataset_xml)
+
+    # Changing a field of one concept only rebuilds that concept
+    concept1.concept_name = 'Concept 1'
+
+    new_root_element = self.dspl_dataset.ToXMLElement()
+    self.assertFalse(new_root_element is root_element)
+    self.assertFalse(concept1.ToXMLElement() is concept1_element)
+    self.assertTrue(concept2.ToXMLElement() is concept2_element)
+    self.assertTrue(table.ToXMLElement() is table_element)
+    self.assertTrue(concept2_element in new_root_element.find('concepts'))
+    self.assertTrue('Concept 1' in str(self.dspl_dataset))
+
+    # Changes made in place to lists and child objects are also picked up
+    concept2.attributes.append(dspl_model.Attribute('concept1', 'value1'))
+    self.assertFalse(concept2.ToXMLElement() is concept2_element)
+    self.assertTrue('value1' in str(self.dspl_dataset))
+
+    table.columns[0].data_format = 'yyyy'
+    self.assertFalse(table.ToXMLElement() is table_element)
+    self.assertTrue('format="yyyy"' in str(self.dspl_dataset))
+
+    # Table data aren't part of the XML
+    table_element = table.ToXMLElement()
+    table.table_data = [['col1'], ['a']]
+    self.assertTrue(table.ToXMLElement() is table_element)
+
+    # The XML written to files matches the string
+    output_file = StringIO.StringIO()
+    self.dspl_dataset.WriteXML(output_file)
+    self.assertEqual(output_file.getvalue(), str(self.dspl_dataset))
+
+  def testCompactObjects(self):
+    """Test that slotted model objects can be pickled with any protocol."""
+    concept = dspl_model.Concept(
+        concept_id='concept1', data_type='string',
+        attributes=[dspl_model.Attribute('concept2', 'value')],
+        properties=[dspl_model.Property('concept3', True)])
+    concept.ToXMLElement()
+
+    self.assertFalse(hasattr(concept, '__dict__'))
+    self.assertRaises(AttributeError, setattr, concept, 'bad_field', 1)
+
+    for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+      loaded_concept = pickle.loads(pickle.dumps(concept, protocol))
+
+      self.assertEqual(loaded_concept.concept_id, 'concept1')
+      self.assertEqual(loaded_concept.attributes[0].value, 'value')
+      self.assertTrue(loaded_concept.properties[0].is_parent)
+      self.assertEqual(loaded_concept.XMLCacheKey(), concept.XMLCacheKey())
+
+  def testConcurrentMaterialize(self):
+    """Test writing the tables of a dataset with several threads."""
+    for table_index in range(4):
+      self.dspl_dataset.AddTable(
+          dspl_model.Table(
+              table_id='table%d' % table_index,
+              file_name='table%d.csv' % table_index,
+              table_data=[['col1', 'col2']] +
+              [[table_index, row] for row in range(100 * table_index)],
+              verbose=False))
+
+    output_path = tempfile.mkdtemp()
+    run_report = reporting.RunReport()
+
+    try:
+      self.dspl_dataset.Materialize(output_path, run_report, num_workers=3)
+
+      for table in self.dspl_dataset.tables:
+        output_csv_file = open(os.path.join(output_path, table.file_name), 'r')
+        self.assertEqual(
+            list(csv.reader(output_csv_file)),
+            [[str(value) for value in row] for row in table.table_data])
+        output_csv_file.close()
+
+      # Each file is reported, in the order of the dataset's tables
+      self.assertEqual(
+          [(phase.phase_type, phase.name) for phase in run_report.phases],
+          [('materialize', 'dataset.xml')] +
+          [('materialize', 'table%d.csv' % table_index)
+           for table_index in range(4)])
+
+      for phase in run_report.phases:
+        self.assertEqual(
+            phase.details['bytes_out'],
+            os.path.getsize(os.path.join(output_path, phase.name)))
+    finally:
+      shutil.rmtree(output_path)
+
+  def testMaterializeStatistics(self):
+    """Test that statistics are written for each table when asked for."""
+    self.dspl_dataset.AddConcept(
+        dspl_model.Concept(concept_id='country', table_ref='countries'))
+    self.dspl_dataset.AddConcept(
+        dspl_model.Concept(concept_id='year', concept_reference='time:year'))
+    self.dspl_dataset.AddConcept(
+        dspl_model.Concept(concept_id='population', data_type='integer'))
+    self.dspl_dataset.AddSlice(
+        dspl_model.Slice(slice_id='country_slice',
+                         dimension_refs=['year', 'country'],
+                         metric_refs=['population'],
+                         table_ref='country_slice_table'))
+    self.dspl_dataset.AddTable(
+        dspl_model.Table(
+            table_id='countries',
+            columns=[dspl_model.TableColumn('country', 'string')],
+            file_name='countries.csv',
+            table_data=[['country'], ['CA'], ['US']],
+            verbose=False))
+    self.dspl_dataset.AddTable(
+        dspl_model.Table(
+            table_id='country_slice_table',
+            columns=[dspl_model.TableColumn('country', 'string'),
+                     dspl_model.TableColumn('year', 'date', 'yyyy'),
+                     dspl_model.TableColumn('population', 'integer')],
+            file_name='country_slice.csv',
+            table_data=[['country', 'year', 'population'],
+                        ['CA', '2000', 30], ['CA', '2001', 31],
+                        ['US', '2000', 280]],
+            verbose=False))
+
+    output_path = tempfile.mkdtemp()
+
+    try:
+      self.dspl_dataset.Materialize(output_path, write_statistics=True)
+
+      statistics = dspl_statistics.ReadStatistics(
+          os.path.join(output_path, 'countries.csv'))
+      self.assertEqual(statistics.key_columns, ['country'])
+      self.assertTrue(statistics.keys_unique)
+      self.assertEqual(statistics.GetColumn('country').values, ['CA', 'US'])
+
+      # Rows are grouped by their non-time dimensions
+      statistics = dspl_statistics.ReadStatistics(
+          os.path.join(output_path, 'country_slice.csv'))
+      self.assertEqual(statistics.row_count, 3)
+      self.assertEqual(statistics.key_columns, ['country', 'year'])
+      self.assertEqual(statistics.group_columns, ['country'])
+      self.assertTrue(statistics.keys_unique)
+      self.assertTrue(statistics.groups_contiguous)
+      self.assertEqual(statistics.GetColumn('population').max_value, 280)
+      self.assertTrue(statistics.GetColumn('population').formats_valid)
+    finally:
+      shutil.rmtree(output_path)
+
 
 class DSPLTableTests(unittest.TestCase):
   """Test cases for table writing functionality of dspl_model module."""
@@ -329,6 +563,7 @@ class DSPLTableTests(unittest.TestCase):
 
   def tearDown(self):
     os.remove(self.csv_file_path)
+    dspl_statistics.RemoveStatistics(self.csv_file_path)
 
   def testTableData(self):
     """Test that Table objects materialize their data to CSV correctly."""
@@ -356,6 +591,130 @@ class DSPLTableTests(unittest.TestCase):
 
     output_csv_file.close()
 
+  def testCompactData(self):
+    """Test storing table data in typed columns."""
+    table_data = [['col1', 'col2', 'col3'],
+                  ['1/1/2010', 'blue', '12'],
+                  ['1/2/2010', 'red', '345']]
+
+    dspl_table = dspl_model.Table(
+        table_id='table',
+        columns=[dspl_model.TableColumn('col1', 'date'),
+                 dspl_model.TableColumn('col2', 'string'),
+                 dspl_model.TableColumn('col3', 'integer')],
+        file_name=self.csv_file_path,
+        table_data=table_data,
+        verbose=False)
+
+    self.assertTrue(dspl_table.CompactData())
+    self.assertEqual(
+        list(dspl_table.columnar_data.IterColumn('col3')), ['12', '345'])
+    self.assertEqual(list(dspl_table.IterRows()), table_data)
+
+    dspl_table.MaterializeData('')
+
+    output_csv_file = open(self.csv_file_path, 'r')
+    self.assertEqual(list(csv.reader(output_csv_file)), table_data)
+    output_csv_file.close()
+
+    # Getting the rows as a list converts them back, so they can be changed
+    dspl_table.table_data.append(['1/3/2010', 'green', '6'])
+    self.assertEqual(dspl_table.columnar_data, None)
+    self.assertEqual(list(dspl_table.IterRows()),
+                     table_data + [['1/3/2010', 'green', '6']])
+
+    # Tables with rows of different lengths are left as lists
+    self.assertFalse(dspl_table.CompactData(table_data + [['bad_row']]))
+    self.assertEqual(dspl_table.table_data, table_data + [['bad_row']])
+
+  def testSpillData(self):
+    """Test that spilled tables are read back and copied into place."""
+    table_data = [['col1', 'col2'], ['1/1/2010', 1], ['1/2/2010', 2]]
+
+    dspl_table = dspl_model.Table(
+        table_id='table',
+        file_name=os.path.basename(self.csv_file_path),
+        table_data=table_data,
+        verbose=False)
+
+    dspl_table.SpillData(self.csv_file_path, write_statistics=True)
+
+    self.assertEqual(dspl_table.table_data, [])
+    self.assertEqual(
+        list(dspl_table.IterRows()),
+        [['col1', 'col2'], ['1/1/2010', '1'], ['1/2/2010', '2']])
+
+    # Materializing to the spill location leaves the file alone
+    spill_file_mtime = os.stat(self.csv_file_path).st_mtime
+    dspl_table.MaterializeData(os.path.dirname(self.csv_file_path))
+    self.assertEqual(os.stat(self.csv_file_path).st_mtime, spill_file_mtime)
+
+    # Materializing elsewhere copies the file, along with its statistics
+    output_path = tempfile.mkdtemp()
+
+    try:
+      dspl_table.MaterializeData(output_path, write_statistics=True)
+
+      output_csv_file_path = os.path.join(output_path, dspl_table.file_name)
+      output_csv_file = open(output_csv_file_path, 'r')
+      self.assertEqual(
+          list(csv.reader(output_csv_file)), list(dspl_table.IterRows()))
+      output_csv_file.close()
+
+      self.assertEqual(
+          dspl_statistics.ReadStatistics(output_csv_file_path).ToDict(),
+          dspl_statistics.ReadStatistics(self.csv_file_path).ToDict())
+
+      # Statistics are only copied when asked for
+      dspl_table.MaterializeData(output_path)
+      self.assertEqual(
+          dspl_statistics.ReadStatistics(output_csv_file_path), None)
+      self.assertFalse(os.path.exists(
+          dspl_statistics.GetStatisticsFilePath(output_csv_file_path)))
+    finally:
+      shutil.rmtree(output_path)
+
+  def testArchiveData(self):
+    """Test that tables are written into archives, spilled or not."""
+    table_data = [['col1', 'col2'], ['1/1/2010', 1], ['1/2/2010', 2]]
+
+    dataset = dspl_model.DataSet(verbose=False)
+
+    for table_id in ['table1', 'table2', 'table3']:
+      dataset.AddTable(
+          dspl_model.Table(
+              table_id=table_id,
+              file_name='%s.csv' % table_id,
+              table_data=table_data,
+              verbose=False))
+
+    archive_file = StringIO.StringIO()
+    archive = dspl_archive.DatasetArchive(archive_file)
+
+    dataset.GetTable('table1').ArchiveData(archive)
+    dataset.GetTable('table2').SpillData(self.csv_file_path)
+
+    self.assertRaises(dspl_model.DSPLModelError,
+                      list, dataset.GetTable('table1').IterRows())
+
+    dataset.MaterializeArchive(archive)
+
+    zip_file = zipfile.ZipFile(StringIO.StringIO(archive_file.getvalue()))
+
+    self.assertEqual(
+        sorted(zip_file.namelist()),
+        ['dataset.xml', 'table1.csv', 'table2.csv', 'table3.csv'])
+    self.assertEqual(zip_file.read('dataset.xml'), str(dataset))
+
+    for table_id in ['table1', 'table2', 'table3']:
+      self.assertEqual(
+          list(csv.reader(
+              StringIO.StringIO(zip_file.read('%s.csv' % table_id)))),
+          [['col1', 'col2'], ['1/1/2010', '1'], ['1/2/2010', '2']])
+
+    zip_file.close()
+    archive_file.close()
+
 
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,340 @@
+#!/usr/bin/python2.4
+#
+# Copyright 2011, Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Save and load whole DSPL datasets as binary snapshots.
+
+A snapshot holds the dataset metadata and the data of all of its tables, so
+it can be loaded far faster than parsing the dataset XML and CSV files again.
+
+The file starts with a fixed header, giving the format version and the length
+of the metadata, which are written with marshal. The table columns follow, as
+raw arrays of machine values, each aligned to an 8-byte boundary. Loading maps
+the file into memory and copies each array straight out of the mapping.
+"""
+
+
+__author__ = 'Benjamin Yolken <yolken@google.com>'
+
+import array
+import marshal
+import mmap
+import struct
+import sys
+
+import dspl_columns
+import dspl_model
+
+
+# Format of the header at the start of each snapshot: magic string, format
+# version and length of the marshalled metadata
+_HEADER_FORMAT = '<8sII'
+_MAGIC = 'DSPLSNAP'
+
+# Version of the snapshot format; increase it whenever the format changes
+SNAPSHOT_VERSION = 1
+
+# Version of the marshal format used for the metadata
+_MARSHAL_VERSION = 2
+
+# Alignment, in bytes, of the column arrays
+_ARRAY_ALIGNMENT = 8
+
+
+class DSPLSnapshotError(Exception):
+  """Base class for exceptions in the dspl_snapshot module."""
+  pass
+
+
+def _TopicToTuple(topic):
+  """Convert a topic and its children into nested tuples."""
+  return (topic.topic_id, topic.topic_name,
+          [_TopicToTuple(child_topic) for child_topic in topic.children])
+
+
+def _TupleToTopic(topic_tuple):
+  """Convert the nested tuples made by _TopicToTuple back into a topic."""
+  return dspl_model.Topic(
+      topic_id=topic_tuple[0], topic_name=topic_tuple[1],
+      children=[_TupleToTopic(child_tuple) for child_tuple in topic_tuple[2]])
+
+
+def _TableDataToTuple(table, arrays):
+  """Describe the data of a table, adding any arrays it needs to a list.
+
+  Args:
+    table: dspl_model.Table object
+    arrays: List of arrays to be written after the metadata
+
+  Returns:
+    A tuple describing the table data
+
+  Raises:
+    DSPLSnapshotError: If the table data have been archived
+  """
+  if table.archived:
+    raise DSPLSnapshotError(
+        'Data of table %s were written to an archive and are no longer '
+        'available' % table.table_id)
+
+  columnar_data = table.columnar_data
+
+  if columnar_data is None:
+    # Store the rows in columns, if they can be
+    columnar_table = dspl_model.Table(columns=table.columns, verbose=False)
+
+    if not columnar_table.CompactData(table.IterRows()):
+      return ('rows', columnar_table.table_data)
+
+    columnar_data = columnar_table.columnar_data
+
+  (description, column_arrays) = columnar_data.Dump()
+  array_indices = range(len(arrays), len(arrays) + len(column_arrays))
+  arrays.extend(column_arrays)
+
+  return ('columns', description, array_indices)
+
+
+def _DataSetToTuple(dataset, arrays):
+  """Convert a dataset into a tuple of basic Python values.
+
+  Args:
+    dataset: dspl_model.DataSet object
+    arrays: List to add the arrays holding the table data to
+
+  Returns:
+    A tuple which can be written with marshal
+  """
+  return (
+      (dataset.namespace, dataset.name, dataset.description, dataset.url,
+       dataset.provider_name, dataset.provider_url, dataset.verbose),
+      [(import_obj.namespace_id, import_obj.namespace_url)
+       for import_obj in dataset.imports],
+      [_TopicToTuple(topic) for topic in dataset.topics],
+      [(concept.concept_id, concept.concept_name, concept.concept_description,
+        concept.data_type, concept.table_ref, concept.concept_reference,
+        concept.concept_extension_reference, list(concept.topic_references),
+        [(concept_attribute.concept_ref, concept_attribute.value)
+         for concept_attribute in concept.attributes],
+        [(concept_property.concept_ref, concept_property.is_parent)
+         for concept_property in concept.properties])
+       for concept in dataset.concepts],
+      [(data_slice.slice_id, list(data_slice.dimension_refs),
+        list(data_slice.metric_refs), data_slice.dimension_map,
+        data_slice.metric_map, data_slice.table_ref)
+       for data_slice in dataset.slices],
+      [(table.table_id,
+        [(column.column_id, column.data_type, column.data_format,
+          column.constant_value) for column in table.columns],
+        table.file_name, table.verbose, _TableDataToTuple(table, arrays))
+       for table in dataset.tables])
+
+
+def _TupleToDataSet(dataset_tuple, arrays):
+  """Convert the tuple made by _DataSetToTuple back into a dataset.
+
+  Args:
+    dataset_tuple: Tuple returned by _DataSetToTuple
+    arrays: List of the arrays holding the table data
+
+  Returns:
+    dspl_model.DataSet object
+  """
+  (dataset_fields, import_tuples, topic_tuples, concept_tuples, slice_tuples,
+   table_tuples) = dataset_tuple
+
+  (namespace, name, description, url, provider_name, provider_url,
+   verbose) = dataset_fields
+
+  dataset = dspl_model.DataSet(
+      namespace=namespace, name=name, description=description, url=url,
+      provider_name=provider_name, provider_url=provider_url,
+      verbose=verbose)
+
+  for (namespace_id, namespace_url) in import_tuples:
+    dataset.AddImport(dspl_model.Import(namespace_id, namespace_url))
+
+  for topic_tuple in topic_tuples:
+    dataset.AddTopic(_TupleToTopic(topic_tuple))
+
+  for concept_tuple in concept_tuples:
+    dataset.AddConcept(
+        dspl_model.Concept(
+            *concept_tuple[:8],
+            attributes=[dspl_model.Attribute(*attribute_tuple)
+                        for attribute_tuple in concept_tuple[8]],
+            properties=[dspl_model.Property(*property_tuple)
+                        for property_tuple in concept_tuple[9]]))
+
+  for slice_tuple in slice_tuples:
+    dataset.AddSlice(dspl_model.Slice(*slice_tuple))
+
+  for (table_id, column_tuples, file_name, verbose,
+       data_tuple) in table_tuples:
+    table = dspl_model.Table(
+        table_id=table_id,
+        columns=[dspl_model.TableColumn(*column_tuple)
+                 for column_tuple in column_tuples],
+        file_name=file_name,
+        verbose=verbose)
+
+    if data_tuple[0] == 'rows':
+      table.table_data = data_tuple[1]
+    else:
+      table.columnar_data = dspl_columns.ColumnarData.Load(
+          data_tuple[1], [arrays[i] for i in data_tuple[2]])
+
+    dataset.AddTable(table)
+
+  return dataset
+
+
+def _AlignedSize(num_bytes):
+  """Round a number of bytes up to a whole number of alignment units."""
+  return -(-num_bytes // _ARRAY_ALIGNMENT) * _ARRAY_ALIGNMENT
+
+
+def SaveSnapshot(dataset, snapshot_file):
+  """Write a snapshot of a dataset, including all of its table data.
+
+  Args:
+    dataset: dspl_model.DataSet object
+    snapshot_file: File object, opened for writing in binary mode
+
+  Raises:
+    DSPLSnapshotError: If the dataset has values that can't be stored, or
+                       table data that are no longer available
+  """
+  arrays = []
+  dataset_tuple = _DataSetToTuple(dataset, arrays)
+
+  # Record where each array will be, relative to the end of the metadata
+  array_tuples = []
+  offset = 0
+
+  for data_array in arrays:
+    num_bytes = len(data_array) * data_array.itemsize
+    array_tuples.append(
+        (data_array.typecode, data_array.itemsize, offset, num_bytes))
+    offset += _AlignedSize(num_bytes)
+
+  try:
+    metadata = marshal.dumps(
+        (sys.byteorder, array_tuples, dataset_tuple), _MARSHAL_VERSION)
+  except ValueError as marshal_error:
+    raise DSPLSnapshotError(
+        'Dataset has values that can\'t be stored: %s' % marshal_error)
+
+  # Pad the metadata so that the arrays start on an alignment boundary
+  header_size = struct.calcsize(_HEADER_FORMAT)
+  metadata += '\0' * (_AlignedSize(header_size + len(metadata)) -
+                      header_size - len(metadata))
+
+  snapshot_file.write(
+      struct.pack(_HEADER_FORMAT, _MAGIC, SNAPSHOT_VERSION, len(metadata)))
+  snapshot_file.write(metadata)
+
+  for data_array in arrays:
+    num_bytes = len(data_array) * data_array.itemsize
+    data_array.tofile(snapshot_file)
+    snapshot_file.write('\0' * (_AlignedSize(num_bytes) - num_bytes))
+
+
+def LoadSnapshot(snapshot_path):
+  """Load a dataset from a snapshot written by SaveSnapshot.
+
+  Args:
+    snapshot_path: Path of the snapshot file
+
+  Returns:
+    dspl_model.DataSet object
+
+  Raises:
+    DSPLSnapshotError: If the file isn't a snapshot of a supported version, or
+                       was written on an incompatible platform
+  """
+  try:
+    snapshot_file = open(snapshot_path, 'rb')
+  except IOError as io_error:
+    raise DSPLSnapshotError(str(io_error))
+
+  try:
+    header_size = struct.calcsize(_HEADER_FORMAT)
+    header = snapshot_file.read(header_size)
+
+    if len(header) != header_size or not header.startswith(_MAGIC):
+      raise DSPLSnapshotError('Not a DSPL snapshot: %s' % snapshot_path)
+
+    (unused_magic, version, metadata_size) = struct.unpack(
+        _HEADER_FORMAT, header)
+
+    if version != SNAPSHOT_VERSION:
+      raise DSPLSnapshotError(
+          'Snapshot %s has format version %d; expected %d' %
+          (snapshot_path, version, SNAPSHOT_VERSION))
+
+    try:
+      (byte_order, array_tuples, dataset_tuple) = marshal.loads(
+          snapshot_file.read(metadata_size))
+    except (EOFError, ValueError, TypeError):
+      raise DSPLSnapshotError('Snapshot %s is corrupt' % snapshot_path)
+
+    arrays = []
+
+    if array_tuples:
+      snapshot_map = mmap.mmap(
+          snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+      try:
+        data_start = header_size + metadata_size
+
+        for (typecode, itemsize, offset, num_bytes) in array_tuples:
+          data_array = array.array(typecode)
+
+          if data_array.itemsize != itemsize:
+            raise DSPLSnapshotError(
+                'Snapshot %s was written on a platform with different value '
+                'sizes' % snapshot_path)
+
+          data_array.fromstring(
+              snapshot_map[data_start + offset:
+                           data_start + offset + num_bytes])
+
+          if byte_order != sys.byteorder:
+            data_array.byteswap()
+
+          arrays.append(data_array)
+      finally:
+        snapshot_map.close()
+  finally:
+    snapshot_file.close()
+
+  return _TupleToDataSet(dataset_tuple, arrays)
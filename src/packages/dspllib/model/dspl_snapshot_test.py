@@ -0,0 +1,162 @@
+#!/usr/bin/python2.4
+#
+# Copyright 2011, Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Tests of dspl_snapshot module."""
+
+
+__author__ = 'Benjamin Yolken <yolken@google.com>'
+
+import os
+import struct
+import tempfile
+import unittest
+
+import dspl_model
+import dspl_snapshot
+
+
+class DSPLSnapshotTests(unittest.TestCase):
+  """Test cases for dspl_snapshot module."""
+
+  def setUp(self):
+    (snapshot_fd, self.snapshot_path) = tempfile.mkstemp()
+    os.close(snapshot_fd)
+
+    self.dataset = dspl_model.DataSet(
+        namespace='http://example.com/dataset', name='My Dataset',
+        provider_name=u'Provider \xe9', verbose=False)
+    self.dataset.AddImport(
+        dspl_model.Import('time', 'http://www.google.com/publicdata/time'))
+    self.dataset.AddTopic(
+        dspl_model.Topic('topic1', 'Topic 1',
+                         [dspl_model.Topic('topic2', 'Topic 2')]))
+    self.dataset.AddConcept(
+        dspl_model.Concept(
+            'state', 'State', data_type='string', table_ref='state_table',
+            topic_references=['topic2'],
+            attributes=[dspl_model.Attribute('color', 'blue')],
+            properties=[dspl_model.Property('country', True)]))
+    self.dataset.AddConcept(
+        dspl_model.Concept('population', data_type='integer'))
+    self.dataset.AddConcept(
+        dspl_model.Concept('time:year', concept_reference='time:year'))
+    self.dataset.AddSlice(
+        dspl_model.Slice('slice1', ['state', 'time:year'], ['population'],
+                         {'time:year': 'year'}, {}, 'slice_table'))
+
+    columns = [dspl_model.TableColumn('state', 'string'),
+               dspl_model.TableColumn('year', 'date', 'yyyy'),
+               dspl_model.TableColumn('population', 'integer')]
+
+    compact_table = dspl_model.Table(
+        'slice_table', columns, 'slice.csv',
+        [['state', 'year', 'population'], ['AL', '1990', '4040587'],
+         ['AK', '1990', '550043']], verbose=False)
+    compact_table.CompactData()
+    self.dataset.AddTable(compact_table)
+
+    self.dataset.AddTable(
+        dspl_model.Table(
+            'state_table', [dspl_model.TableColumn('state', 'string')],
+            'state.csv', [['state'], ['AL'], ['AK', 'extra']],
+            verbose=False))
+
+  def tearDown(self):
+    os.remove(self.snapshot_path)
+
+  def _SaveSnapshot(self):
+    snapshot_file = open(self.snapshot_path, 'wb')
+    dspl_snapshot.SaveSnapshot(self.dataset, snapshot_file)
+    snapshot_file.close()
+
+  def testSaveAndLoad(self):
+    """Test that a dataset is the same after a round trip through a file."""
+    self._SaveSnapshot()
+    loaded_dataset = dspl_snapshot.LoadSnapshot(self.snapshot_path)
+
+    self.assertEqual(str(loaded_dataset), str(self.dataset))
+    self.assertEqual(loaded_dataset.provider_name, u'Provider \xe9')
+    self.assertEqual(loaded_dataset.GetTopic('topic2').topic_name, 'Topic 2')
+    self.assertEqual(
+        loaded_dataset.GetConcept('time:year').concept_reference, 'time:year')
+
+    for table in self.dataset.tables:
+      loaded_table = loaded_dataset.GetTable(table.table_id)
+      self.assertEqual(list(loaded_table.IterRows()), list(table.IterRows()))
+
+    # Compact tables stay compact; others are kept as rows
+    self.assertEqual(
+        list(loaded_dataset.GetTable('slice_table').columnar_data.IterColumn(
+            'population')),
+        ['4040587', '550043'])
+    self.assertEqual(loaded_dataset.GetTable('state_table').columnar_data,
+                     None)
+
+  def testRowTablesCompacted(self):
+    """Test that tables held as lists of rows are stored as columns."""
+    self.dataset.GetTable('state_table').table_data = [['state'], ['AL']]
+    self._SaveSnapshot()
+    loaded_dataset = dspl_snapshot.LoadSnapshot(self.snapshot_path)
+
+    loaded_table = loaded_dataset.GetTable('state_table')
+    self.assertNotEqual(loaded_table.columnar_data, None)
+    self.assertEqual(list(loaded_table.IterRows()), [['state'], ['AL']])
+
+  def testBadSnapshots(self):
+    """Test loading files that aren't snapshots of the current version."""
+    snapshot_file = open(self.snapshot_path, 'wb')
+    snapshot_file.write('not a snapshot')
+    snapshot_file.close()
+
+    self.assertRaises(dspl_snapshot.DSPLSnapshotError,
+                      dspl_snapshot.LoadSnapshot, self.snapshot_path)
+
+    snapshot_file = open(self.snapshot_path, 'wb')
+    snapshot_file.write(
+        struct.pack('<8sII', 'DSPLSNAP', dspl_snapshot.SNAPSHOT_VERSION + 1, 0))
+    snapshot_file.close()
+
+    self.assertRaises(dspl_snapshot.DSPLSnapshotError,
+                      dspl_snapshot.LoadSnapshot, self.snapshot_path)
+
+  def testArchivedTable(self):
+    """Test that archived tables can't be saved."""
+    self.dataset.GetTable('state_table').archived = True
+
+    snapshot_file = open(self.snapshot_path, 'wb')
+    self.assertRaises(dspl_snapshot.DSPLSnapshotError,
+                      dspl_snapshot.SaveSnapshot, self.dataset, snapshot_file)
+    snapshot_file.close()
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,578 @@
+#!/usr/bin/python2.4
+#
+# Copyright 2011, Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Statistics of the data in table CSV files, collected as they are written.
+
+The statistics of each file are written to a sidecar file next to it, along
+with the file's size and modification time. Readers, such as the validator,
+can then trust them instead of reading the data, for as long as the file is
+unchanged.
+"""
+
+
+__author__ = 'Benjamin Yolken <yolken@google.com>'
+
+import itertools
+import json
+import os
+import re
+
+
+# Version of the sidecar file format; files with other versions are ignored
+STATISTICS_VERSION = 1
+
+# Suffix added to the path of a CSV file to get that of its sidecar file
+STATISTICS_FILE_SUFFIX = '.stats.json'
+
+# Formats that integer and float values must have in DSPL CSV files
+INTEGER_PATTERN = re.compile(r'^[-]{0,1}[0-9]+$')
+FLOAT_PATTERN = re.compile(r'^[-]{0,1}[0-9]*(\.[0-9]+){0,1}$')
+
+_FORMAT_PATTERNS = {'integer': INTEGER_PATTERN, 'float': FLOAT_PATTERN}
+
+# Largest number of distinct values tracked for a column; beyond this, the
+# distinct count and values of the column are unknown
+MAX_DISTINCT_VALUES = 100000
+
+# Number of rows whose statistics are collected at a time
+_BATCH_SIZE = 10000
+
+# Types of values that are converted to strings in the same way
+_STRING_TYPES = set([str])
+_INTEGER_TYPES = set([int, long])
+_FLOAT_TYPES = set([float])
+
+
+def _CSVString(value):
+  """Get the string written to a CSV file for a value, as the csv module does.
+
+  Args:
+    value: A table value
+
+  Returns:
+    The value as a (UTF-8 encoded) string
+  """
+  if value is None:
+    return ''
+  elif isinstance(value, str):
+    return value
+  elif isinstance(value, unicode):
+    return value.encode('utf-8')
+  elif isinstance(value, float):
+    return repr(value)
+  else:
+    return str(value)
+
+
+def _CSVStrings(values):
+  """Get the strings written to a CSV file for a sequence of values.
+
+  Columns of a single type, as most are, are converted without calling
+  _CSVString for each value.
+
+  Args:
+    values: Sequence of table values
+
+  Returns:
+    A pair of the list of strings and the set of the types of the values
+  """
+  value_types = set(map(type, values))
+
+  if value_types == _STRING_TYPES:
+    strings = list(values)
+  elif value_types <= _INTEGER_TYPES:
+    strings = map(str, values)
+  elif value_types == _FLOAT_TYPES:
+    strings = map(repr, values)
+  else:
+    strings = map(_CSVString, values)
+
+  return (strings, value_types)
+
+
+def _JSONValue(value):
+  """Get a value that can be written as JSON in place of a table value."""
+  if value is None or isinstance(value, (bool, int, long, float)):
+    return value
+  else:
+    return _CSVString(value)
+
+
+def _EncodeStrings(value):
+  """Encode the strings in a value read from JSON back into UTF-8.
+
+  Args:
+    value: A value read from JSON
+
+  Returns:
+    The value, with unicode strings, including those in lists, encoded
+  """
+  if isinstance(value, unicode):
+    return value.encode('utf-8')
+  elif isinstance(value, list):
+    return [_EncodeStrings(element) for element in value]
+  else:
+    return value
+
+
+class ColumnStatistics(object):
+  """Statistics of the values in one column of a table.
+
+  Blank values are counted, but otherwise left out of the statistics.
+  """
+
+  # Fields written to and read from sidecar files
+  FIELDS = ('column_id', 'data_type', 'blank_count', 'min_value', 'max_value',
+            'distinct_count', 'is_sorted', 'formats_valid', 'values')
+
+  def __init__(self, column_id='', data_type='string'):
+    """Create a new ColumnStatistics object.
+
+    Args:
+      column_id: ID of the column
+      data_type: DSPL data type of the column
+    """
+    self.column_id = column_id
+    self.data_type = data_type
+    self.blank_count = 0
+    self.min_value = None
+    self.max_value = None
+
+    # Number of distinct values, or None if there are too many to track
+    self.distinct_count = 0
+
+    # Whether each value is no less than the one before it
+    self.is_sorted = True
+
+    # Whether each value has the format required by the data type
+    self.formats_valid = True
+
+    # Sorted list of the distinct values, as written to the CSV file; only
+    # kept for key columns, and None if there are too many to track
+    self.values = None
+
+
+class TableStatistics(object):
+  """Statistics of the data in a table CSV file.
+
+  Besides the statistics of each column, these record whether the rows are
+  uniquely identified by the values of their key columns, and whether the rows
+  with the same values in the group columns are all next to each other. Keys
+  are compared as the validator does, by joining their values with commas.
+  """
+
+  # Fields written to and read from sidecar files, besides the columns
+  FIELDS = ('header', 'row_count', 'consistent_row_lengths', 'key_columns',
+            'group_columns', 'keys_unique', 'groups_contiguous')
+
+  def __init__(self, header=None, key_columns=(), group_columns=()):
+    """Create a new TableStatistics object.
+
+    Args:
+      header: List of the column IDs in the CSV header, or None if the file is
+              empty
+      key_columns: Sequence of IDs of the columns that identify each row
+      group_columns: Sequence of IDs of the columns that rows should be grouped
+                     by
+    """
+    self.header = header
+    self.row_count = 0
+
+    # Whether each row has as many values as the header
+    self.consistent_row_lengths = True
+
+    self.key_columns = list(key_columns)
+    self.group_columns = list(group_columns)
+
+    # Whether the key and group checks hold; None if there are no such columns
+    self.keys_unique = None
+    self.groups_contiguous = None
+
+    self.columns = []
+
+  def GetColumn(self, column_id):
+    """Get the statistics of a column, or None if there is no such column."""
+    for column in self.columns:
+      if column.column_id == column_id:
+        return column
+
+    return None
+
+  def ToDict(self):
+    """Convert the statistics into a dictionary that can be written as JSON."""
+    statistics_dict = dict(
+        (field, getattr(self, field)) for field in TableStatistics.FIELDS)
+    statistics_dict['columns'] = []
+
+    for column in self.columns:
+      column_dict = dict(
+          (field, getattr(column, field)) for field in ColumnStatistics.FIELDS)
+      column_dict['min_value'] = _JSONValue(column.min_value)
+      column_dict['max_value'] = _JSONValue(column.max_value)
+      statistics_dict['columns'].append(column_dict)
+
+    return statistics_dict
+
+  @staticmethod
+  def FromDict(statistics_dict):
+    """Create a TableStatistics object from the output of ToDict.
+
+    Args:
+      statistics_dict: Dictionary read from JSON
+
+    Returns:
+      A TableStatistics object
+    """
+    statistics = TableStatistics()
+
+    for field in TableStatistics.FIELDS:
+      setattr(statistics, field, _EncodeStrings(statistics_dict[field]))
+
+    for column_dict in statistics_dict['columns']:
+      column = ColumnStatistics()
+
+      for field in ColumnStatistics.FIELDS:
+        setattr(column, field, _EncodeStrings(column_dict[field]))
+
+      statistics.columns.append(column)
+
+    return statistics
+
+
+class StatisticsCollector(object):
+  """Collects the statistics of table rows as they are passed through."""
+
+  def __init__(self, data_types=None, key_columns=(), group_columns=()):
+    """Create a new StatisticsCollector object.
+
+    Args:
+      data_types: Dictionary of the DSPL data type of each column ID; columns
+                  without one are treated as strings
+      key_columns: Sequence of IDs of the columns that identify each row;
+                   those that aren't in the header are left out
+      group_columns: Sequence of IDs of the columns that rows should be
+                     grouped by; those that aren't in the header are left out
+    """
+    self._data_types = data_types or {}
+    self._key_columns = key_columns
+    self._group_columns = group_columns
+    self._statistics = TableStatistics()
+
+    # Per-column state: the distinct values seen so far and the last value
+    self._distinct_values = []
+    self._last_values = []
+
+    self._key_indices = []
+    self._key_hashes = set()
+    self._group_indices = []
+    self._group_hashes = set()
+    self._last_group = None
+
+  def Collect(self, rows):
+    """Collect the statistics of rows, yielding each of them unchanged.
+
+    Args:
+      rows: Iterable of rows, with the header first
+
+    Yields:
+      Each of the rows
+    """
+    row_iterator = iter(rows)
+    header = next(row_iterator, None)
+
+    if header is None:
+      return
+
+    self._Start(header)
+    yield header
+
+    batch = []
+
+    for row in row_iterator:
+      batch.append(row)
+
+      if len(batch) == _BATCH_SIZE:
+        self._AddBatch(batch)
+        batch = []
+
+      yield row
+
+    self._AddBatch(batch)
+
+  def _Start(self, header):
+    """Set up the statistics of the columns in a header row."""
+    statistics = self._statistics
+    statistics.header = list(header)
+
+    for column_id in header:
+      statistics.columns.append(
+          ColumnStatistics(column_id,
+                           self._data_types.get(column_id, 'string')))
+      self._distinct_values.append(set())
+      self._last_values.append(None)
+
+    statistics.key_columns = [column_id for column_id in self._key_columns
+                              if column_id in statistics.header]
+    statistics.group_columns = [column_id for column_id in self._group_columns
+                                if column_id in statistics.header]
+    self._key_indices = [statistics.header.index(column_id)
+                         for column_id in statistics.key_columns]
+    self._group_indices = [statistics.header.index(column_id)
+                           for column_id in statistics.group_columns]
+
+    if self._key_indices:
+      statistics.keys_unique = True
+
+    if self._group_indices:
+      statistics.groups_contiguous = True
+
+  def _AddBatch(self, batch):
+    """Add the statistics of a list of data rows."""
+    statistics = self._statistics
+    num_columns = len(statistics.header)
+    statistics.row_count += len(batch)
+
+    if set(map(len, batch)) == set([num_columns]):
+      rows = batch
+    else:
+      rows = [row for row in batch if len(row) == num_columns]
+      statistics.consistent_row_lengths = False
+
+      if not rows:
+        return
+
+    column_strings = []
+
+    for c, values in enumerate(zip(*rows)):
+      (strings, value_types) = _CSVStrings(values)
+      column_strings.append(strings)
+      self._AddColumnValues(c, values, strings, value_types)
+
+    if self._key_indices:
+      key_hashes = self._key_hashes
+      num_keys = len(key_hashes)
+      key_hashes.update(itertools.imap(
+          hash,
+          itertools.imap(
+              ','.join,
+              itertools.izip(*[column_strings[c]
+                               for c in self._key_indices]))))
+
+      # Equal keys have equal hashes, so fewer new hashes than rows means that
+      # some keys may be repeated
+      if len(key_hashes) - num_keys != len(rows):
+        statistics.keys_unique = False
+
+    if self._group_indices and statistics.groups_contiguous:
+      groups = itertools.izip(
+          *[column_strings[c] for c in self._group_indices])
+
+      for (group, unused_rows) in itertools.groupby(groups):
+        if group == self._last_group:
+          continue
+
+        group_hash = hash(','.join(group))
+
+        if group_hash in self._group_hashes:
+          statistics.groups_contiguous = False
+          break
+
+        self._group_hashes.add(group_hash)
+        self._last_group = group
+
+  def _AddColumnValues(self, c, values, strings, value_types):
+    """Add the statistics of a batch of values of one column.
+
+    Args:
+      c: Index of the column
+      values: Sequence of the values
+      strings: List of the values as written to the CSV file
+      value_types: Set of the types of the values
+    """
+    column = self._statistics.columns[c]
+    blank_count = strings.count('')
+    column.blank_count += blank_count
+
+    if blank_count:
+      values = [value for (value, string) in itertools.izip(values, strings)
+                if string]
+      strings = [string for string in strings if string]
+
+      if not values:
+        return
+
+    batch_min = min(values)
+    batch_max = max(values)
+
+    if column.min_value is None:
+      column.min_value = batch_min
+      column.max_value = batch_max
+    else:
+      column.min_value = min(column.min_value, batch_min)
+      column.max_value = max(column.max_value, batch_max)
+
+    if column.is_sorted:
+      last_value = self._last_values[c]
+      values = list(values)
+
+      if ((last_value is not None and values[0] < last_value) or
+          sorted(values) != values):
+        column.is_sorted = False
+
+      self._last_values[c] = values[-1]
+
+    distinct_values = self._distinct_values[c]
+
+    if distinct_values is not None:
+      distinct_values.update(strings)
+
+      if len(distinct_values) > MAX_DISTINCT_VALUES:
+        self._distinct_values[c] = None
+
+    pattern = _FORMAT_PATTERNS.get(column.data_type)
+
+    # Integers are written in a format that both integer and float columns
+    # accept
+    if (pattern and column.formats_valid and
+        not value_types <= _INTEGER_TYPES):
+      column.formats_valid = all(itertools.imap(pattern.match, strings))
+
+  def GetStatistics(self):
+    """Get the statistics of the rows collected so far.
+
+    Returns:
+      A TableStatistics object
+    """
+    statistics = self._statistics
+
+    for (c, column) in enumerate(statistics.columns):
+      distinct_values = self._distinct_values[c]
+
+      if distinct_values is None:
+        column.distinct_count = None
+        column.values = None
+      else:
+        column.distinct_count = len(distinct_values)
+
+        if column.column_id in statistics.key_columns:
+          column.values = sorted(distinct_values)
+
+    return statistics
+
+
+def GetStatisticsFilePath(csv_file_path):
+  """Get the path of the sidecar file for a CSV file."""
+  return csv_file_path + STATISTICS_FILE_SUFFIX
+
+
+def WriteStatistics(statistics, csv_file_path):
+  """Write the statistics of a CSV file to its sidecar file.
+
+  The size and modification time of the CSV file are recorded along with the
+  statistics, so it should be complete and closed. If the statistics can't be
+  written as JSON, any existing sidecar file is removed instead.
+
+  Args:
+    statistics: A TableStatistics object
+    csv_file_path: Path of the CSV file the statistics are of
+
+  Returns:
+    True if the sidecar file was written, or False otherwise
+  """
+  statistics_file_path = GetStatisticsFilePath(csv_file_path)
+  csv_file_stat = os.stat(csv_file_path)
+
+  statistics_dict = statistics.ToDict()
+  statistics_dict['version'] = STATISTICS_VERSION
+  statistics_dict['file_size'] = csv_file_stat.st_size
+  statistics_dict['file_mtime'] = csv_file_stat.st_mtime
+
+  try:
+    statistics_json = json.dumps(statistics_dict, sort_keys=True)
+  except (TypeError, ValueError):
+    # Values that aren't valid UTF-8, for instance
+    RemoveStatistics(csv_file_path)
+    return False
+
+  statistics_file = open(statistics_file_path, 'w')
+
+  try:
+    statistics_file.write(statistics_json)
+  finally:
+    statistics_file.close()
+
+  return True
+
+
+def ReadStatistics(csv_file_path):
+  """Read the statistics of a CSV file from its sidecar file.
+
+  Args:
+    csv_file_path: Path of the CSV file
+
+  Returns:
+    A TableStatistics object, or None if there is no readable sidecar file, or
+    the CSV file has changed size or been modified since it was written
+  """
+  statistics_file_path = GetStatisticsFilePath(csv_file_path)
+
+  try:
+    csv_file_stat = os.stat(csv_file_path)
+    statistics_file = open(statistics_file_path, 'r')
+  except (IOError, OSError):
+    return None
+
+  try:
+    try:
+      statistics_dict = json.load(statistics_file)
+    except ValueError:
+      return None
+  finally:
+    statistics_file.close()
+
+  if (not isinstance(statistics_dict, dict) or
+      statistics_dict.get('version') != STATISTICS_VERSION or
+      statistics_dict.get('file_size') != csv_file_stat.st_size or
+      statistics_dict.get('file_mtime') != csv_file_stat.st_mtime):
+    return None
+
+  try:
+    return TableStatistics.FromDict(statistics_dict)
+  except (KeyError, TypeError):
+    return None
+
+
+def RemoveStatistics(csv_file_path):
+  """Remove the sidecar file of a CSV file, if there is one."""
+  statistics_file_path = GetStatisticsFilePath(csv_file_path)
+
+  if os.path.exists(statistics_file_path):
+    os.remove(statistics_file_path)
@@ -0,0 +1,190 @@
+#!/usr/bin/python2.4
+#
+# Copyright 2011, Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Tests of dspl_statistics module."""
+
+
+__author__ = 'Benjamin Yolken <yolken@google.com>'
+
+import csv
+import os
+import tempfile
+import unittest
+
+import dspl_statistics
+
+
+def _CollectStatistics(rows, data_types=None, key_columns=(),
+                       group_columns=()):
+  """Collect the statistics of a list of rows."""
+  collector = dspl_statistics.StatisticsCollector(
+      data_types, key_columns, group_columns)
+
+  for unused_row in collector.Collect(rows):
+    pass
+
+  return collector.GetStatistics()
+
+
+class DSPLStatisticsTests(unittest.TestCase):
+  """Test cases for dspl_statistics module."""
+
+  def setUp(self):
+    (csv_fd, self.csv_file_path) = tempfile.mkstemp()
+    os.close(csv_fd)
+
+  def tearDown(self):
+    os.remove(self.csv_file_path)
+    dspl_statistics.RemoveStatistics(self.csv_file_path)
+
+  def testColumnStatistics(self):
+    """Test the statistics of each column."""
+    statistics = _CollectStatistics(
+        [['name', 'count', 'ratio'],
+         ['a', 3, 0.5],
+         ['b', '', 1e-05],
+         ['c', 1, None],
+         ['c', '7', 2.0]],
+        {'count': 'integer', 'ratio': 'float'})
+
+    self.assertEqual(statistics.header, ['name', 'count', 'ratio'])
+    self.assertEqual(statistics.row_count, 4)
+    self.assertTrue(statistics.consistent_row_lengths)
+    self.assertEqual(statistics.keys_unique, None)
+    self.assertEqual(statistics.groups_contiguous, None)
+
+    name = statistics.GetColumn('name')
+    self.assertEqual((name.min_value, name.max_value), ('a', 'c'))
+    self.assertEqual(name.distinct_count, 3)
+    self.assertEqual(name.blank_count, 0)
+    self.assertTrue(name.is_sorted)
+
+    count = statistics.GetColumn('count')
+    self.assertEqual(count.blank_count, 1)
+    self.assertEqual(count.distinct_count, 3)
+    self.assertFalse(count.is_sorted)
+    self.assertTrue(count.formats_valid)
+
+    # Floats are written with repr, which uses exponents for small values
+    ratio = statistics.GetColumn('ratio')
+    self.assertEqual((ratio.min_value, ratio.max_value), (1e-05, 2.0))
+    self.assertEqual(ratio.blank_count, 1)
+    self.assertFalse(ratio.formats_valid)
+
+    self.assertEqual(statistics.GetColumn('missing'), None)
+
+  def testRowsPassedThrough(self):
+    """Test that rows are passed through unchanged as they are collected."""
+    rows = [['col1', 'col2'], ['a', 1], ['b']]
+    collector = dspl_statistics.StatisticsCollector()
+
+    self.assertEqual(list(collector.Collect(rows)), rows)
+    self.assertEqual(
+        list(dspl_statistics.StatisticsCollector().Collect([])), [])
+
+  def testKeysAndGroups(self):
+    """Test the checks of the key and group columns."""
+    rows = [['region', 'year', 'value'],
+            ['east', '2000', '1'],
+            ['east', '2001', '2'],
+            ['west', '2000', '3']]
+
+    statistics = _CollectStatistics(
+        rows, key_columns=['region', 'year', 'constant'],
+        group_columns=['region'])
+
+    # Columns that aren't in the header are left out
+    self.assertEqual(statistics.key_columns, ['region', 'year'])
+    self.assertEqual(statistics.group_columns, ['region'])
+    self.assertTrue(statistics.keys_unique)
+    self.assertTrue(statistics.groups_contiguous)
+    self.assertEqual(statistics.GetColumn('year').values, ['2000', '2001'])
+    self.assertEqual(statistics.GetColumn('value').values, None)
+
+    statistics = _CollectStatistics(
+        rows + [['east', '2001', '4']], key_columns=['region', 'year'],
+        group_columns=['region'])
+    self.assertFalse(statistics.keys_unique)
+    self.assertFalse(statistics.groups_contiguous)
+
+    statistics = _CollectStatistics(
+        rows + [['bad_row']], key_columns=['region', 'year'])
+    self.assertFalse(statistics.consistent_row_lengths)
+    self.assertEqual(statistics.row_count, 4)
+
+  def testBatches(self):
+    """Test statistics of rows collected over several batches."""
+    rows = [['key', 'group']]
+    rows.extend([[str(r), r // 15000] for r in range(25000)])
+
+    statistics = _CollectStatistics(
+        rows, {'group': 'integer'}, key_columns=['key'],
+        group_columns=['group'])
+
+    self.assertEqual(statistics.row_count, 25000)
+    self.assertTrue(statistics.keys_unique)
+    self.assertTrue(statistics.groups_contiguous)
+    self.assertEqual(statistics.GetColumn('key').distinct_count, 25000)
+    self.assertFalse(statistics.GetColumn('key').is_sorted)
+    self.assertTrue(statistics.GetColumn('group').is_sorted)
+    self.assertEqual(statistics.GetColumn('group').max_value, 1)
+
+  def testWriteAndRead(self):
+    """Test that statistics are read back only while the file is unchanged."""
+    rows = [['name', 'value'], ['a', '1'], ['\xc3\xa9', '2']]
+    statistics = _CollectStatistics(rows, key_columns=['name'])
+
+    csv_file = open(self.csv_file_path, 'wb')
+    csv.writer(csv_file).writerows(rows)
+    csv_file.close()
+
+    self.assertEqual(
+        dspl_statistics.ReadStatistics(self.csv_file_path), None)
+    self.assertTrue(
+        dspl_statistics.WriteStatistics(statistics, self.csv_file_path))
+
+    read_statistics = dspl_statistics.ReadStatistics(self.csv_file_path)
+    self.assertEqual(read_statistics.ToDict(), statistics.ToDict())
+    self.assertEqual(read_statistics.GetColumn('name').values,
+                     ['a', '\xc3\xa9'])
+
+    # Changing the file makes its statistics untrustworthy
+    csv_file = open(self.csv_file_path, 'ab')
+    csv_file.write('b,3\r\n')
+    csv_file.close()
+
+    self.assertEqual(
+        dspl_statistics.ReadStatistics(self.csv_file_path), None)
+
+
+if __name__ == '__main__':
+  unittest.main()
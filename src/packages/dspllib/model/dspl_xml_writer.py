@@ -0,0 +1,210 @@
+#!/usr/bin/python2.4
+#
+# Copyright 2011, Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Write indented DSPL XML directly to a file object.
+
+The output matches what xml.dom.minidom's toprettyxml produces for the same
+elements, but is generated without serializing and re-parsing the XML, so
+large datasets can be written one element at a time.
+"""
+
+
+__author__ = 'Benjamin Yolken <yolken@google.com>'
+
+
+# Characters escaped in text and attribute values, in the order used by
+# xml.dom.minidom
+_ESCAPED_CHARACTERS = [('&', '&amp;'), ('<', '&lt;'), ('"', '&quot;'),
+                       ('>', '&gt;')]
+
+
+def _Encode(data):
+  """Encode unicode strings as UTF-8, leaving other strings as they are.
+
+  Args:
+    data: String to encode
+
+  Returns:
+    A byte string
+  """
+  if isinstance(data, unicode):
+    return data.encode('utf-8')
+  else:
+    return data
+
+
+def _Escape(data):
+  """Escape a string for use in XML text or attribute values.
+
+  Args:
+    data: String to escape
+
+  Returns:
+    The escaped string, encoded as UTF-8
+  """
+  data = _Encode(data)
+
+  for character, replacement in _ESCAPED_CHARACTERS:
+    if character in data:
+      data = data.replace(character, replacement)
+
+  return data
+
+
+class XMLWriter(object):
+  """Writes indented XML to a file object, one element at a time.
+
+  Elements can either be opened and closed explicitly, with StartElement and
+  EndElement, or written whole from their ElementTree representations with
+  WriteElement.
+  """
+
+  def __init__(self, output_file, indent='  '):
+    """Create a new XMLWriter object.
+
+    Args:
+      output_file: A file-like object to write the XML to
+      indent: String added to the indentation of each level of elements
+    """
+    self.output_file = output_file
+    self.indent = indent
+    self.open_tags = []
+
+  def _WriteStartTag(self, tag, attributes, level):
+    """Write the start of a tag, without its closing bracket.
+
+    Args:
+      tag: Name of the element
+      attributes: Dictionary of attribute names to values
+      level: Nesting depth of the element
+    """
+    self.output_file.write('%s<%s' % (self.indent * level, _Encode(tag)))
+
+    for attribute_name in sorted(attributes):
+      self.output_file.write(
+          ' %s="%s"' % (_Encode(attribute_name),
+                        _Escape(attributes[attribute_name])))
+
+  def WriteDeclaration(self):
+    """Write the XML declaration that starts the document."""
+    self.output_file.write('<?xml version="1.0" ?>\n')
+
+  def StartElement(self, tag, attributes=None):
+    """Open an element; the children written after it are nested inside it.
+
+    Args:
+      tag: Name of the element
+      attributes: Dictionary of attribute names to values, or None
+    """
+    self._WriteStartTag(tag, attributes or {}, len(self.open_tags))
+    self.output_file.write('>\n')
+    self.open_tags.append(_Encode(tag))
+
+  def EndElement(self):
+    """Close the most recently opened element."""
+    tag = self.open_tags.pop()
+    self.output_file.write('%s</%s>\n' % (self.indent * len(self.open_tags),
+                                          tag))
+
+  def WriteElements(self, tag, elements):
+    """Write an element holding the given child elements.
+
+    The children are written as they are generated, so only one of them needs
+    to be held in memory at a time.
+
+    Args:
+      tag: Name of the parent element
+      elements: An iterable of ElementTree Elements
+    """
+    level = len(self.open_tags)
+    has_children = False
+
+    for element in elements:
+      if not has_children:
+        self.StartElement(tag)
+        has_children = True
+
+      self._WriteElement(element, level + 1)
+
+    if has_children:
+      self.EndElement()
+    else:
+      self._WriteStartTag(tag, {}, level)
+      self.output_file.write('/>\n')
+
+  def WriteElement(self, element):
+    """Write an ElementTree element and all of its children.
+
+    Args:
+      element: An ElementTree Element
+    """
+    self._WriteElement(element, len(self.open_tags))
+
+  def _WriteElement(self, element, level):
+    """Recursively write an ElementTree element at the given nesting depth.
+
+    Args:
+      element: An ElementTree Element
+      level: Nesting depth of the element
+    """
+    self._WriteStartTag(element.tag, element.attrib, level)
+
+    # Gather the children as minidom would see them, with each element's tail
+    # text following it as a separate text node
+    children = []
+
+    if element.text:
+      children.append(element.text)
+
+    for child_element in element:
+      children.append(child_element)
+
+      if child_element.tail:
+        children.append(child_element.tail)
+
+    if not children:
+      self.output_file.write('/>\n')
+    elif len(children) == 1 and isinstance(children[0], basestring):
+      self.output_file.write(
+          '>%s</%s>\n' % (_Escape(children[0]), _Encode(element.tag)))
+    else:
+      self.output_file.write('>\n')
+      child_indent = self.indent * (level + 1)
+
+      for child in children:
+        if isinstance(child, basestring):
+          self.output_file.write('%s%s\n' % (child_indent, _Escape(child)))
+        else:
+          self._WriteElement(child, level + 1)
+
+      self.output_file.write(
+          '%s</%s>\n' % (self.indent * level, _Encode(element.tag)))
@@ -0,0 +1,116 @@
+#!/usr/bin/python2.4
+#
+# Copyright 2011, Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+"""Tests of dspl_xml_writer module."""
+
+
+__author__ = 'Benjamin Yolken <yolken@google.com>'
+
+import StringIO
+import unittest
+import xml.dom.minidom
+import xml.etree.ElementTree
+
+import dspl_xml_writer
+
+
+class XMLWriterTests(unittest.TestCase):
+  """Test cases for XMLWriter object."""
+
+  def setUp(self):
+    self.output_file = StringIO.StringIO()
+    self.writer = dspl_xml_writer.XMLWriter(self.output_file)
+
+  def tearDown(self):
+    self.output_file.close()
+
+  def testWriteElement(self):
+    """Test that elements are written as minidom would pretty-print them."""
+    root_element = xml.etree.ElementTree.Element('root')
+    root_element.set('b', 'x & "y"')
+    root_element.set('a', '<z>')
+
+    text_element = xml.etree.ElementTree.SubElement(root_element, 'text')
+    text_element.text = 'a < b & c > d'
+
+    xml.etree.ElementTree.SubElement(root_element, 'empty')
+    xml.etree.ElementTree.SubElement(root_element, 'blank').text = ''
+
+    mixed_element = xml.etree.ElementTree.SubElement(root_element, 'mixed')
+    mixed_element.text = 'before'
+    inner_element = xml.etree.ElementTree.SubElement(mixed_element, 'inner')
+    inner_element.set('key', 'value')
+    inner_element.tail = 'after'
+
+    self.writer.WriteDeclaration()
+    self.writer.WriteElement(root_element)
+
+    expected_xml = xml.dom.minidom.parseString(
+        xml.etree.ElementTree.tostring(
+            root_element, encoding='utf-8')).toprettyxml(indent='  ')
+
+    self.assertEqual(self.output_file.getvalue(), expected_xml)
+
+  def testWriteNested(self):
+    """Test writing elements inside explicitly opened elements."""
+    self.writer.StartElement('outer', {'id': 'o'})
+    self.writer.WriteElements(
+        'items',
+        (xml.etree.ElementTree.Element('item', {'id': str(i)})
+         for i in range(2)))
+    self.writer.WriteElements('none', [])
+    self.writer.EndElement()
+
+    self.assertEqual(
+        self.output_file.getvalue(),
+        '<outer id="o">\n'
+        '  <items>\n'
+        '    <item id="0"/>\n'
+        '    <item id="1"/>\n'
+        '  </items>\n'
+        '  <none/>\n'
+        '</outer>\n')
+
+  def testUnicode(self):
+    """Test that unicode text is written as UTF-8."""
+    element = xml.etree.ElementTree.Element(u'name', {u'id': u'z'})
+    element.text = u'Z\xfcrich'
+
+    self.writer.WriteElement(element)
+
+    output = self.output_file.getvalue()
+    self.assertTrue(isinstance(output, str))
+    self.assertEqual(output, '<name id="z">Z\xc3\xbcrich</name>\n')
+
+
+if __name__ == '__main__':
+  unittest.main()
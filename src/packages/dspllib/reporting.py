@@ -0,0 +1,216 @@
+#!/usr/bin/python2.4
+#
+# Copyright 2011, Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Collect timings of the phases of a dataset generation run for reporting."""
+
+__author__ = 'Benjamin Yolken <yolken@google.com>'
+
+
+import json
+import os
+import sys
+import time
+
+try:
+  import resource
+except ImportError:
+  # Not available on Windows; peak memory isn't reported there
+  resource = None
+
+
+def GetPeakMemory():
+  """Get the peak resident memory of this process so far.
+
+  Returns:
+    A number of bytes, or None if it can't be determined on this platform
+  """
+  if resource is None:
+    return None
+
+  max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+  # Linux reports kilobytes, while Mac OS X reports bytes
+  if sys.platform == 'darwin':
+    return max_rss
+  else:
+    return max_rss << 10
+
+
+def GetCurrentMemory():
+  """Get the current resident memory of this process.
+
+  Returns:
+    A number of bytes, or None if it can't be determined on this platform
+    (i.e., outside of Linux)
+  """
+  try:
+    statm_file = open('/proc/self/statm', 'r')
+  except IOError:
+    return None
+
+  try:
+    resident_pages = int(statm_file.read().split()[1])
+  finally:
+    statm_file.close()
+
+  return resident_pages * os.sysconf('SC_PAGE_SIZE')
+
+
+class RunPhase(object):
+  """The record of a single phase of a run, e.g. one slice query.
+
+  Attributes:
+    phase_type: String identifying the kind of work done (e.g., 'ingest')
+    name: String identifying what the work was done on (e.g., a table ID), or
+          None
+    start_time: Time at which the phase started, in seconds since the epoch
+    wall_time: Number of seconds the phase took, or None if it isn't finished
+    rows_in: Number of rows read by the phase, or None if not applicable
+    rows_out: Number of rows produced by the phase, or None if not applicable
+    start_memory: Resident memory of the process, in bytes, when the phase
+                  started, or None if it can't be determined
+    end_memory: Resident memory of the process, in bytes, when the phase
+                finished, or None if it can't be determined
+    process_peak_memory: Peak memory of the process so far, in bytes, when the
+                         phase finished; this never goes down, so it is only
+                         that of the phase itself if the phase set a new peak
+    details: Dictionary of other JSON-serializable values about the phase
+  """
+
+  def __init__(self, phase_type, name=None):
+    """Create and start a new RunPhase object.
+
+    Args:
+      phase_type: String identifying the kind of work done
+      name: String identifying what the work was done on, or None
+    """
+    self.phase_type = phase_type
+    self.name = name
+    self.start_time = time.time()
+    self.wall_time = None
+    self.rows_in = None
+    self.rows_out = None
+    self.start_memory = GetCurrentMemory()
+    self.end_memory = None
+    self.process_peak_memory = None
+    self.details = {}
+
+  def Finish(self, rows_in=None, rows_out=None, wall_time=None, **details):
+    """Record the end of this phase.
+
+    Memory is measured in this process, so doesn't include that of worker
+    processes.
+
+    Args:
+      rows_in: Number of rows read by the phase, or None
+      rows_out: Number of rows produced by the phase, or None
+      wall_time: Number of seconds the phase took, if not the time since it
+                 was started (e.g., for work done in a worker process)
+      details: Other JSON-serializable values to record about the phase
+    """
+    if wall_time is None:
+      wall_time = time.time() - self.start_time
+
+    self.wall_time = wall_time
+    self.rows_in = rows_in
+    self.rows_out = rows_out
+    self.end_memory = GetCurrentMemory()
+    self.process_peak_memory = GetPeakMemory()
+    self.details.update(details)
+
+  def ToDict(self):
+    """Get a JSON-serializable dictionary describing this phase."""
+    phase_dict = {'phase': self.phase_type,
+                  'wall_time': self.wall_time,
+                  'start_memory': self.start_memory,
+                  'end_memory': self.end_memory,
+                  'process_peak_memory': self.process_peak_memory}
+
+    if self.name is not None:
+      phase_dict['name'] = self.name
+
+    if self.rows_in is not None:
+      phase_dict['rows_in'] = self.rows_in
+
+    if self.rows_out is not None:
+      phase_dict['rows_out'] = self.rows_out
+
+    phase_dict.update(self.details)
+
+    return phase_dict
+
+
+class RunReport(object):
+  """A record of the phases of a run, which can be written out as JSON.
+
+  Objects that do the work of a run take an optional RunReport and call
+  StartPhase and RunPhase.Finish around each unit of work.
+
+  Attributes:
+    start_time: Time at which the run started, in seconds since the epoch
+    phases: List of RunPhase objects, in the order they were started
+  """
+
+  def __init__(self):
+    """Create a new RunReport object, starting the run."""
+    self.start_time = time.time()
+    self.phases = []
+
+  def StartPhase(self, phase_type, name=None):
+    """Start a new phase of the run.
+
+    Args:
+      phase_type: String identifying the kind of work done
+      name: String identifying what the work was done on, or None
+
+    Returns:
+      A RunPhase object, which the caller should finish when the phase ends
+    """
+    phase = RunPhase(phase_type, name)
+    self.phases.append(phase)
+
+    return phase
+
+  def ToDict(self):
+    """Get a JSON-serializable dictionary describing the whole run."""
+    return {'start_time': self.start_time,
+            'wall_time': time.time() - self.start_time,
+            'peak_memory': GetPeakMemory(),
+            'phases': [phase.ToDict() for phase in self.phases]}
+
+  def Write(self, report_file):
+    """Write the report as JSON.
+
+    Args:
+      report_file: A file-like object, opened for writing
+    """
+    json.dump(self.ToDict(), report_file, indent=2, sort_keys=True)
+    report_file.write('\n')
@@ -0,0 +1,103 @@
+#!/usr/bin/python2.4
+#
+# Copyright 2011, Google Inc.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#    * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#    * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#    * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Tests of reporting module."""
+
+
+__author__ = 'Benjamin Yolken <yolken@google.com>'
+
+import json
+import StringIO
+import unittest
+
+import reporting
+
+
+class RunReportTests(unittest.TestCase):
+  """Tests of RunReport object."""
+
+  def setUp(self):
+    self.run_report = reporting.RunReport()
+
+  def testPhases(self):
+    """Test that phases are recorded in the order they were started."""
+    phase = self.run_report.StartPhase('ingest')
+    phase.Finish(rows_in=10, rows_out=8, bytes_in=123)
+
+    phase = self.run_report.StartPhase('slice_query', 'slice_0_table')
+    phase.Finish(rows_out=3, wall_time=1.5)
+
+    report = self.run_report.ToDict()
+
+    self.assertEqual(len(report['phases']), 2)
+
+    ingest_phase = report['phases'][0]
+
+    self.assertEqual(ingest_phase['phase'], 'ingest')
+    self.assertFalse('name' in ingest_phase)
+    self.assertEqual(ingest_phase['rows_in'], 10)
+    self.assertEqual(ingest_phase['rows_out'], 8)
+    self.assertEqual(ingest_phase['bytes_in'], 123)
+    self.assertTrue(ingest_phase['wall_time'] >= 0)
+
+    slice_phase = report['phases'][1]
+
+    self.assertEqual(slice_phase['name'], 'slice_0_table')
+    self.assertFalse('rows_in' in slice_phase)
+    self.assertEqual(slice_phase['wall_time'], 1.5)
+
+    if reporting.GetPeakMemory() is not None:
+      self.assertTrue(slice_phase['process_peak_memory'] > 0)
+
+    if reporting.GetCurrentMemory() is not None:
+      self.assertTrue(0 < slice_phase['start_memory'] <=
+                      slice_phase['process_peak_memory'])
+      self.assertTrue(0 < slice_phase['end_memory'] <=
+                      slice_phase['process_peak_memory'])
+
+  def testWrite(self):
+    """Test that the report is written as JSON."""
+    self.run_report.StartPhase('parse_header').Finish()
+
+    report_file = StringIO.StringIO()
+    self.run_report.Write(report_file)
+
+    report = json.loads(report_file.getvalue())
+
+    self.assertEqual(report['phases'][0]['phase'], 'parse_header')
+    self.assertTrue(report['wall_time'] >= 0)
+    self.assertEqual(report['start_time'], self.run_report.start_time)
+
+    report_file.close()
+
+
+if __name__ == '__main__':
+  unittest.main()
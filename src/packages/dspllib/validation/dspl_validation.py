@@ -34,7 +34,9 @@
 
 __author__ = 'Benjamin Yolken <yolken@google.com>'
 
-import re
+import itertools
+
+from dspllib.model import dspl_statistics
 
 
 class DSPLValidationIssue(object):
@@ -113,7 +115,13 @@ class DSPLDatasetValidator(object):
     for table in self.dspl_dataset.tables:
       entity_ids.append(table.table_id)
 
-    self.issues.sort(key=lambda r: entity_ids.index(r.base_entity_id))
+    # Map each ID to its first position, as list.index would
+    entity_positions = {}
+
+    for position, entity_id in enumerate(entity_ids):
+      entity_positions.setdefault(entity_id, position)
+
+    self.issues.sort(key=lambda r: entity_positions[r.base_entity_id])
 
   def CheckConcepts(self):
     """Check for issues related to the concepts in this dataset."""
@@ -278,8 +286,9 @@ class DSPLDatasetValidator(object):
               None, 'No tables found in dataset'))
 
     for table in self.dspl_dataset.tables:
-      if table.table_data:
-        table_header_row = table.table_data[0]
+      table_header_row = next(table.IterRows(), None)
+
+      if table_header_row is not None:
 
         # Skip over columns that are in XML but not CSV
         non_constant_columns = [column for column in table.columns if
@@ -317,6 +326,73 @@ class DSPLDatasetValidator(object):
                       'Table \'%s\', column %s is missing date format' %
                       (table.table_id, table_column.column_id)))
 
+  def _GetTableStatistics(self, table):
+    """Get the statistics of a table's data, if they can be trusted.
+
+    Args:
+      table: A dspl_model.Table
+
+    Returns:
+      A dspl_statistics.TableStatistics object, if the table data are read from
+      a CSV file whose statistics are up to date; otherwise, None
+    """
+    if table.spill_file_path:
+      return dspl_statistics.ReadStatistics(table.spill_file_path)
+
+    return None
+
+  def _StatisticsShowWellFormedData(self, table, statistics):
+    """Check whether table statistics show that the row-by-row checks pass.
+
+    The row-by-row checks are those of the header, row lengths and value
+    formats that are done for every table.
+
+    Args:
+      table: A dspl_model.Table
+      statistics: The dspl_statistics.TableStatistics of the table data
+
+    Returns:
+      True if the checks would find no issues, or False if they might
+    """
+    if statistics.header is None or not statistics.consistent_row_lengths:
+      return False
+
+    for column in table.columns:
+      if not column.constant_value:
+        column_statistics = statistics.GetColumn(column.column_id)
+
+        if column_statistics is None or not column_statistics.formats_valid:
+          return False
+
+    return True
+
+  def _GetConceptInstancesFromStatistics(self, concept, concept_table):
+    """Get all instances of a concept from the statistics of its table.
+
+    Args:
+      concept: A dspl_model.Concept
+      concept_table: The dspl_model.Table defining the concept
+
+    Returns:
+      A dictionary containing one entry for each instance value, if the table
+      statistics show that checking the table data would find no issues;
+      otherwise, None
+    """
+    statistics = self._GetTableStatistics(concept_table)
+
+    if (statistics is None or
+        not self._StatisticsShowWellFormedData(concept_table, statistics) or
+        statistics.key_columns != [concept.concept_id] or
+        not statistics.keys_unique):
+      return None
+
+    concept_statistics = statistics.GetColumn(concept.concept_id)
+
+    if concept_statistics.blank_count or concept_statistics.values is None:
+      return None
+
+    return dict.fromkeys(concept_statistics.values, True)
+
   def _GetConceptInstances(self, concept):
     """Get all instances of a concept from its definition table.
 
@@ -348,7 +424,17 @@ class DSPLDatasetValidator(object):
         concept_col_index = column_ids.index(concept.concept_id)
 
       if self.full_data_check:
-        if not concept_table.table_data:
+        # Up-to-date statistics of the table can stand in for its data
+        trusted_instances = self._GetConceptInstancesFromStatistics(
+            concept, concept_table)
+
+        if trusted_instances is not None:
+          return trusted_instances
+
+        table_rows = concept_table.IterRows()
+        first_row = next(table_rows, None)
+
+        if first_row is None:
           self.AddIssue(
               DSPLValidationIssue(
                   DSPLValidationIssue.DATA,
@@ -359,7 +445,7 @@ class DSPLDatasetValidator(object):
                   (concept_table.file_name, concept_table.table_id)))
           return None
 
-        for r, row in enumerate(concept_table.table_data):
+        for r, row in enumerate(itertools.chain([first_row], table_rows)):
           if r == 0:
             header_row_length = len(row)
             column_to_csv_index = {}
@@ -493,7 +579,7 @@ class DSPLDatasetValidator(object):
     """
     if value:
       if column.data_type == 'integer':
-        if not re.match('^[-]{0,1}[0-9]+$', value):
+        if not dspl_statistics.INTEGER_PATTERN.match(value):
           self.AddIssue(
               DSPLValidationIssue(
                   DSPLValidationIssue.DATA, DSPLValidationIssue.INCONSISTENCY,
@@ -502,7 +588,7 @@ class DSPLDatasetValidator(object):
                   'line %d: \'%s\'' %
                   (table.file_name, table.table_id, row, value)))
       elif column.data_type == 'float':
-        if not re.match('^[-]{0,1}[0-9]*(\.[0-9]+){0,1}$', value):
+        if not dspl_statistics.FLOAT_PATTERN.match(value):
           self.AddIssue(
               DSPLValidationIssue(
                   DSPLValidationIssue.DATA, DSPLValidationIssue.INCONSISTENCY,
@@ -511,6 +597,65 @@ class DSPLDatasetValidator(object):
                   'line %d: \'%s\'' %
                   (table.file_name, table.table_id, row, value)))
 
+  def _StatisticsShowValidSliceData(self, slice_table, statistics,
+                                    dimension_column_map,
+                                    time_dimension_column, concept_data):
+    """Check whether table statistics show that the slice data checks pass.
+
+    Args:
+      slice_table: The dspl_model.Table of a slice
+      statistics: The dspl_statistics.TableStatistics of the table data
+      dimension_column_map: Dictionary of the table column of each dimension
+                            of the slice that isn't constant
+      time_dimension_column: The table column of the slice's time dimension,
+                             or None
+      concept_data: A dictionary of dictionaries containing the data values
+                    for each internally defined concept
+
+    Returns:
+      True if the checks would find no issues, or False if they might
+    """
+    if not self._StatisticsShowWellFormedData(slice_table, statistics):
+      return False
+
+    # Check that dimension keys are non-blank and unique
+    key_column_ids = set([column.column_id
+                          for column in dimension_column_map.values()])
+
+    if set(statistics.key_columns) != key_column_ids:
+      return False
+
+    if not statistics.keys_unique:
+      return False
+
+    for column_id in key_column_ids:
+      if statistics.GetColumn(column_id).blank_count:
+        return False
+
+    # Check sorting; unique keys can only be badly sorted if there is a time
+    # dimension, within whose values the rows are grouped
+    if time_dimension_column is not None:
+      group_column_ids = key_column_ids - set([time_dimension_column.column_id])
+
+      if group_column_ids and (
+          set(statistics.group_columns) != group_column_ids or
+          not statistics.groups_contiguous):
+        return False
+
+    # Check that dimension values are valid
+    for (dimension_id, column) in dimension_column_map.items():
+      if concept_data.get(dimension_id):
+        values = statistics.GetColumn(column.column_id).values
+
+        if values is None:
+          return False
+
+        for value in values:
+          if value not in concept_data[dimension_id]:
+            return False
+
+    return True
+
   def _CheckSliceData(self, data_slice, concept_data):
     """Check the data associated with a single slice.
 
@@ -625,7 +770,19 @@ class DSPLDatasetValidator(object):
       if not self.full_data_check:
         return
 
-      if not slice_table.table_data:
+      # Up-to-date statistics of the table can stand in for its data, unless
+      # they show issues, which are then found by checking the data
+      statistics = self._GetTableStatistics(slice_table)
+
+      if statistics is not None and self._StatisticsShowValidSliceData(
+          slice_table, statistics, dimension_column_map, time_dimension_column,
+          concept_data):
+        return
+
+      table_rows = slice_table.IterRows()
+      first_row = next(table_rows, None)
+
+      if first_row is None:
         self.AddIssue(
             DSPLValidationIssue(
                 DSPLValidationIssue.DATA,
@@ -643,7 +800,7 @@ class DSPLDatasetValidator(object):
       bad_sorting = False
 
       # Evaluate each data row
-      for r, row in enumerate(slice_table.table_data):
+      for r, row in enumerate(itertools.chain([first_row], table_rows)):
         if r == 0:
           header_row_length = len(row)
           column_to_csv_index = {}
@@ -36,10 +36,13 @@ __author__ = 'Benjamin Yolken <yolken@google.com>'
 
 import os
 import os.path
+import shutil
+import tempfile
 import unittest
 
 import dspl_validation
 from dspllib.model import dspl_model_loader
+from dspllib.model import dspl_statistics
 
 
 class DSPLValidationTests(unittest.TestCase):
@@ -421,6 +424,85 @@ class DSPLValidationTests(unittest.TestCase):
     result = dspl_validator.RunValidation()
     self.assertEqual(len(result.split('\n')), 13)
 
+  def testTrustedStatistics(self):
+    output_path = tempfile.mkdtemp()
+
+    try:
+      self._ReloadWithStatistics(output_path)
+
+      dspl_validator = dspl_validation.DSPLDatasetValidator(self.dataset)
+      dspl_validator.CheckData()
+      self.assertEqual(len(dspl_validator.GetIssues()), 0)
+
+      # Give the file a modification time that can be set again exactly
+      csv_file_path = os.path.join(output_path, 'country_slice.csv')
+      statistics = dspl_statistics.ReadStatistics(csv_file_path)
+      os.utime(csv_file_path, (1000000000, 1000000000))
+      dspl_statistics.WriteStatistics(statistics, csv_file_path)
+
+      # The statistics stand in for the data while the file is unchanged, so
+      # a bad value that doesn't change its size or modification time is
+      # trusted not to be there
+      csv_file = open(csv_file_path, 'r+b')
+      csv_file.seek(-12, os.SEEK_END)
+      csv_file.write('x')
+      csv_file.close()
+      os.utime(csv_file_path, (1000000000, 1000000000))
+
+      dspl_validator = dspl_validation.DSPLDatasetValidator(self.dataset)
+      dspl_validator.CheckData()
+      self.assertEqual(len(dspl_validator.GetIssues()), 0)
+
+      # Once the file is modified, its data are checked instead
+      os.utime(csv_file_path, (1000000001, 1000000001))
+
+      self._SingleIssueTestHelper(
+          ['data'], dspl_validation.DSPLValidationIssue.DATA,
+          dspl_validation.DSPLValidationIssue.INCONSISTENCY,
+          'countries_slice_table')
+    finally:
+      shutil.rmtree(output_path)
+
+  def testStatisticsWithIssues(self):
+    self.dataset.GetTable('countries_table').table_data.append(
+        ['AL', 'Albania', '41.153332', '20.168331'])
+    self.dataset.GetTable('countries_slice_table').table_data.append(
+        ['AF', '1975', '110188299'])
+
+    output_path = tempfile.mkdtemp()
+
+    try:
+      self._ReloadWithStatistics(output_path)
+
+      # Statistics showing issues lead to the data being checked, so the
+      # issues are found as they would be without the statistics
+      dspl_validator = dspl_validation.DSPLDatasetValidator(self.dataset)
+      dspl_validator.CheckData()
+      all_issues = dspl_validator.GetIssues()
+
+      self.assertEqual(
+          [(issue.issue_type, issue.base_entity_id) for issue in all_issues],
+          [(dspl_validation.DSPLValidationIssue.REPEATED_INFO,
+            'countries_table'),
+           (dspl_validation.DSPLValidationIssue.OTHER,
+            'countries_slice_table')])
+    finally:
+      shutil.rmtree(output_path)
+
+  def _ReloadWithStatistics(self, output_path):
+    """Materialize the dataset and load it back, using the table statistics."""
+    self.dataset.verbose = False
+
+    for table in self.dataset.tables:
+      table.verbose = False
+
+    self.dataset.Materialize(output_path, write_statistics=True)
+    self.dataset = dspl_model_loader.LoadDSPLFromFiles(
+        os.path.join(output_path, 'dataset.xml'), use_statistics=True)
+
+    for table in self.dataset.tables:
+      self.assertTrue(table.spill_file_path)
+
   def _SingleIssueTestHelper(
       self, check_stages, expected_scope, expected_type,
       expected_base_entity_id):
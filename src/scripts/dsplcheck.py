@@ -70,6 +70,13 @@ def LoadOptionsFromFlags(argv):
       choices=['schema_only', 'schema_and_model', 'full'], default='full',
       help='Level of checking to do (default: full)')
 
+  parser.add_option(
+      '--ignore_statistics', action='store_true', dest='ignore_statistics',
+      default=False,
+      help=('Check the data of every CSV file, instead of trusting the '
+            'statistics that dsplgen --write_statistics wrote alongside '
+            'files that are unchanged since they were generated'))
+
   (options, args) = parser.parse_args(args=argv)
 
   if not len(args) == 1:
@@ -77,7 +84,8 @@ def LoadOptionsFromFlags(argv):
 
   return {'verbose': options.verbose,
           'checking_level': options.checking_level,
-          'file_path': args[0]}
+          'file_path': args[0],
+          'ignore_statistics': options.ignore_statistics}
 
 
 def GetInputFilePath(input_file_path):
@@ -163,7 +171,8 @@ def main(argv):
 
     try:
       dataset = dspl_model_loader.LoadDSPLFromFiles(
-          file_paths['xml_file_path'], load_all_data=full_data_check)
+          file_paths['xml_file_path'], load_all_data=full_data_check,
+          use_statistics=not options['ignore_statistics'])
     except dspl_model_loader.DSPLModelLoaderError as loader_error:
       print 'Error while trying to parse DSPL dataset\n\n%s' % loader_error
       sys.exit(2)
@@ -38,9 +38,13 @@ import optparse
 import sys
 import time
 
+from dspllib import memory
+from dspllib import reporting
 from dspllib.data_sources import csv_data_source
 from dspllib.data_sources import csv_data_source_sqlite
+from dspllib.data_sources import data_source
 from dspllib.data_sources import data_source_to_dspl
+from dspllib.model import dspl_archive
 
 
 def LoadOptionsFromFlags(argv):
@@ -65,16 +69,105 @@ def LoadOptionsFromFlags(argv):
   parser.add_option('-t', '--data_type', dest='data_type', type='choice',
                     choices=['csv', 'csv_sqlite'], default='csv',
                     help='Type of data source to use (default: csv)')
+  parser.add_option('-w', '--num_workers', dest='num_workers', type='int',
+                    default=1,
+                    help=('Number of worker processes to use for parsing '
+                          'the CSV and evaluating slices, and of threads to '
+                          'use for writing the tables (default: 1)'))
+  parser.add_option('--prescan', action='store_true', dest='prescan',
+                    default=False,
+                    help=('Check every CSV value against its column type '
+                          'before loading the data'))
+  parser.add_option('--widen_types', action='store_true', dest='widen_types',
+                    default=False,
+                    help=('During the pre-scan, change guessed integer '
+                          'columns with float values to floats'))
+  parser.add_option('--chunk_size', dest='chunk_size', type='int',
+                    default=csv_data_source._DEFAULT_CHUNK_SIZE,
+                    help=('Number of CSV rows to read between progress '
+                          'reports (default: %d)' %
+                          csv_data_source._DEFAULT_CHUNK_SIZE))
+  parser.add_option('--memory_limit', dest='memory_limit', type='int',
+                    default=0,
+                    help=('Maximum memory, in MB, to use for the CSV data of '
+                          'the csv data type. Loading more fails, unless '
+                          '--memory_budget is set, in which case the data is '
+                          'loaded into sqlite instead. Must not exceed '
+                          '--memory_budget. 0 means no limit, or, with '
+                          '--memory_budget, whatever is left of the budget '
+                          'when loading starts (default: 0)'))
+  parser.add_option('--memory_budget', dest='memory_budget', type='int',
+                    default=0,
+                    help=('Maximum memory, in MB, for the whole run. It sets '
+                          'the default --memory_limit, and fewer workers are '
+                          'used if needed to stay within it. 0 means no '
+                          'budget (default: 0)'))
+  parser.add_option('--max_slice_rows', dest='max_slice_rows', type='int',
+                    help='Skip slices estimated to have more rows than this')
+  parser.add_option('--max_slice_bytes', dest='max_slice_bytes', type='int',
+                    help='Skip slices estimated to be larger than this')
+  parser.add_option('--incremental', action='store_true', dest='incremental',
+                    default=False,
+                    help=('Reuse slice tables in the output path whose '
+                          'input columns are unchanged since the last run; '
+                          'every slice has all of the metric columns, so '
+                          'nothing is reused if any rows were added or '
+                          'changed'))
+  parser.add_option('--plan_only', action='store_true', dest='plan_only',
+                    default=False,
+                    help=('Print the estimated size of each slice and exit '
+                          'without generating the dataset'))
+  parser.add_option('--write_statistics', action='store_true',
+                    dest='write_statistics', default=False,
+                    help=('Write a .stats.json file of column statistics next '
+                          'to each CSV file, which lets dsplcheck skip '
+                          're-reading tables. This roughly doubles the time '
+                          'taken to write the CSV files. The statistics files '
+                          'aren\'t part of the dataset, so leave them out when '
+                          'publishing it. Can\'t be used with --zip_file'))
+  parser.add_option('--zip_file', dest='zip_file', default='',
+                    help=('Path of a zip archive to write the dataset into, '
+                          'instead of writing loose files to the output path'))
+  parser.add_option('--report_file', dest='report_file', default='',
+                    help=('Path to write a JSON report of the time, rows and '
+                          'memory used by each phase of the run to'))
 
   (options, args) = parser.parse_args(args=argv)
 
   if not len(args) == 1:
     parser.error('A data source (e.g., path to CSV file) is required')
 
-  return {'data_type': options.data_type,
+  if options.chunk_size < 1:
+    parser.error('--chunk_size must be at least 1')
+
+  if options.memory_budget and options.memory_limit > options.memory_budget:
+    parser.error('--memory_limit can\'t be larger than --memory_budget')
+
+  if options.zip_file and options.incremental:
+    parser.error('--incremental reuses loose files, so can\'t be used with '
+                 '--zip_file')
+
+  if options.zip_file and options.write_statistics:
+    parser.error('--write_statistics writes loose files, so can\'t be used '
+                 'with --zip_file')
+
+  return {'chunk_size': options.chunk_size,
+          'data_type': options.data_type,
           'data_source': args[0],
+          'incremental': options.incremental,
+          'max_slice_bytes': options.max_slice_bytes,
+          'max_slice_rows': options.max_slice_rows,
+          'memory_budget': options.memory_budget << 20,
+          'memory_limit': options.memory_limit << 20,
+          'num_workers': options.num_workers,
           'output_path': options.output_path,
-          'verbose': options.verbose}
+          'plan_only': options.plan_only,
+          'prescan': options.prescan,
+          'report_file': options.report_file,
+          'verbose': options.verbose,
+          'widen_types': options.widen_types,
+          'write_statistics': options.write_statistics,
+          'zip_file': options.zip_file}
 
 
 def main(argv):
@@ -85,6 +178,12 @@ def main(argv):
   """
   start_time = time.time()
   options = LoadOptionsFromFlags(argv)
+  run_report = reporting.RunReport()
+
+  if options['memory_budget']:
+    budget = memory.MemoryBudget(options['memory_budget'])
+  else:
+    budget = None
 
   # Connect to data source
   if options['data_type'] in ['csv', 'csv_sqlite']:
@@ -94,19 +193,70 @@ def main(argv):
       print 'Error opening CSV file\n\n%s' % io_error
       sys.exit(2)
 
+    data_source_obj = None
+
     if options['data_type'] == 'csv':
-      data_source_obj = csv_data_source.CSVDataSource(
-          csv_file, options['verbose'])
-    else:
+      memory_limit = options['memory_limit']
+
+      if budget and not memory_limit:
+        # A limit of zero would mean no limit at all
+        memory_limit = max(budget.GetAvailable(), 1)
+
+      try:
+        data_source_obj = csv_data_source.CSVDataSource(
+            csv_file, options['verbose'], options['num_workers'],
+            options['prescan'], options['widen_types'],
+            chunk_size=options['chunk_size'],
+            memory_limit=memory_limit,
+            run_report=run_report)
+      except data_source.MemoryLimitError as error:
+        if not budget:
+          raise
+
+        if options['verbose']:
+          print '%s; loading the data into sqlite instead' % error
+
+        # Drop the traceback, which keeps the partly loaded data alive
+        sys.exc_clear()
+        csv_file.seek(0)
+
+    if data_source_obj is None:
       data_source_obj = csv_data_source_sqlite.CSVDataSourceSqlite(
-          csv_file, options['verbose'])
+          csv_file, options['verbose'], options['num_workers'],
+          options['prescan'], options['widen_types'],
+          run_report=run_report)
   else:
     print 'Error: Unknown data type: %s' % (options['data_type'])
     sys.exit(2)
 
-  # Create DSPL dataset from data source
+  if options['plan_only']:
+    for planned_slice in data_source_to_dspl.PlanSlices(
+        data_source_obj, options['max_slice_rows'],
+        options['max_slice_bytes']):
+      print planned_slice
+
+    data_source_obj.Close()
+    return
+
+  # Create DSPL dataset from data source, writing slice tables to the output
+  # path or archive as they are created
+  if options['zip_file']:
+    archive = dspl_archive.DatasetArchive(options['zip_file'])
+    spill_path = None
+  else:
+    archive = None
+    spill_path = options['output_path']
+
   dataset = data_source_to_dspl.PopulateDataset(
-      data_source_obj, options['verbose'])
+      data_source_obj, options['verbose'], options['num_workers'],
+      spill_path=spill_path,
+      archive=archive,
+      max_slice_rows=options['max_slice_rows'],
+      max_slice_bytes=options['max_slice_bytes'],
+      incremental=options['incremental'],
+      run_report=run_report,
+      memory_budget=budget,
+      write_statistics=options['write_statistics'])
   data_source_obj.Close()
 
   if options['verbose']:
@@ -114,7 +264,16 @@ def main(argv):
     print str(dataset)
 
   # Write DSPL dataset to disk
-  dataset.Materialize(options['output_path'])
+  if archive:
+    dataset.MaterializeArchive(archive, run_report)
+  else:
+    dataset.Materialize(options['output_path'], run_report,
+                        options['num_workers'], options['write_statistics'])
+
+  if options['report_file']:
+    report_file = open(options['report_file'], 'w')
+    run_report.Write(report_file)
+    report_file.close()
 
   if options['verbose']:
     print 'Completed in %0.2f seconds' % (time.time() - start_time)
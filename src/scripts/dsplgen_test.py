@@ -34,6 +34,7 @@
 
 __author__ = 'Benjamin Yolken <yolken@google.com>'
 
+import json
 import os
 import os.path
 import re
@@ -42,6 +43,7 @@ import StringIO
 import sys
 import tempfile
 import unittest
+import zipfile
 
 import dsplcheck
 import dsplgen
@@ -104,6 +106,125 @@ class DSPLGenTests(unittest.TestCase):
 
     sys.stdout = saved_stdout
 
+  def testWriteStatistics(self):
+    """Test that statistics files are only written when asked for."""
+    dsplgen.main(['-o', self.output_dir, '-q',
+                  os.path.join(self.input_dir, 'input.csv')])
+
+    self.assertEqual(
+        [f for f in os.listdir(self.output_dir) if f.endswith('.stats.json')],
+        [])
+
+    dsplgen.main(['-o', self.output_dir, '-q', '--write_statistics',
+                  os.path.join(self.input_dir, 'input.csv')])
+
+    self.assertEqual(
+        sorted([f for f in os.listdir(self.output_dir)
+                if f.endswith('.stats.json')]),
+        ['category1_table.csv.stats.json', 'slice_0_table.csv.stats.json',
+         'slice_1_table.csv.stats.json'])
+
+  def testRunReport(self):
+    """Test that a JSON report of the run's phases is written."""
+    report_file_name = os.path.join(self.output_dir, 'report.json')
+
+    dsplgen.main(['-o', self.output_dir, '-q', '--report_file',
+                  report_file_name,
+                  os.path.join(self.input_dir, 'input.csv')])
+
+    report_file = open(report_file_name, 'r')
+    report = json.load(report_file)
+    report_file.close()
+
+    phases = [(phase['phase'], phase.get('name')) for phase
+              in report['phases']]
+
+    self.assertEqual(phases[:3], [('parse_header', None), ('ingest', None),
+                                  ('check_hierarchies', None)])
+    self.assertTrue(('slice_query', 'slice_1_table') in phases)
+    self.assertTrue(('materialize', 'dataset.xml') in phases)
+    self.assertTrue(('materialize', 'slice_1_table.csv') in phases)
+
+    ingest_phase = report['phases'][1]
+
+    self.assertEqual(ingest_phase['rows_in'], 5)
+    self.assertEqual(ingest_phase['rows_out'], 5)
+    self.assertTrue(report['wall_time'] >= ingest_phase['wall_time'])
+
+  def testMemoryBudget(self):
+    """Test that data over the memory budget is loaded into sqlite."""
+    saved_stdout = sys.stdout
+    redirected_output = StringIO.StringIO()
+    sys.stdout = redirected_output
+
+    # The process is already using more than a 1 MB budget
+    dsplgen.main(['-o', self.output_dir, '--memory_budget', '1',
+                  os.path.join(self.input_dir, 'input.csv')])
+
+    sys.stdout = saved_stdout
+
+    self.assertTrue(
+        'loading the data into sqlite instead' in
+        redirected_output.getvalue())
+    self.assertTrue(
+        os.path.isfile(os.path.join(self.output_dir, 'slice_1_table.csv')))
+
+    redirected_output.close()
+
+  def testMemoryLimitOverBudget(self):
+    """Test that the memory limit can't be larger than the memory budget."""
+    saved_stderr = sys.stderr
+    redirected_output = StringIO.StringIO()
+    sys.stderr = redirected_output
+
+    self.assertRaises(
+        SystemExit, dsplgen.LoadOptionsFromFlags,
+        ['--memory_budget', '100', '--memory_limit', '200', 'input.csv'])
+
+    sys.stderr = saved_stderr
+
+    self.assertTrue(
+        'can\'t be larger than --memory_budget' in
+        redirected_output.getvalue())
+
+    redirected_output.close()
+
+  def testChunkSizeTooSmall(self):
+    """Test that the chunk size must be at least 1."""
+    for chunk_size in ['0', '-1']:
+      saved_stderr = sys.stderr
+      redirected_output = StringIO.StringIO()
+      sys.stderr = redirected_output
+
+      self.assertRaises(
+          SystemExit, dsplgen.LoadOptionsFromFlags,
+          ['--chunk_size', chunk_size, 'input.csv'])
+
+      sys.stderr = saved_stderr
+
+      self.assertTrue(
+          '--chunk_size must be at least 1' in redirected_output.getvalue())
+
+      redirected_output.close()
+
+  def testZipFile(self):
+    """Test that the dataset can be written straight into a zip archive."""
+    zip_file_name = os.path.join(self.output_dir, 'dataset.zip')
+
+    dsplgen.main(['-q', '--zip_file', zip_file_name,
+                  os.path.join(self.input_dir, 'input.csv')])
+
+    self.assertEqual(os.listdir(self.output_dir), ['dataset.zip'])
+
+    zip_file = zipfile.ZipFile(zip_file_name)
+
+    self.assertEqual(
+        sorted(zip_file.namelist()),
+        ['category1_table.csv', 'dataset.xml', 'slice_0_table.csv',
+         'slice_1_table.csv'])
+
+    zip_file.close()
+
   def testCSVNotFound(self):
     """Test case in which CSV can't be opened."""
     dsplgen.main(['-o', self.output_dir, '-q',
@@ -41,10 +41,21 @@ _TEST_MODULE_NAMES = [
     'dsplgen_test',
     'dspllib.data_sources.csv_data_source_test',
     'dspllib.data_sources.csv_data_source_sqlite_test',
+    'dspllib.data_sources.csv_utilities_test',
     'dspllib.data_sources.data_source_test',
     'dspllib.data_sources.data_source_to_dspl_test',
+    'dspllib.memory_test',
+    'dspllib.model.dspl_archive_test',
+    'dspllib.model.dspl_columns_test',
+    'dspllib.model.dspl_diff_test',
+    'dspllib.model.dspl_merge_test',
+    'dspllib.model.dspl_model_benchmark_test',
     'dspllib.model.dspl_model_loader_test',
     'dspllib.model.dspl_model_test',
+    'dspllib.model.dspl_snapshot_test',
+    'dspllib.model.dspl_statistics_test',
+    'dspllib.model.dspl_xml_writer_test',
+    'dspllib.reporting_test',
     'dspllib.validation.dspl_validation_test',
     'dspllib.validation.xml_validation_test']
 